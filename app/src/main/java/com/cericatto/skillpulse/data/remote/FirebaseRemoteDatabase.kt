@@ -7,8 +7,10 @@ import com.cericatto.skillpulse.domain.auth.UserAuthentication
 import com.cericatto.skillpulse.domain.errors.DataError
 import com.cericatto.skillpulse.domain.errors.Result
 import com.cericatto.skillpulse.domain.remote.RemoteDatabase
+import com.google.firebase.firestore.DocumentReference
 import com.google.firebase.firestore.FirebaseFirestore
 import com.google.firebase.firestore.Query
+import com.google.firebase.firestore.SetOptions
 import kotlinx.coroutines.Dispatchers
 import kotlinx.coroutines.tasks.await
 import kotlinx.coroutines.withContext
@@ -171,25 +173,44 @@ class FirebaseRemoteDatabase(
 		val zonedDateTime = java.time.ZonedDateTime.parse(startTime)
 		val datePrefix = zonedDateTime.format(DateTimeFormatter.ofPattern("yyyyMMdd"))
 
-		// Query all tasks with IDs starting with today's date prefix
+		// Per-day counter kept by scripts/task_counters.py: one read and one write per new task
+		val counterRef = db.collection("_metadata")
+			.document("task_counters")
+			.collection("days")
+			.document(datePrefix)
+
+		// A day without a counter yet is seeded from its highest existing task ID
+		val number = reserveTaskNumber(counterRef, seed = null)
+			?: reserveTaskNumber(counterRef, seed = highestTaskNumber(datePrefix))!!
+
+		// Return the next ID with 3-digit padding (001, 002, 003, etc.)
+		return "${datePrefix}${String.format("%03d", number)}"
+	}
+
+	/**
+	 * Increments the day counter in a transaction and returns the reserved number.
+	 * Returns null without writing if the counter doesn't exist and no seed is given.
+	 */
+	private suspend fun reserveTaskNumber(counterRef: DocumentReference, seed: Long?): Long? {
+		return db.runTransaction { transaction ->
+			val snapshot = transaction.get(counterRef)
+			val last = snapshot.getLong("last") ?: seed ?: return@runTransaction null
+			transaction.set(counterRef, mapOf("last" to last + 1), SetOptions.merge())
+			last + 1
+		}.await()
+	}
+
+	private suspend fun highestTaskNumber(datePrefix: String): Long {
+		// Only the day's last task is read
 		val snapshot = db.collection("tasks")
+			.whereGreaterThanOrEqualTo("id", datePrefix)
+			.whereLessThan("id", "$datePrefix\uf8ff")
 			.orderBy("id", Query.Direction.DESCENDING)
+			.limit(1)
 			.get()
 			.await()
 
-		// Find the highest number for today's date
-		var maxNumber = 0
-		for (document in snapshot.documents) {
-			val id = document.getString("id") ?: continue
-			if (id.startsWith(datePrefix)) {
-				val numberPart = id.substringAfter(datePrefix).toIntOrNull() ?: 0
-				if (numberPart > maxNumber) {
-					maxNumber = numberPart
-				}
-			}
-		}
-
-		// Return the next ID with 3-digit padding (001, 002, 003, etc.)
-		return "${datePrefix}${String.format("%03d", maxNumber + 1)}"
+		val id = snapshot.documents.firstOrNull()?.getString("id") ?: return 0
+		return id.substringAfter(datePrefix).trimStart('_').toLongOrNull() ?: 0
 	}
 }
\ No newline at end of file
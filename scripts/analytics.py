@@ -0,0 +1,343 @@
+"""
+Time Allocation Analytics
+=========================
+
+Shows where the time goes: total minutes per activity, per day and per week,
+and the top activities, for one user or all of them.
+
+Tasks are loaded once into NumPy arrays (start/end in epoch minutes, and
+integer codes for descriptions and users), and every report is a vectorized
+group-by (np.unique + np.bincount) over those arrays, so multi-year,
+multi-user logs are summarized in milliseconds.
+
+Requirements:
+    pip install numpy
+
+Usage:
+    python analytics.py                          # from ../tasks.txt (convert.py output)
+    python analytics.py --mirror                 # from the local mirror (see mirror.py)
+    python analytics.py --store ../tasks.bin     # from a columnar store (see taskstore.py)
+    python analytics.py --by week --user-id a@a.com
+    python analytics.py --by description --top 15
+
+Notes:
+    - A task lasts until the next task starts (same rule as upload_to_firestore.py),
+      so the last task of the log has no duration
+    - Start times can be ISO timestamps (2025-11-01T06:45:00-03:00) or plain HH:MM;
+      HH:MM times take their date from the task ID and move to the next day when
+      the clock goes back more than 6 hours, like convert.py does
+    - Times are wall-clock minutes; the UTC offset is ignored
+    - Weeks start on Monday
+"""
+
+import argparse
+import sqlite3
+from datetime import date
+
+from instrumentation import add_profile_arguments, profile_from_args
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TXT_FILE_PATH = "../tasks.txt"
+DEFAULT_USER_ID = "a@a.com"
+DEFAULT_TOP = 10
+
+MINUTES_PER_DAY = 1440
+# Same threshold convert.py uses to detect a task after midnight
+MIDNIGHT_GAP_MINUTES = 360
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# 1970-01-01 was a Thursday; shifting by 3 days makes weeks start on Monday
+WEEK_OFFSET_DAYS = 3
+
+
+class TaskArrays:
+    """
+    Tasks as parallel NumPy arrays.
+    
+    Attributes:
+        start, end: int64 epoch minutes (wall-clock)
+        description_codes: int32 index into `descriptions`
+        user_codes: int32 index into `users`
+    """
+    
+    def __init__(self, start, end, description_codes, descriptions, user_codes, users):
+        self.start = start
+        self.end = end
+        self.description_codes = description_codes
+        self.descriptions = descriptions
+        self.user_codes = user_codes
+        self.users = users
+    
+    def __len__(self):
+        return len(self.start)
+    
+    def durations(self):
+        """Minutes spent on each task."""
+        return self.end - self.start
+    
+    def for_user(self, user_id: str):
+        """Only the tasks of one user (empty if the user is unknown)."""
+        code = self.users.index(user_id) if user_id in self.users else -1
+        mask = self.user_codes == code
+        return TaskArrays(self.start[mask], self.end[mask], self.description_codes[mask],
+                          self.descriptions, self.user_codes[mask], self.users)
+
+
+def day_number(date_str: str, cache: dict) -> int:
+    """Days since 1970-01-01 for a YYYYMMDD or YYYY-MM-DD string."""
+    day = cache.get(date_str)
+    if day is None:
+        digits = date_str.replace("-", "")
+        day = date(int(digits[:4]), int(digits[4:6]), int(digits[6:8])).toordinal() - EPOCH_ORDINAL
+        cache[date_str] = day
+    return day
+
+
+def clock_minutes(time_str: str) -> int:
+    """Minutes since midnight for "HH:MM" or the time part of an ISO timestamp."""
+    if "T" in time_str:
+        time_str = time_str[time_str.index("T") + 1:]
+    return int(time_str[:2]) * 60 + int(time_str[3:5])
+
+
+def task_minutes(tasks):
+    """
+    Yield (start, end) in epoch minutes for task dicts in log order.
+    
+    ISO times carry their own date. HH:MM times are placed on the task ID's date,
+    and on the next day once the clock goes back by more than MIDNIGHT_GAP_MINUTES.
+    """
+    day_cache = {}
+    current_id_date = None
+    day_offset = 0
+    previous_clock = None
+    
+    for task in tasks:
+        start_time = task["startTime"]
+        end_time = task.get("endTime") or start_time
+        
+        if "T" in start_time:
+            start = day_number(start_time[:10], day_cache) * MINUTES_PER_DAY + clock_minutes(start_time)
+        else:
+            id_date = task["id"][:8]
+            clock = clock_minutes(start_time)
+            if id_date != current_id_date:
+                current_id_date, day_offset, previous_clock = id_date, 0, None
+            if previous_clock is not None and previous_clock - clock > MIDNIGHT_GAP_MINUTES:
+                day_offset += 1
+            previous_clock = clock
+            start = (day_number(id_date, day_cache) + day_offset) * MINUTES_PER_DAY + clock
+        
+        if "T" in end_time:
+            end = day_number(end_time[:10], day_cache) * MINUTES_PER_DAY + clock_minutes(end_time)
+        else:
+            end = start + (clock_minutes(end_time) - start % MINUTES_PER_DAY) % MINUTES_PER_DAY
+        
+        yield start, end
+
+
+def epoch_minutes(tasks: list[dict]):
+    """
+    Start and end epoch minutes as two int64 arrays.
+    
+    When every time is an ISO timestamp (convert.py output), NumPy parses them
+    directly as datetime64; otherwise this falls back to task_minutes().
+    """
+    try:
+        start = np.array([task["startTime"][:16] for task in tasks], dtype="datetime64[m]")
+        end = np.array([(task.get("endTime") or task["startTime"])[:16] for task in tasks],
+                       dtype="datetime64[m]")
+        return start.astype(np.int64), end.astype(np.int64)
+    except ValueError:
+        minutes = np.fromiter(
+            (value for pair in task_minutes(tasks) for value in pair),
+            dtype=np.int64, count=2 * len(tasks),
+        ).reshape(-1, 2)
+        return minutes[:, 0].copy(), minutes[:, 1].copy()
+
+
+def load_task_arrays(tasks, default_user: str = DEFAULT_USER_ID) -> TaskArrays:
+    """Build TaskArrays from task dicts (id, description, startTime, endTime, optional userId)."""
+    tasks = list(tasks)
+    descriptions, description_index = [], {}
+    users, user_index = [], {}
+    description_codes = []
+    user_codes = []
+    
+    for task in tasks:
+        description = task["description"]
+        code = description_index.get(description)
+        if code is None:
+            code = description_index[description] = len(descriptions)
+            descriptions.append(description)
+        description_codes.append(code)
+        
+        user_id = task.get("userId") or default_user
+        code = user_index.get(user_id)
+        if code is None:
+            code = user_index[user_id] = len(users)
+            users.append(user_id)
+        user_codes.append(code)
+    
+    start, end = epoch_minutes(tasks)
+    
+    return TaskArrays(
+        start, end,
+        np.array(description_codes, dtype=np.int32), descriptions,
+        np.array(user_codes, dtype=np.int32), users,
+    )
+
+
+def load_from_txt(file_path: str = TXT_FILE_PATH, user_id: str = DEFAULT_USER_ID) -> TaskArrays:
+    """Load convert.py output (ID;DESCRIPTION;TIMESTAMP) as one user's tasks."""
+    from upload_to_firestore import iter_txt_file
+    return load_task_arrays(iter_txt_file(file_path), user_id)
+
+
+def load_from_store(store_path: str, user_id: str = DEFAULT_USER_ID) -> TaskArrays:
+    """
+    Load a columnar store (convert.py --format binary) as one user's tasks.
+    The columns are read straight from the memory map; nothing is parsed.
+    """
+    from taskstore import TaskStore
+    
+    with TaskStore(store_path) as store:
+        start = np.frombuffer(store.start, dtype=np.int32).astype(np.int64)
+        description_codes = np.frombuffer(store.codes, dtype=np.uint32).astype(np.int32)
+        descriptions = store.descriptions
+    
+    # Same rule as upload_to_firestore.py: a task ends when the next one starts
+    end = np.append(start[1:], start[-1:])
+    return TaskArrays(start, end, description_codes, descriptions,
+                      np.zeros(len(start), dtype=np.int32), [user_id])
+
+
+def load_from_mirror(mirror_path: str) -> TaskArrays:
+    """Load every task from the local SQLite mirror, grouped by user in ID order."""
+    conn = sqlite3.connect(mirror_path)
+    rows = conn.execute(
+        "SELECT id, userId, description, startTime, endTime FROM tasks ORDER BY userId, id"
+    )
+    tasks = [
+        {"id": task_id, "userId": user_id, "description": description,
+         "startTime": start_time, "endTime": end_time}
+        for task_id, user_id, description, start_time, end_time in rows
+    ]
+    conn.close()
+    return load_task_arrays(tasks)
+
+
+def group_totals(keys, weights):
+    """Sum `weights` per distinct key. Returns (sorted unique keys, totals)."""
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    return unique_keys, np.bincount(inverse, weights=weights, minlength=len(unique_keys)).astype(np.int64)
+
+
+def totals_by_description(arrays: TaskArrays) -> dict:
+    """Total minutes per description."""
+    totals = np.bincount(arrays.description_codes, weights=arrays.durations(),
+                         minlength=len(arrays.descriptions)).astype(np.int64)
+    return {arrays.descriptions[code]: int(totals[code]) for code in np.flatnonzero(totals)}
+
+
+def totals_by_day(arrays: TaskArrays) -> dict:
+    """Total minutes per day the tasks start on, keyed by date."""
+    days, totals = group_totals(arrays.start // MINUTES_PER_DAY, arrays.durations())
+    return {date.fromordinal(int(day) + EPOCH_ORDINAL): int(total) for day, total in zip(days, totals)}
+
+
+def totals_by_week(arrays: TaskArrays) -> dict:
+    """Total minutes per week, keyed by the Monday the week starts on."""
+    weeks, totals = group_totals((arrays.start // MINUTES_PER_DAY + WEEK_OFFSET_DAYS) // 7,
+                                 arrays.durations())
+    return {
+        date.fromordinal(int(week) * 7 - WEEK_OFFSET_DAYS + EPOCH_ORDINAL): int(total)
+        for week, total in zip(weeks, totals)
+    }
+
+
+def totals_by_day_and_description(arrays: TaskArrays) -> dict:
+    """Total minutes per (day, description), for stacked daily breakdowns."""
+    width = max(len(arrays.descriptions), 1)
+    keys, totals = group_totals((arrays.start // MINUTES_PER_DAY) * width + arrays.description_codes,
+                                arrays.durations())
+    days, codes = np.divmod(keys, width)
+    return {
+        (date.fromordinal(int(day) + EPOCH_ORDINAL), arrays.descriptions[code]): int(total)
+        for day, code, total in zip(days, codes, totals)
+    }
+
+
+def top_activities(arrays: TaskArrays, n: int = DEFAULT_TOP) -> list[tuple]:
+    """The n descriptions with the most total minutes, as (description, minutes), largest first."""
+    totals = np.bincount(arrays.description_codes, weights=arrays.durations(),
+                         minlength=len(arrays.descriptions)).astype(np.int64)
+    n = min(n, len(totals))
+    if n == 0:
+        return []
+    top = np.argpartition(-totals, n - 1)[:n]
+    top = top[np.lexsort((top, -totals[top]))]
+    return [(arrays.descriptions[code], int(totals[code])) for code in top if totals[code] > 0]
+
+
+def format_minutes(minutes: int) -> str:
+    """Format minutes as e.g. "12h05"."""
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours}h{minutes:02d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Where does the time go?")
+    parser.add_argument('--file', default=TXT_FILE_PATH, help=f"tasks file (default: {TXT_FILE_PATH})")
+    parser.add_argument('--mirror', nargs='?', const="../tasks_mirror.sqlite",
+                        help="read from the local mirror instead of the tasks file")
+    parser.add_argument('--store', help="read from a columnar store written by convert.py --format binary")
+    parser.add_argument('--user-id', help="only this user's tasks")
+    parser.add_argument('--by', choices=('description', 'day', 'week'), default='description')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help="rows to show (default: 10)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "analytics")
+    
+    if np is None:
+        print("Error: numpy not installed.")
+        print("Run: pip install numpy")
+        return
+    
+    if args.mirror:
+        arrays = load_from_mirror(args.mirror)
+    elif args.store:
+        arrays = load_from_store(args.store)
+    else:
+        arrays = load_from_txt(args.file)
+    if args.user_id:
+        arrays = arrays.for_user(args.user_id)
+    
+    if len(arrays) == 0:
+        print("📭 No tasks found")
+        return
+    
+    first, last = arrays.start.min() // MINUTES_PER_DAY, arrays.start.max() // MINUTES_PER_DAY
+    print(f"📊 {len(arrays):,} tasks, {len(arrays.users)} user(s), "
+          f"{date.fromordinal(int(first) + EPOCH_ORDINAL)} → {date.fromordinal(int(last) + EPOCH_ORDINAL)}")
+    print(f"   Tracked time: {format_minutes(arrays.durations().sum())}")
+    print()
+    
+    if args.by == 'description':
+        rows = top_activities(arrays, args.top)
+        total = max(int(arrays.durations().sum()), 1)
+        for description, minutes in rows:
+            print(f"   {description:30} {format_minutes(minutes):>10} {100 * minutes / total:5.1f}%")
+    else:
+        totals = totals_by_day(arrays) if args.by == 'day' else totals_by_week(arrays)
+        label = "Day" if args.by == 'day' else "Week of"
+        print(f"   {label:12} {'Time':>10}")
+        for day in sorted(totals)[-args.top:]:
+            print(f"   {day.isoformat():12} {format_minutes(totals[day]):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark the Time Allocation Analytics
+=======================================
+
+Compares the vectorized group-bys in analytics.py against plain dict loops
+over the same task dictionaries, on a synthetic multi-year, multi-user log,
+and checks that both give exactly the same totals.
+
+Requirements:
+    pip install numpy
+
+Usage:
+    python bench_analytics.py
+    python bench_analytics.py --days 3650 --users 5 --repeat 5
+
+Output:
+    Time to load the arrays, and per-report time for the loops and for NumPy.
+"""
+
+import argparse
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from analytics import (
+    MINUTES_PER_DAY,
+    load_task_arrays,
+    np,
+    task_minutes,
+    top_activities,
+    totals_by_day,
+    totals_by_description,
+    totals_by_week,
+)
+from convert import iter_task_rows
+from upload_to_firestore import pad_task_id
+from synthetic_data import generate_task_log
+
+
+def synthetic_tasks(days: int, tasks_per_day: int, users: int) -> list[dict]:
+    """Task dicts as upload_to_firestore.py builds them, one synthetic log per user."""
+    tasks = []
+    for user in range(users):
+        user_id = f"user{user}@example.com"
+        rows = list(iter_task_rows(generate_task_log(days, tasks_per_day, seed=42 + user)))
+        for (task_id, description, timestamp), following in zip(rows, rows[1:] + [None]):
+            tasks.append({
+                "id": pad_task_id(task_id),
+                "userId": user_id,
+                "description": description,
+                "startTime": timestamp,
+                "endTime": following[2] if following else timestamp,
+            })
+    return tasks
+
+
+def reference_reports(tasks: list[dict]) -> dict:
+    """The same reports as analytics.py, with one pass of dict updates per task."""
+    by_description = defaultdict(int)
+    by_day = defaultdict(int)
+    by_week = defaultdict(int)
+    
+    for task, (start, end) in zip(tasks, task_minutes(tasks)):
+        duration = end - start
+        day = date(1970, 1, 1) + timedelta(days=start // MINUTES_PER_DAY)
+        by_description[task["description"]] += duration
+        by_day[day] += duration
+        by_week[day - timedelta(days=day.weekday())] += duration
+    
+    top = sorted(by_description.items(), key=lambda item: (-item[1], item[0]))
+    return {
+        "description": {key: value for key, value in by_description.items() if value},
+        "day": dict(by_day),
+        "week": dict(by_week),
+        "top": top,
+    }
+
+
+def vectorized_reports(arrays) -> dict:
+    """All reports from analytics.py."""
+    return {
+        "description": totals_by_description(arrays),
+        "day": totals_by_day(arrays),
+        "week": totals_by_week(arrays),
+        "top": top_activities(arrays, len(arrays.descriptions)),
+    }
+
+
+def best_time(function, argument, repeat: int):
+    """Return the best wall time over `repeat` runs, and the result of the last run."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analytics.py group-bys.")
+    parser.add_argument('--days', type=int, default=3 * 365, help="days in each user's log")
+    parser.add_argument('--tasks-per-day', type=int, default=40)
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per implementation, best one is reported")
+    args = parser.parse_args()
+    
+    if np is None:
+        raise SystemExit("Error: numpy not installed. Run: pip install numpy")
+    
+    tasks = synthetic_tasks(args.days, args.tasks_per_day, args.users)
+    print(f"📄 Synthetic tasks: {len(tasks):,} over {args.days} days × {args.users} user(s)")
+    
+    load, arrays = best_time(load_task_arrays, tasks, args.repeat)
+    before, expected = best_time(reference_reports, tasks, args.repeat)
+    after, actual = best_time(vectorized_reports, arrays, args.repeat)
+    
+    # Ties in the top list are ordered by description in the reference and by first
+    # appearance in analytics.py, so compare that one as (minutes, description) pairs
+    expected["top"] = sorted((minutes, name) for name, minutes in expected["top"])
+    actual["top"] = sorted((minutes, name) for name, minutes in actual["top"])
+    for report in expected:
+        if actual[report] != expected[report]:
+            raise SystemExit(f"❌ '{report}' totals differ from the reference implementation")
+    
+    print(f"✅ Totals identical ({len(actual['day']):,} days, {len(actual['week']):,} weeks)")
+    print()
+    print(f"   {'Load arrays':14} {load:>9.3f}s")
+    print(f"   {'Python loops':14} {before:>9.3f}s")
+    print(f"   {'NumPy':14} {after:>9.3f}s")
+    print(f"   {'Speedup':14} {before / after:>9.1f}x  (reports only)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark the Task Log Parser
+=============================
+
+Compares the single-pass tokenizer in convert.py against the original
+regex-per-step parser on a synthetic multi-year log, and checks that both
+produce exactly the same CSV rows.
+
+Requirements:
+    Python 3.6+ (no external dependencies)
+
+Usage:
+    python bench_convert.py
+    python bench_convert.py --days 3650 --tasks-per-day 50 --repeat 5
+
+Output:
+    Lines/sec for the original parser and the tokenizer, and the speedup.
+"""
+
+import argparse
+import re
+import time
+from datetime import datetime, timedelta
+
+from convert import iter_csv_rows, parse_date, parse_time, time_to_minutes
+from synthetic_data import generate_task_log
+
+
+def reference_csv_rows(lines):
+    """The original convert_tasks_to_csv loop, kept as the baseline for speed and output."""
+    current_date = None
+    current_date_for_timestamp = None
+    task_counter = 0
+    previous_time_minutes = None
+    
+    date_pattern = re.compile(r'^\d{2}/\d{2}/\d{4}$')
+    
+    for line in lines:
+        line = line.rstrip('\n\r')
+        
+        if not line.strip():
+            continue
+        
+        if date_pattern.match(line.strip()):
+            current_date = parse_date(line.strip())
+            current_date_for_timestamp = current_date
+            task_counter = 0
+            previous_time_minutes = None
+            continue
+        
+        if not current_date:
+            continue
+        
+        if not line.strip().startswith('+ '):
+            continue
+        
+        line = line.strip()[2:]
+        
+        time_match = re.search(r'(\d{1,2}h\d{0,2})\s*(\+\d+)?.*$', line)
+        
+        if time_match:
+            time_part = time_match.group(1)
+            description = line[:time_match.start()].strip()
+            formatted_time = parse_time(time_part)
+            
+            if formatted_time and description:
+                current_time_minutes = time_to_minutes(formatted_time)
+                
+                if previous_time_minutes is not None:
+                    if previous_time_minutes - current_time_minutes > 360:
+                        dt = datetime.strptime(current_date_for_timestamp, '%Y%m%d')
+                        dt += timedelta(days=1)
+                        current_date_for_timestamp = dt.strftime('%Y%m%d')
+                
+                previous_time_minutes = current_time_minutes
+                task_counter += 1
+                task_id = f"{current_date}_{task_counter}"
+                
+                year = current_date_for_timestamp[:4]
+                month = current_date_for_timestamp[4:6]
+                day = current_date_for_timestamp[6:8]
+                timestamp = f"{year}-{month}-{day}T{formatted_time}:00-03:00"
+                
+                yield f"{task_id};{description};{timestamp}"
+
+
+def time_parser(parser, lines, repeat):
+    """Return the best wall time over `repeat` runs, and the rows of the last run."""
+    best = float('inf')
+    rows = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = list(parser(lines))
+        best = min(best, time.perf_counter() - start)
+    return best, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the convert.py line parser.")
+    parser.add_argument('--days', type=int, default=3 * 365, help="days in the synthetic log")
+    parser.add_argument('--tasks-per-day', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per parser, best one is reported")
+    args = parser.parse_args()
+    
+    lines = [line + "\n" for line in generate_task_log(args.days, args.tasks_per_day)]
+    print(f"📄 Synthetic log: {len(lines):,} lines over {args.days} days")
+    
+    before, expected = time_parser(reference_csv_rows, lines, args.repeat)
+    after, actual = time_parser(iter_csv_rows, lines, args.repeat)
+    
+    if actual != expected:
+        mismatch = next(i for i, (a, b) in enumerate(zip(actual, expected)) if a != b) \
+            if len(actual) == len(expected) else min(len(actual), len(expected))
+        raise SystemExit(f"❌ Output differs from the original parser at row {mismatch}")
+    
+    print(f"✅ Output identical ({len(actual):,} rows)")
+    print()
+    print(f"   {'Original':10} {len(lines) / before:>14,.0f} lines/sec  ({before:.3f}s)")
+    print(f"   {'Tokenizer':10} {len(lines) / after:>14,.0f} lines/sec  ({after:.3f}s)")
+    print(f"   {'Speedup':10} {before / after:>14.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Benchmark the Ingestion Pipeline
+================================
+
+Times every stage of the pipeline on synthetic data and saves a JSON report,
+so runs can be compared to catch regressions.
+
+Scenarios:
+    convert   convert_tasks_to_csv on a synthetic task log
+    parse     parse_txt_file on the converted tasks.txt
+    hash      calculate_file_hash on the converted tasks.txt
+    upload    upload_to_firestore into an empty emulator
+    migrate   the userId migration (update_tasks_user_id.run_migration)
+    delete    delete_all_tasks
+
+Requirements:
+    Python 3.9+; the Firestore scenarios need firebase-admin and the emulator:
+    
+    firebase emulators:start --only firestore
+    export FIRESTORE_EMULATOR_HOST=localhost:8080
+
+Usage:
+    python bench_pipeline.py                                   # all scenarios, 365 days × 40 tasks
+    python bench_pipeline.py --days 1095 --users 3 --output bench.json
+    python bench_pipeline.py --scenarios convert parse hash    # offline only
+    python bench_pipeline.py --compare bench_old.json          # flag regressions
+
+Report (JSON):
+    params, environment, and per scenario: seconds, items and throughput per
+    second, latency percentiles in ms (per run for the local scenarios, per
+    Firestore RPC for the emulator ones), peak RSS in MB, and the Firestore
+    reads, writes, deletes and commits issued
+
+Notes:
+    - Every scenario runs in a fresh process, so peak RSS is its own
+    - The emulator database is cleared before the upload scenario
+    - Firestore operations are counted client-side by wrapping the client
+      (instrumentation.CountingProxy, the same counting as --profile)
+    - RPC latency percentiles are estimated from histogram buckets
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from instrumentation import CountingProxy, OperationStats, peak_rss_mb
+from synthetic_data import generate_user_logs, write_lines
+
+SCENARIOS = ("convert", "parse", "hash", "upload", "migrate", "delete")
+FIRESTORE_SCENARIOS = ("upload", "migrate", "delete")
+# A slowdown above this fraction is reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.10
+MIGRATION_USER_ID = "a@a.com"
+
+
+def percentiles(samples: list) -> dict:
+    """p50/p90/p99/max of latencies in seconds, reported in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    
+    def at(fraction):
+        return round(1000 * ordered[min(int(fraction * len(ordered)), len(ordered) - 1)], 3)
+    
+    return {"p50": at(0.50), "p90": at(0.90), "p99": at(0.99), "max": round(1000 * ordered[-1], 3)}
+
+
+def reset_emulator():
+    """Delete every document in the emulator database."""
+    from firestore_utils import DEFAULT_EMULATOR_PROJECT
+    
+    host = os.environ["FIRESTORE_EMULATOR_HOST"]
+    project = os.environ.get("GCLOUD_PROJECT", DEFAULT_EMULATOR_PROJECT)
+    request = urllib.request.Request(
+        f"http://{host}/emulator/v1/projects/{project}/databases/(default)/documents", method="DELETE")
+    urllib.request.urlopen(request).close()
+
+
+def timed_runs(function, repeat: int) -> list:
+    """Run `function` `repeat` times and return the wall time of each run."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_scenario(name: str, paths: dict, repeat: int, get_client=None) -> dict:
+    """
+    Run one scenario in this process and return its measurements.
+    `get_client` replaces firestore_utils.get_firestore_client (for tests).
+    """
+    from convert import convert_tasks_to_csv
+    from upload_to_firestore import calculate_file_hash, parse_txt_file
+    
+    stats = OperationStats()
+    items = 0
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        if name == "convert":
+            items, unit = paths["log_lines"], "lines"
+            times = timed_runs(lambda: convert_tasks_to_csv(paths["log"], paths["scratch"]), repeat)
+        elif name == "parse":
+            items, unit = paths["tasks"], "tasks"
+            times = timed_runs(lambda: parse_txt_file(paths["csv"]), repeat)
+        elif name == "hash":
+            items, unit = os.path.getsize(paths["csv"]), "bytes"
+            times = timed_runs(lambda: calculate_file_hash(paths["csv"]), repeat)
+        else:
+            from delete_tasks import delete_all_tasks
+            from firestore_utils import get_firestore_client
+            from update_tasks_user_id import SERVICE_ACCOUNT_PATH, run_migration
+            from upload_to_firestore import upload_to_firestore
+            
+            db = CountingProxy((get_client or get_firestore_client)(SERVICE_ACCOUNT_PATH), stats)
+            if name == "upload":
+                if get_client is None:
+                    reset_emulator()
+                tasks = parse_txt_file(paths["csv"])
+                items, unit = len(tasks), "tasks"
+                action = lambda: upload_to_firestore(tasks, db)
+            elif name == "migrate":
+                items, unit = paths["tasks"], "tasks"
+                action = lambda: run_migration(db, MIGRATION_USER_ID, restart=True)
+            else:
+                items, unit = paths["tasks"], "tasks"
+                action = lambda: delete_all_tasks(db)
+            times = timed_runs(action, 1)
+    
+    seconds = sum(times) / len(times)
+    return {
+        "seconds": round(seconds, 4),
+        "items": items,
+        "unit": unit,
+        "throughput_per_sec": round(items / seconds, 1) if seconds else None,
+        "latency_ms": stats.combined().summary() if stats.latencies else percentiles(times),
+        "latency_of": "rpc" if stats.latencies else "run",
+        "peak_rss_mb": peak_rss_mb(),
+        "operations": dict(stats.counts),
+    }
+
+
+def prepare_data(workdir: str, days: int, tasks_per_day: int, users: int) -> dict:
+    """Write the synthetic log and its converted tasks.txt into `workdir`."""
+    from convert import convert_tasks_to_csv
+    
+    paths = {
+        "log": os.path.join(workdir, "input.txt"),
+        "csv": os.path.join(workdir, "tasks.txt"),
+        "scratch": os.path.join(workdir, "output.txt"),
+    }
+    paths["log_lines"] = write_lines(paths["log"], generate_user_logs(days, tasks_per_day, users))
+    with contextlib.redirect_stdout(io.StringIO()):
+        convert_tasks_to_csv(paths["log"], paths["csv"])
+    with open(paths["csv"], encoding="utf-8") as f:
+        paths["tasks"] = sum(1 for _ in f)
+    return paths
+
+
+def compare_reports(previous: dict, current: dict) -> list:
+    """Print the change per scenario and return the names of the ones that got slower."""
+    regressions = []
+    print(f"\n📈 Compared with {previous.get('created_at', 'previous run')}:")
+    for name, result in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before or not before.get("seconds"):
+            continue
+        change = result["seconds"] / before["seconds"] - 1
+        flag = ""
+        if change > REGRESSION_THRESHOLD:
+            flag = "  ⚠️  regression"
+            regressions.append(name)
+        print(f"   {name:10} {before['seconds']:>9.3f}s → {result['seconds']:>9.3f}s  ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion pipeline.")
+    parser.add_argument('--days', type=int, default=365, help="days per user")
+    parser.add_argument('--tasks-per-day', type=int, default=40)
+    parser.add_argument('--users', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3, help="runs of each local scenario")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--output', help="JSON report path (default: bench_<timestamp>.json)")
+    parser.add_argument('--compare', help="previous JSON report to compare against")
+    args = parser.parse_args()
+    
+    scenarios = [name for name in SCENARIOS if name in args.scenarios]
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        skipped = [name for name in scenarios if name in FIRESTORE_SCENARIOS]
+        if skipped:
+            print(f"ℹ️  FIRESTORE_EMULATOR_HOST not set; skipping {', '.join(skipped)}")
+        scenarios = [name for name in scenarios if name not in FIRESTORE_SCENARIOS]
+    
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "params": {"days": args.days, "tasks_per_day": args.tasks_per_day,
+                   "users": args.users, "repeat": args.repeat},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count(), "emulator": os.environ.get("FIRESTORE_EMULATOR_HOST")},
+        "scenarios": {},
+    }
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = prepare_data(workdir, args.days, args.tasks_per_day, args.users)
+        print(f"📄 Synthetic data: {paths['log_lines']:,} log lines, {paths['tasks']:,} tasks "
+              f"({args.days} days × {args.tasks_per_day} tasks × {args.users} user(s))\n")
+        
+        # A fresh process per scenario keeps peak RSS separate
+        context = multiprocessing.get_context("spawn")
+        for name in scenarios:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(run_scenario, name, paths, args.repeat).result()
+            report["scenarios"][name] = result
+            operations = result["operations"]
+            ops = f"  {operations['reads']}r/{operations['writes']}w/{operations['deletes']}d" \
+                if any(operations.values()) else ""
+            print(f"   {name:10} {result['seconds']:>9.3f}s {result['throughput_per_sec']:>14,.0f} "
+                  f"{result['unit']}/s  p90 {result['latency_ms'].get('p90', 0):>9.2f}ms  "
+                  f"{result['peak_rss_mb']:>7.1f} MB{ops}")
+    
+    output = args.output or f"bench_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Report saved to {output}")
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare_reports(json.load(f), report)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
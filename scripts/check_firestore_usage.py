@@ -17,76 +17,329 @@ Setup:
 
 Usage:
     python check_firestore_usage.py
+    python check_firestore_usage.py --hourly        # also show the last 24 hourly buckets
+    python check_firestore_usage.py --days 7        # daily trend (backfills the cache once)
+    python check_firestore_usage.py --stub          # offline, with a fake Monitoring client
+
+How it works:
+    - All metrics are fetched concurrently
+    - Summing is done by the Monitoring API: each series is aligned to hourly
+      buckets with ALIGN_SUM and all series are merged with REDUCE_SUM, so only
+      one small series comes back per metric
+    - Complete hours are stored in a local SQLite cache (firestore_usage_cache.sqlite);
+      each run only queries the hours since the last fetch, plus the current
+      partial hour, which is never cached
+    - The cache remembers which span it covers per metric, so a larger --days
+      fetches the older hours once
+    - An hour that closed less than SETTLE_SECONDS ago is cached but fetched
+      again on the next run, so late points are picked up
+    - A metric whose request fails is reported and its cache is left as it was
 
 Note:
     Metrics may have a delay of 1-3 minutes. For real-time data, use Firebase Console.
 """
 
+import argparse
+import json
 import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from instrumentation import add_profile_arguments, profile_from_args, timed
 
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "../serviceAccountKey.json"
 
+SERVICE_ACCOUNT_PATH = "../serviceAccountKey.json"
+CACHE_PATH = "../firestore_usage_cache.sqlite"
+
+METRICS = {
+    "reads": "firestore.googleapis.com/document/read_count",
+    "writes": "firestore.googleapis.com/document/write_count",
+    "deletes": "firestore.googleapis.com/document/delete_count",
+}
+
+FREE_TIER_LIMITS = {"reads": 50_000, "writes": 20_000, "deletes": 20_000}
 
-def get_firestore_usage():
-    """Fetch Firestore read, write, and delete counts for today from Cloud Monitoring API."""
-    try:
-        from google.cloud import monitoring_v3
-    except ImportError:
-        print("Error: google-cloud-monitoring not installed.")
-        print("Run: pip install google-cloud-monitoring")
-        return None
+BUCKET_SECONDS = 3600
+# Points can arrive a few minutes late, so a closed hour is only final after this
+SETTLE_SECONDS = 5 * 60
+# The Monitoring API doesn't accept alignment periods shorter than a minute
+MIN_ALIGNMENT_SECONDS = 60
+
+
+class StubMetricServiceClient:
+    """
+    Offline stand-in for monitoring_v3.MetricServiceClient.
+    Returns one already-aggregated series with a deterministic value per bucket,
+    so caching and rendering can be exercised without credentials.
+    """
+    
+    BASE_VALUES = {"read_count": 120, "write_count": 45, "delete_count": 5}
     
-    import json
-    with open("../serviceAccountKey.json") as f:
-        project_id = json.load(f)["project_id"]
+    def __init__(self):
+        self.requests = []
     
-    client = monitoring_v3.MetricServiceClient()
+    def list_time_series(self, request):
+        self.requests.append(request)
+        start = request["interval"]["start_time"]["seconds"]
+        end = request["interval"]["end_time"]["seconds"]
+        period = request["aggregation"]["alignment_period"]["seconds"]
+        base = next(value for name, value in self.BASE_VALUES.items() if name in request["filter"])
+        
+        points = []
+        for bucket_end in range(end, start, -period):
+            hour = datetime.fromtimestamp(bucket_end, timezone.utc).hour
+            points.append(SimpleNamespace(
+                interval=SimpleNamespace(end_time=datetime.fromtimestamp(bucket_end, timezone.utc)),
+                value=SimpleNamespace(int64_value=base * (1 + hour % 6) * period // BUCKET_SECONDS),
+            ))
+        return [SimpleNamespace(points=points)]
+
+
+def open_cache(path: str) -> sqlite3.Connection:
+    """Open (and create if needed) the local time-series cache."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS usage_points (
+            metric TEXT NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            value INTEGER NOT NULL,
+            PRIMARY KEY (metric, bucket_start)
+        );
+        CREATE TABLE IF NOT EXISTS usage_fetches (
+            metric TEXT PRIMARY KEY,
+            fetched_from INTEGER,
+            fetched_until INTEGER NOT NULL
+        );
+    """)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(usage_fetches)")]
+    if "fetched_from" not in columns:
+        # Caches from before fetched_from: the span before fetched_until is fetched again once
+        conn.execute("ALTER TABLE usage_fetches ADD COLUMN fetched_from INTEGER")
+    return conn
+
+
+def build_request(project_name: str, metric_type: str, start: int, end: int, request_enums) -> dict:
+    """Build a list_time_series request that sums all series into buckets spanning [start, end)."""
+    aligner, reducer, view = request_enums
+    return {
+        "name": project_name,
+        "filter": f'metric.type = "{metric_type}"',
+        "interval": {"start_time": {"seconds": start}, "end_time": {"seconds": end}},
+        "aggregation": {
+            "alignment_period": {"seconds": min(BUCKET_SECONDS, end - start)},
+            "per_series_aligner": aligner,
+            "cross_series_reducer": reducer,
+        },
+        "view": view,
+    }
+
+
+@timed("fetch")
+def fetch_buckets(client, request: dict) -> dict:
+    """Run one request and return {bucket_start: value} for the points it returned."""
+    period = request["aggregation"]["alignment_period"]["seconds"]
+    buckets = {}
+    for series in client.list_time_series(request=request):
+        for point in series.points:
+            bucket_start = int(point.interval.end_time.timestamp()) - period
+            buckets[bucket_start] = buckets.get(bucket_start, 0) + point.value.int64_value
+    return buckets
+
+
+def get_firestore_usage(client=None, project_id: str = None, cache_path: str = CACHE_PATH,
+                        days: int = 1, now: datetime = None) -> dict:
+    """
+    Fetch hourly Firestore read, write and delete counts and bring the cache up to date.
+    
+    Returns:
+        dict: {"window": (start, end) datetimes,
+               "hourly": {metric: {bucket_start: value}} for the last `days` days,
+               "current_hour": {metric: value so far}}
+        or None if google-cloud-monitoring is missing.
+    """
+    request_enums = ("ALIGN_SUM", "REDUCE_SUM", "FULL")
+    if client is None:
+        try:
+            from google.cloud import monitoring_v3
+        except ImportError:
+            print("Error: google-cloud-monitoring not installed.")
+            print("Run: pip install google-cloud-monitoring")
+            return None
+        client = monitoring_v3.MetricServiceClient()
+        request_enums = (
+            monitoring_v3.Aggregation.Aligner.ALIGN_SUM,
+            monitoring_v3.Aggregation.Reducer.REDUCE_SUM,
+            monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
+        )
+    
+    if project_id is None:
+        with open(SERVICE_ACCOUNT_PATH) as f:
+            project_id = json.load(f)["project_id"]
     project_name = f"projects/{project_id}"
     
-    now = datetime.now(timezone.utc)
-    start_time = now - timedelta(hours=24)
+    now = int((now or datetime.now(timezone.utc)).timestamp())
+    hour_end = now - now % BUCKET_SECONDS
+    window_start = hour_end - days * 24 * BUCKET_SECONDS
     
-    interval = monitoring_v3.TimeInterval({
-        "end_time": {"seconds": int(now.timestamp())},
-        "start_time": {"seconds": int(start_time.timestamp())},
-    })
+    # The last closed hour is cached, but only final once its late points have settled
+    settled_until = hour_end if now - hour_end >= SETTLE_SECONDS else hour_end - BUCKET_SECONDS
     
-    metrics = {
-        "reads": "firestore.googleapis.com/document/read_count",
-        "writes": "firestore.googleapis.com/document/write_count",
-        "deletes": "firestore.googleapis.com/document/delete_count",
-    }
+    conn = open_cache(cache_path)
+    spans = {name: [fetched_from if fetched_from is not None else fetched_until, fetched_until]
+             for name, fetched_from, fetched_until
+             in conn.execute("SELECT metric, fetched_from, fetched_until FROM usage_fetches")}
     
-    print(f"📊 Firestore Usage (last 24 hours)")
-    print(f"   Project: {project_id}")
-    print(f"   Time: {start_time.strftime('%Y-%m-%d %H:%M')} → {now.strftime('%Y-%m-%d %H:%M')} UTC")
-    print()
+    # Per metric: hours older than the cached span (backfill), hours since it (recent),
+    # both cached, and the current partial hour (not cached)
+    jobs = []
+    for name, metric_type in METRICS.items():
+        span = spans.get(name)
+        if span is None or span[1] < window_start:
+            # Nothing cached that the window can build on
+            span = spans[name] = [window_start, window_start]
+        if window_start < span[0]:
+            jobs.append((name, "backfill", build_request(project_name, metric_type, window_start, span[0],
+                                                         request_enums)))
+        if span[1] < hour_end:
+            jobs.append((name, "recent", build_request(project_name, metric_type, span[1], hour_end,
+                                                       request_enums)))
+        if now - hour_end >= MIN_ALIGNMENT_SECONDS:
+            jobs.append((name, "current", build_request(project_name, metric_type, hour_end, now,
+                                                        request_enums)))
     
-    for name, metric_type in metrics.items():
+    def fetch(job):
+        name, _, request = job
         try:
-            results = client.list_time_series(
-                request={
-                    "name": project_name,
-                    "filter": f'metric.type = "{metric_type}"',
-                    "interval": interval,
-                    "view": monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
-                }
-            )
-            
-            total = 0
-            for series in results:
-                for point in series.points:
-                    total += point.value.int64_value
-            
-            print(f"   {name.capitalize():10} {total:,}")
-            
+            return fetch_buckets(client, request)
         except Exception as e:
             print(f"   {name.capitalize():10} Error: {e}")
+            return None
+    
+    with ThreadPoolExecutor(max_workers=max(len(jobs), 1)) as pool:
+        results = list(pool.map(fetch, jobs))
     
+    current_hour = {name: 0 for name in METRICS}
+    with conn:
+        for (name, kind, _), buckets in zip(jobs, results):
+            if buckets is None:
+                # Failed: the span stays as it was, so the next run asks again
+                continue
+            if kind == "current":
+                current_hour[name] = sum(buckets.values())
+                continue
+            conn.executemany(
+                "INSERT OR REPLACE INTO usage_points (metric, bucket_start, value) VALUES (?, ?, ?)",
+                [(name, bucket_start, value) for bucket_start, value in buckets.items()
+                 if bucket_start < hour_end],
+            )
+            if kind == "backfill":
+                spans[name][0] = window_start
+            else:
+                spans[name][1] = settled_until
+        conn.executemany(
+            "INSERT OR REPLACE INTO usage_fetches (metric, fetched_from, fetched_until) VALUES (?, ?, ?)",
+            [(name, fetched_from, fetched_until) for name, (fetched_from, fetched_until) in spans.items()],
+        )
+    
+    hourly = {name: {} for name in METRICS}
+    rows = conn.execute(
+        "SELECT metric, bucket_start, value FROM usage_points WHERE bucket_start >= ? ORDER BY bucket_start",
+        (window_start,),
+    )
+    for name, bucket_start, value in rows:
+        if name in hourly:
+            hourly[name][bucket_start] = value
+    conn.close()
+    
+    return {
+        "window": (datetime.fromtimestamp(window_start, timezone.utc), datetime.fromtimestamp(now, timezone.utc)),
+        "hourly": hourly,
+        "current_hour": current_hour,
+    }
+
+
+def last_24h_totals(usage: dict) -> dict:
+    """Sum the last 23 complete hours and the current partial hour for each metric."""
+    start = int(usage["window"][1].timestamp()) // BUCKET_SECONDS * BUCKET_SECONDS - 23 * BUCKET_SECONDS
+    return {
+        name: sum(value for bucket_start, value in buckets.items() if bucket_start >= start)
+        + usage["current_hour"][name]
+        for name, buckets in usage["hourly"].items()
+    }
+
+
+def bar(value: int, peak: int, width: int = 30) -> str:
+    """Render a value as a text bar relative to the peak."""
+    return "█" * (round(width * value / peak) if peak else 0)
+
+
+def print_hourly_trend(usage: dict, metric: str):
+    """Print the last 24 complete hours of one metric."""
+    buckets = usage["hourly"][metric]
+    hours = sorted(buckets)[-24:]
+    peak = max((buckets[hour] for hour in hours), default=0)
+    print(f"   Hourly {metric} (UTC):")
+    for hour in hours:
+        label = datetime.fromtimestamp(hour, timezone.utc).strftime('%m-%d %H:00')
+        print(f"   {label}  {buckets[hour]:>8,} {bar(buckets[hour], peak)}")
+    print()
+
+
+def print_daily_trend(usage: dict):
+    """Print the cached usage per UTC day, next to the free tier limits."""
+    days = {}
+    for name, buckets in usage["hourly"].items():
+        for bucket_start, value in buckets.items():
+            day = datetime.fromtimestamp(bucket_start, timezone.utc).strftime('%Y-%m-%d')
+            days.setdefault(day, {metric: 0 for metric in METRICS})[name] += value
+    
+    print(f"   {'Day (UTC)':12} {'Reads':>10} {'Writes':>10} {'Deletes':>10}")
+    for day in sorted(days):
+        totals = days[day]
+        over = [name for name, limit in FREE_TIER_LIMITS.items() if totals[name] > limit]
+        flag = f"  ⚠️  over free tier: {', '.join(over)}" if over else ""
+        print(f"   {day:12} {totals['reads']:>10,} {totals['writes']:>10,} {totals['deletes']:>10,}{flag}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show Firestore reads, writes and deletes.")
+    parser.add_argument('--hourly', action='store_true', help="show hourly buckets for the last 24 hours")
+    parser.add_argument('--days', type=int, default=1, help="days of history to keep and show (default: 1)")
+    parser.add_argument('--stub', action='store_true', help="use a fake Monitoring client (offline)")
+    parser.add_argument('--cache', default=CACHE_PATH, help=f"SQLite cache file (default: {CACHE_PATH})")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "usage")
+    
+    if args.stub:
+        usage = get_firestore_usage(StubMetricServiceClient(), "stub-project", args.cache, args.days)
+    else:
+        usage = get_firestore_usage(cache_path=args.cache, days=args.days)
+    if usage is None:
+        return
+    
+    start, end = usage["window"]
+    totals = last_24h_totals(usage)
+    
+    print(f"📊 Firestore Usage (last 24 hours)")
+    print(f"   Time: {end - timedelta(hours=24):%Y-%m-%d %H:%M} → {end:%Y-%m-%d %H:%M} UTC")
     print()
+    for name in METRICS:
+        print(f"   {name.capitalize():10} {totals[name]:,}")
+    print()
+    
+    if args.hourly:
+        for name in METRICS:
+            print_hourly_trend(usage, name)
+    if args.days > 1:
+        print_daily_trend(usage)
+    
     print("ℹ️  Free tier daily limits: 50,000 reads | 20,000 writes | 20,000 deletes")
 
 
 if __name__ == "__main__":
-    get_firestore_usage()
\ No newline at end of file
+    main()
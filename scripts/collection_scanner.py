@@ -0,0 +1,202 @@
+"""
+Collection Scanner
+==================
+
+Partitioned, parallel full-collection scans shared by the admin scripts.
+
+The collection is split into ranges of document IDs. Task IDs start with
+YYYYMMDD, so the ranges are cut at evenly spaced dates between the first and
+the last ID. Each range is read by its own worker, page by page by cursor,
+with a field projection so only the needed fields are transferred.
+
+Requirements:
+    pip install firebase-admin
+
+Usage:
+    from collection_scanner import scan_collection
+
+    for doc in scan_collection(db, "tasks", fields=["userId"], partitions=8):
+        ...
+
+Notes:
+    - fields=[] transfers only the document names (no bodies)
+    - Documents come back in no particular order across partitions
+    - Equality filters can be combined with the ID ranges without extra
+      indexes; range filters on other fields need a composite index
+    - The first and last ranges are open-ended, so IDs that don't follow
+      the YYYYMMDD scheme are still scanned
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from instrumentation import timed
+
+DOCUMENT_ID = "__name__"
+# The character right after "9", so every ID starting with a digit sorts before it
+DIGITS_END = ":"
+DEFAULT_PARTITIONS = 8
+DEFAULT_PAGE_SIZE = 1000
+# Documents buffered between the workers and the consumer
+QUEUE_SIZE = 5000
+_DONE = object()
+
+
+def parse_id_date(doc_id: str):
+    """Return the date a YYYYMMDD... ID starts with, or None if it doesn't."""
+    try:
+        return date(int(doc_id[:4]), int(doc_id[4:6]), int(doc_id[6:8]))
+    except ValueError:
+        return None
+
+
+def apply_filters(query, filters):
+    """Apply (field, op, value) filters to a query."""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    
+    for field, op, value in filters:
+        query = query.where(filter=FieldFilter(field, op, value))
+    return query
+
+
+def edge_id(db, collection_name: str, filters=(), start_id=None, end_id=None, last=False):
+    """Return the first (or last) document ID in the given range, or None if the range is empty."""
+    query = range_query(db, collection_name, filters, start_id, end_id)
+    query = query.order_by(DOCUMENT_ID, direction="DESCENDING" if last else "ASCENDING")
+    docs = list(query.select([DOCUMENT_ID]).limit(1).stream())
+    return docs[0].id if docs else None
+
+
+def range_query(db, collection_name: str, filters=(), start_id=None, end_id=None):
+    """Query for documents with start_id <= ID < end_id (either bound may be None)."""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    
+    collection_ref = db.collection(collection_name)
+    query = apply_filters(collection_ref, filters)
+    if start_id is not None:
+        query = query.where(filter=FieldFilter(DOCUMENT_ID, ">=", collection_ref.document(start_id)))
+    if end_id is not None:
+        query = query.where(filter=FieldFilter(DOCUMENT_ID, "<", collection_ref.document(end_id)))
+    return query
+
+
+def plan_id_ranges(db, collection_name: str, partitions: int = DEFAULT_PARTITIONS,
+                   filters=(), start_id=None, end_id=None) -> list[tuple]:
+    """
+    Split [start_id, end_id) into up to `partitions` ID ranges of roughly equal date spans.
+    Costs two or three reads (the first and last matching IDs). Returns a list of (start, end) bounds.
+    """
+    first = edge_id(db, collection_name, filters, start_id, end_id)
+    if first is None:
+        return []
+    last = edge_id(db, collection_name, filters, start_id, end_id, last=True)
+    if parse_id_date(last) is None:
+        # IDs that don't start with a date sort after the digits; plan with the last dated one
+        dated_end = DIGITS_END if end_id is None or end_id > DIGITS_END else end_id
+        last = edge_id(db, collection_name, filters, start_id, dated_end, last=True) or last
+    
+    first_date, last_date = parse_id_date(first), parse_id_date(last)
+    if partitions <= 1 or first_date is None or last_date is None or first_date >= last_date:
+        return [(start_id, end_id)]
+    
+    span = (last_date - first_date).days + 1
+    count = min(partitions, span)
+    boundaries = [
+        (first_date + timedelta(days=span * i // count)).strftime("%Y%m%d")
+        for i in range(1, count)
+    ]
+    starts = [start_id] + boundaries
+    ends = boundaries + [end_id]
+    return list(zip(starts, ends))
+
+
+@timed("scan", chunk=1)
+def iter_range(db, collection_name: str, bounds: tuple, fields=None, filters=(),
+               page_size: int = DEFAULT_PAGE_SIZE):
+    """Yield the snapshots of one ID range, page by page with a cursor on the document ID."""
+    collection_ref = db.collection(collection_name)
+    query = range_query(db, collection_name, filters, *bounds).order_by(DOCUMENT_ID)
+    if fields is not None:
+        query = query.select(list(fields) or [DOCUMENT_ID])
+    query = query.limit(page_size)
+    
+    cursor = None
+    while True:
+        page_query = query.start_after(collection_ref.document(cursor)) if cursor else query
+        docs = list(page_query.stream())
+        yield from docs
+        if len(docs) < page_size:
+            return
+        cursor = docs[-1].id
+
+
+def scan_collection(db, collection_name: str, fields=None, filters=(), start_id=None, end_id=None,
+                    partitions: int = DEFAULT_PARTITIONS, workers: int = None,
+                    page_size: int = DEFAULT_PAGE_SIZE):
+    """
+    Yield every matching document, reading the ID ranges concurrently.
+    
+    Args:
+        fields: field paths to transfer (None = whole documents, [] = names only)
+        filters: (field, op, value) tuples, e.g. [("userId", "==", "a@a.com")]
+        start_id, end_id: optional ID bounds, inclusive and exclusive
+        partitions: number of ID ranges to split the scan into
+        workers: concurrent ranges (defaults to one per partition)
+    """
+    ranges = plan_id_ranges(db, collection_name, partitions, filters, start_id, end_id)
+    if not ranges:
+        return
+    
+    results = queue.Queue(maxsize=QUEUE_SIZE)
+    stop = threading.Event()
+    
+    def put(item):
+        # Give up once the consumer has stopped reading, instead of blocking forever
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def scan_range(bounds):
+        try:
+            for doc in iter_range(db, collection_name, bounds, fields, filters, page_size):
+                if not put(doc):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(_DONE)
+    
+    with ThreadPoolExecutor(max_workers=workers or len(ranges)) as pool:
+        for bounds in ranges:
+            pool.submit(scan_range, bounds)
+        
+        remaining = len(ranges)
+        try:
+            while remaining:
+                item = results.get()
+                if item is _DONE:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+
+
+def scan_with_callback(db, collection_name: str, callback, **scan_options) -> int:
+    """
+    Call `callback(snapshot)` for every matching document and return how many were seen.
+    Takes the same options as scan_collection; the callback runs on the calling thread.
+    """
+    count = 0
+    for doc in scan_collection(db, collection_name, **scan_options):
+        callback(doc)
+        count += 1
+    return count
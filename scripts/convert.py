@@ -12,7 +12,13 @@ Setup:
     Place your input.txt file in the parent directory (or update the path in main)
 
 Usage:
-    python convert_tasks.py
+    python convert.py                       # ../input.txt -> output.txt
+    python convert.py input.txt output.txt
+    cat input.txt | python convert.py - - > output.txt
+    python convert.py --jobs 0              # one worker process per CPU
+    python convert.py --incremental         # only parse what was appended
+    python convert.py --incremental --search-index   # and index the new descriptions
+    python convert.py input.txt tasks.bin --format binary   # columnar store, see taskstore.py
 
 Input format (input.txt):
     DD/MM/YYYY
@@ -34,10 +40,35 @@ Notes:
     - Timestamps are in GMT-3 (São Paulo timezone)
     - Tasks after midnight are automatically assigned to the next day
     - The +X notation (duration) is ignored in the output
+    - Input is parsed and written one line at a time, so memory use does not
+      grow with the size of the log
+    - Each task line is tokenized by a single compiled regex; run
+      bench_convert.py to compare it against the original parser
+    - Every DD/MM/YYYY header resets the parser state, so with --jobs the
+      input is split at headers and the day blocks are converted in parallel
+    - With --incremental, output.txt.checkpoint remembers where the last day
+      block starts; the next run re-parses only that block and anything
+      appended after it. Edits to older days are not picked up; run once
+      without --incremental to rebuild after changing history (a full run
+      removes the checkpoint, and one whose output no longer matches is ignored)
+    - With --search-index the re-parsed tasks are also added to the
+      description search index (search_index.py), and tasks that the
+      re-parsed part no longer contains are removed from it
+    - With --format binary the tasks are written as a memory-mapped columnar
+      store (taskstore.py) instead of text
 """
 
+import argparse
+import contextlib
+import hashlib
+import json
+import os
 import re
-from datetime import datetime, timedelta
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import add_profile_arguments, profile_from_args, timed
 
 
 def parse_date(date_str):
@@ -67,77 +98,433 @@ def time_to_minutes(time_str):
     return hours * 60 + minutes
 
 
-def convert_tasks_to_csv(input_file, output_file):
+# Both patterns run against a stripped line. TASK_LINE_PATTERN captures, in a single
+# match: description, hour, minute and the optional +duration. The lazy description
+# stops at the first "<1-2 digits>h", exactly like the original re.search did.
+DATE_HEADER_PATTERN = re.compile(r'\d{2}/\d{2}/\d{4}')
+TASK_LINE_PATTERN = re.compile(r'\+ (.*?)(\d{1,2})h(\d{0,2})\s*(?:\+(\d+))?', re.DOTALL)
+
+# Lines per chunk sent to a worker in --jobs mode. Big enough that pickling and
+# process round trips are small next to the parsing work.
+CHUNK_LINES = 50_000
+
+# --incremental keeps its checkpoint next to the output file, e.g. output.txt.checkpoint.
+# The fingerprints cover the bytes just before the last day block in the input and
+# its first row in the output, so a truncated or replaced file is detected and
+# triggers a full rebuild instead of truncating the output in the wrong place.
+CHECKPOINT_SUFFIX = ".checkpoint"
+CHECKPOINT_VERSION = 2
+FINGERPRINT_BYTES = 4096
+
+# --search-index default, see search_index.py
+SEARCH_INDEX_PATH = "../tasks_search.sqlite"
+
+DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def next_day(date_str):
+    """Return the day after a YYYYMMDD date, also as YYYYMMDD (integer arithmetic only)."""
+    year, month, day = int(date_str[:4]), int(date_str[4:6]), int(date_str[6:8])
+    
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid date: {date_str}")
+    month_days = DAYS_IN_MONTH[month - 1]
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        month_days = 29
+    if not 1 <= day <= month_days or year < 1:
+        raise ValueError(f"Invalid date: {date_str}")
+    
+    if day < month_days:
+        day += 1
+    elif month < 12:
+        month, day = month + 1, 1
+    else:
+        year, month, day = year + 1, 1, 1
+    return f"{year:04d}{month:02d}{day:02d}"
+
+
+def tokenize_line(line):
     """
-    Parse input file and convert to CSV format.
-    Detects midnight crossing by checking if time goes backwards by more than 6 hours.
+    Split a task line into (description, hour, minute, duration) in one pass.
+    Hour and minute are ints, duration is the +X value as an int or None.
+    Returns None for lines that are not valid task lines.
+    
+    Example:
+        '+ Almoçar       12h30 +15' → ('Almoçar', 12, 30, 15)
     """
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    match = TASK_LINE_PATTERN.match(line.strip())
+    if not match:
+        return None
     
-    output_lines = []
+    description = match.group(1).strip()
+    if not description:
+        return None
+    
+    duration = match.group(4)
+    return (
+        description,
+        int(match.group(2)),
+        int(match.group(3) or 0),
+        int(duration) if duration is not None else None,
+    )
+
+
+def iter_task_rows(lines):
+    """
+    Parse task log lines one at a time and yield (task_id, description, timestamp) tuples.
+    Detects midnight crossing by checking if time goes backwards by more than 6 hours.
+    
+    Only the parser state (current date, task counter, previous time) is kept
+    between lines, so memory stays flat regardless of the input size.
+    """
     current_date = None
-    current_date_for_timestamp = None
+    timestamp_date = None
     task_counter = 0
     previous_time_minutes = None
     
-    date_pattern = re.compile(r'^\d{2}/\d{2}/\d{4}$')
+    match_task = TASK_LINE_PATTERN.match
+    match_date = DATE_HEADER_PATTERN.fullmatch
     
     for line in lines:
-        line = line.rstrip('\n\r')
+        line = line.strip()
         
-        if not line.strip():
+        if not line:
             continue
         
-        if date_pattern.match(line.strip()):
-            current_date = parse_date(line.strip())
-            current_date_for_timestamp = current_date
+        if line[0] == '+':
+            if current_date is None:
+                continue
+            
+            match = match_task(line)
+            if match is None:
+                continue
+            
+            description = match.group(1).strip()
+            if not description:
+                continue
+            
+            hour, minute = match.group(2), match.group(3)
+            current_time_minutes = int(hour) * 60 + (int(minute) if minute else 0)
+            
+            if previous_time_minutes is not None and previous_time_minutes - current_time_minutes > 360:
+                timestamp_date = next_day(timestamp_date)
+                timestamp_prefix = f"{timestamp_date[:4]}-{timestamp_date[4:6]}-{timestamp_date[6:8]}T"
+            
+            previous_time_minutes = current_time_minutes
+            task_counter += 1
+            
+            if len(hour) == 1:
+                hour = '0' + hour
+            if len(minute) != 2:
+                minute = '0' + minute if minute else '00'
+            
+            yield (
+                f"{current_date}_{task_counter}",
+                description,
+                f"{timestamp_prefix}{hour}:{minute}:00-03:00",
+            )
+        
+        elif match_date(line):
+            current_date = parse_date(line)
+            timestamp_date = current_date
+            timestamp_prefix = f"{current_date[:4]}-{current_date[4:6]}-{current_date[6:8]}T"
             task_counter = 0
             previous_time_minutes = None
-            continue
-        
-        if not current_date:
-            continue
-        
-        if not line.strip().startswith('+ '):
-            continue
+
+
+def iter_csv_rows(lines):
+    """Parse task log lines one at a time and yield CSV rows as they are produced."""
+    for task_id, description, timestamp in iter_task_rows(lines):
+        yield f"{task_id};{description};{timestamp}"
+
+
+def convert_stream(input_stream, output_stream):
+    """
+    Convert an open text stream to CSV, writing each row as soon as it is parsed.
+    Returns the number of tasks written.
+    """
+    task_count = 0
+    for csv_line in iter_csv_rows(input_stream):
+        output_stream.write(csv_line + "\n")
+        task_count += 1
+    return task_count
+
+
+def iter_day_chunks(lines, chunk_lines=CHUNK_LINES):
+    """
+    Group lines into chunks of at least `chunk_lines` lines, split only at DD/MM/YYYY headers.
+    Every header resets the parser state, so each chunk converts independently of the others.
+    Chunks are yielded as a single string, which is much cheaper to pickle than a list.
+    """
+    match_date = DATE_HEADER_PATTERN.fullmatch
+    chunk = []
+    
+    for line in lines:
+        if len(chunk) >= chunk_lines:
+            stripped = line.strip()
+            if stripped and stripped[0] != '+' and match_date(stripped):
+                yield "".join(chunk)
+                chunk = []
+        chunk.append(line if line.endswith("\n") else line + "\n")
+    
+    if chunk:
+        yield "".join(chunk)
+
+
+def convert_chunk(chunk):
+    """Convert one chunk of the input. Runs in a worker process; returns (csv_text, task_count)."""
+    rows = list(iter_csv_rows(chunk.split("\n")))
+    if not rows:
+        return "", 0
+    return "\n".join(rows) + "\n", len(rows)
+
+
+def convert_stream_parallel(input_stream, output_stream, jobs, chunk_lines=CHUNK_LINES):
+    """
+    Convert an open text stream on a pool of `jobs` processes, writing results in input order.
+    Output is identical to convert_stream. At most 2 * jobs chunks are in flight at once,
+    so memory stays bounded for any input size. Returns the number of tasks written.
+    """
+    task_count = 0
+    
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
         
-        line = line.strip()[2:]
+        for chunk in iter_day_chunks(input_stream, chunk_lines):
+            pending.append(pool.submit(convert_chunk, chunk))
+            if len(pending) >= 2 * jobs:
+                text, count = pending.popleft().result()
+                output_stream.write(text)
+                task_count += count
         
-        time_match = re.search(r'(\d{1,2}h\d{0,2})\s*(\+\d+)?.*$', line)
+        while pending:
+            text, count = pending.popleft().result()
+            output_stream.write(text)
+            task_count += count
+    
+    return task_count
+
+
+def iter_day_blocks(f, offset=0):
+    """
+    Read a binary file from `offset` and yield (block_offset, lines) for each day block.
+    A block starts at a DD/MM/YYYY header; lines before the first header form a block of their own.
+    """
+    match_date = DATE_HEADER_PATTERN.fullmatch
+    block_offset = offset
+    block = []
+    
+    for raw in f:
+        line = raw.decode('utf-8')
+        stripped = line.strip()
+        if stripped and stripped[0] != '+' and match_date(stripped) and block:
+            yield block_offset, block
+            block_offset = offset
+            block = []
+        block.append(line)
+        offset += len(raw)
+    
+    if block:
+        yield block_offset, block
+
+
+def file_fingerprint(f, offset):
+    """Hash the bytes of a binary file just before `offset` and the line starting there."""
+    f.seek(max(offset - FINGERPRINT_BYTES, 0))
+    data = f.read(min(offset, FINGERPRINT_BYTES))
+    return hashlib.sha256(data + f.readline()).hexdigest()
+
+
+def load_checkpoint(checkpoint_file, input_file, output_file):
+    """
+    Return the stored checkpoint if it still matches both files, or None.
+    A missing, outdated or mismatching checkpoint means a full rebuild.
+    """
+    try:
+        with open(checkpoint_file, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        return None
+    
+    try:
+        if os.path.getsize(output_file) < checkpoint['output_offset']:
+            return None
+        if os.path.getsize(input_file) < checkpoint['input_offset']:
+            return None
+        with open(input_file, 'rb') as f:
+            if file_fingerprint(f, checkpoint['input_offset']) != checkpoint['fingerprint']:
+                return None
+        with open(output_file, 'rb') as f:
+            if file_fingerprint(f, checkpoint['output_offset']) != checkpoint['output_fingerprint']:
+                return None
+    except (OSError, KeyError):
+        return None
+    
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_file, checkpoint):
+    """Write the checkpoint atomically, so an interrupted run never leaves a torn file."""
+    temp_file = checkpoint_file + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temp_file, checkpoint_file)
+
+
+@timed("convert")
+def convert_incremental(input_file, output_file, checkpoint_file=None, search_index=None):
+    """
+    Convert only what changed since the last run of an append-only input file.
+    
+    The checkpoint holds the byte offset of the last day block in the input and where its
+    rows start in the output. Since a date header resets the whole parser state, that block
+    can be re-parsed on its own: the output is truncated at its first row and everything
+    from the block onward is appended again. Returns (total_tasks, reparsed_tasks).
+    With `search_index` (a path), the re-parsed tasks are indexed there as well, and the
+    tasks whose rows were truncated but not written again are removed from it.
+    """
+    checkpoint_file = checkpoint_file or output_file + CHECKPOINT_SUFFIX
+    checkpoint = load_checkpoint(checkpoint_file, input_file, output_file)
+    
+    if checkpoint:
+        input_offset = checkpoint['input_offset']
+        output_offset = checkpoint['output_offset']
+        tasks_before = checkpoint['tasks_before']
+    else:
+        input_offset = output_offset = tasks_before = 0
+    
+    block_input_offset, block_output_offset, block_tasks_before = input_offset, output_offset, tasks_before
+    task_count = tasks_before
+    reparsed = [] if search_index else None
+    truncated_ids = set()
+    
+    mode = 'r+b' if os.path.exists(output_file) else 'w+b'
+    with open(input_file, 'rb') as f_in, open(output_file, mode) as f_out:
+        f_in.seek(input_offset)
+        f_out.seek(output_offset)
+        if search_index:
+            truncated_ids.update(line.split(b';', 1)[0].decode('utf-8') for line in f_out if line.strip())
+            f_out.seek(output_offset)
+        f_out.truncate()
         
-        if time_match:
-            time_part = time_match.group(1)
-            description = line[:time_match.start()].strip()
-            formatted_time = parse_time(time_part)
+        for block_offset, lines in iter_day_blocks(f_in, input_offset):
+            block_input_offset = block_offset
+            block_output_offset = f_out.tell()
+            block_tasks_before = task_count
             
-            if formatted_time and description:
-                current_time_minutes = time_to_minutes(formatted_time)
-                
-                if previous_time_minutes is not None:
-                    if previous_time_minutes - current_time_minutes > 360:
-                        dt = datetime.strptime(current_date_for_timestamp, '%Y%m%d')
-                        dt += timedelta(days=1)
-                        current_date_for_timestamp = dt.strftime('%Y%m%d')
-                
-                previous_time_minutes = current_time_minutes
-                task_counter += 1
-                task_id = f"{current_date}_{task_counter}"
-                
-                year = current_date_for_timestamp[:4]
-                month = current_date_for_timestamp[4:6]
-                day = current_date_for_timestamp[6:8]
-                timestamp = f"{year}-{month}-{day}T{formatted_time}:00-03:00"
-                
-                csv_line = f"{task_id};{description};{timestamp}"
-                output_lines.append(csv_line)
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for line in output_lines:
-            f.write(line + "\n")
-    
-    print(f"Conversion complete! Created {output_file} with {len(output_lines)} tasks.")
+            for task_id, description, timestamp in iter_task_rows(lines):
+                f_out.write(f"{task_id};{description};{timestamp}\n".encode('utf-8'))
+                task_count += 1
+                if reparsed is not None:
+                    reparsed.append((task_id, description))
+        
+        fingerprint = file_fingerprint(f_in, block_input_offset)
+        output_fingerprint = file_fingerprint(f_out, block_output_offset)
+    
+    save_checkpoint(checkpoint_file, {
+        'version': CHECKPOINT_VERSION,
+        'input_offset': block_input_offset,
+        'output_offset': block_output_offset,
+        'tasks_before': block_tasks_before,
+        'fingerprint': fingerprint,
+        'output_fingerprint': output_fingerprint,
+    })
+    
+    gone = truncated_ids.difference(task_id for task_id, _ in reparsed or ())
+    if reparsed or gone:
+        from search_index import index_tasks, open_index, remove_tasks
+        from upload_to_firestore import pad_task_id
+        conn = open_index(search_index)
+        index_tasks(conn, ((pad_task_id(task_id), description) for task_id, description in reparsed))
+        remove_tasks(conn, (pad_task_id(task_id) for task_id in sorted(gone)))
+        conn.close()
+    
+    return task_count, task_count - tasks_before
+
+
+def open_text(path, mode):
+    """Open a UTF-8 text file, or stdin/stdout when the path is '-'."""
+    if path == '-':
+        stream = sys.stdin if 'r' in mode else sys.stdout
+        stream.reconfigure(encoding='utf-8')
+        return contextlib.nullcontext(stream)
+    return open(path, mode, encoding='utf-8')
+
+
+@timed("convert")
+def convert_tasks_to_csv(input_file, output_file, jobs=1):
+    """
+    Parse input file and convert to CSV format.
+    Rows are streamed straight to the output file, so the whole input is never held in memory.
+    Either path can be '-' to read from stdin or write to stdout.
+    With jobs > 1 the day blocks are converted on a process pool; the output is the same.
+    An --incremental checkpoint of the output file is removed, since it no longer matches.
+    """
+    if output_file != '-':
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(output_file + CHECKPOINT_SUFFIX)
+    
+    with open_text(input_file, 'r') as f_in, open_text(output_file, 'w') as f_out:
+        if jobs > 1:
+            task_count = convert_stream_parallel(f_in, f_out, jobs)
+        else:
+            task_count = convert_stream(f_in, f_out)
+    
+    # Keep stdout clean for the CSV rows when writing to a pipe
+    log = sys.stderr if output_file == '-' else sys.stdout
+    print(f"Conversion complete! Created {output_file} with {task_count} tasks.", file=log)
+
+
+@timed("convert")
+def convert_tasks_to_store(input_file, output_file):
+    """Parse input file and write the tasks as a columnar binary store (see taskstore.py)."""
+    from taskstore import write_store
+    
+    with open_text(input_file, 'r') as f_in:
+        task_count = write_store(output_file, iter_task_rows(f_in))
+    print(f"Conversion complete! Created {output_file} with {task_count} tasks.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a daily task log to CSV.")
+    parser.add_argument('input', nargs='?', default='../input.txt',
+                        help="task log to read, or '-' for stdin (default: ../input.txt)")
+    parser.add_argument('output', nargs='?', default='output.txt',
+                        help="CSV file to write, or '-' for stdout (default: output.txt)")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="worker processes for day-sharded conversion, 0 = one per CPU (default: 1)")
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help="only re-parse the last day block and what was appended since the last run")
+    parser.add_argument('-f', '--format', choices=('csv', 'binary'), default='csv',
+                        help="csv text, or a columnar binary store (default: csv)")
+    parser.add_argument('--search-index', nargs='?', const=SEARCH_INDEX_PATH,
+                        help=f"with --incremental, also index the re-parsed tasks (default: {SEARCH_INDEX_PATH})")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "convert")
+    
+    if args.search_index and not args.incremental:
+        parser.error("--search-index needs --incremental (run search_index.py build for a full index)")
+    
+    if args.format == 'binary':
+        if args.output == '-' or args.incremental or args.jobs != 1:
+            parser.error("--format binary needs a real output file and no --incremental or --jobs")
+        convert_tasks_to_store(args.input, args.output)
+        return
+    
+    if args.incremental:
+        if '-' in (args.input, args.output):
+            parser.error("--incremental needs real input and output files")
+        total, reparsed = convert_incremental(args.input, args.output, search_index=args.search_index)
+        print(f"Conversion complete! Updated {args.output} with {total} tasks ({reparsed} re-parsed).")
+        return
+    
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    convert_tasks_to_csv(args.input, args.output, jobs=jobs)
 
 
 if __name__ == "__main__":
-    convert_tasks_to_csv('../input.txt', 'output.txt')
\ No newline at end of file
+    main()
@@ -2,7 +2,8 @@
 Delete Tasks from Firestore
 ===========================
 
-This script deletes all tasks from the Firestore 'tasks' collection.
+This script deletes tasks from the Firestore 'tasks' collection: all of them,
+or only those matching a userId and/or a task ID (date) range.
 Use with caution - this action is irreversible.
 
 Requirements:
@@ -12,36 +13,184 @@ Setup:
     1. Place serviceAccountKey.json in the parent directory (or update SERVICE_ACCOUNT_PATH)
 
 Usage:
-    python delete_tasks.py
+    python delete_tasks.py                                  # delete every task
+    python delete_tasks.py --user-id a@a.com                # one user's tasks
+    python delete_tasks.py --from 20251101 --to 20251130    # IDs in a date range
+    python delete_tasks.py --user-id test@test.com --dry-run
+    python delete_tasks.py --from 20251101 --dry-run --mirror   # count locally, no reads
+
+Notes:
+    - Task IDs are padded YYYYMMDDNNN strings, so --from/--to accept a date
+      prefix (YYYYMMDD) or a full ID; both ends are inclusive
+    - Document names are read by collection_scanner over concurrent ID
+      ranges with only the name selected, so bodies are never downloaded
+    - Every page of references is deleted in batched commits on a thread
+      pool while the scan continues
+    - --dry-run only runs a count() aggregation query (1 read per 1000 matches)
+    - Deletes are paced by quota_scheduler.py; once today's free-tier budget is
+      used up the scan stops, and running the same command again tomorrow
+      deletes the rest (--no-quota turns this off)
 """
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from collection_scanner import DEFAULT_PARTITIONS, scan_collection
+from firestore_utils import MAX_BATCH_SIZE, commit_in_batches, count_documents, get_firestore_client
+from instrumentation import add_profile_arguments, profile_from_args
+from mirror import MIRROR_PATH, count_tasks, get_state, open_mirror
+from quota_scheduler import add_quota_arguments, print_deferred, scheduler_from_args
 
 SERVICE_ACCOUNT_PATH = "../serviceAccountKey.json"
 COLLECTION_NAME = "tasks"
 
+DEFAULT_PAGE_SIZE = MAX_BATCH_SIZE
+DEFAULT_WORKERS = 4
+DOCUMENT_ID = "__name__"
+# Sorts after every character used in task IDs, so "<prefix>" closes a prefix range
+PREFIX_END = "\uf8ff"
 
-def delete_all_tasks():
-    """Delete all documents from the tasks collection in Firestore."""
-    cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
+
+def build_delete_query(db, user_id: str = None, from_id: str = None, to_id: str = None):
+    """
+    Build the query selecting the tasks to delete, ordered by document ID.
+    `from_id`/`to_id` are inclusive ID prefixes, e.g. "20251101" or "20251101007".
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
     
     collection_ref = db.collection(COLLECTION_NAME)
-    docs = collection_ref.stream()
+    query = collection_ref
+    
+    if user_id:
+        query = query.where(filter=FieldFilter("userId", "==", user_id))
+    if from_id:
+        query = query.where(filter=FieldFilter(DOCUMENT_ID, ">=", collection_ref.document(from_id)))
+    if to_id:
+        query = query.where(filter=FieldFilter(DOCUMENT_ID, "<", collection_ref.document(to_id + PREFIX_END)))
+    
+    return query.order_by(DOCUMENT_ID)
+
+
+def scan_scope(user_id: str = None, from_id: str = None, to_id: str = None) -> dict:
+    """Translate the delete filters into collection_scanner options."""
+    return {
+        "filters": [("userId", "==", user_id)] if user_id else [],
+        "start_id": from_id or None,
+        "end_id": to_id + PREFIX_END if to_id else None,
+    }
+
+
+def bulk_delete(db, scope: dict = None, page_size: int = DEFAULT_PAGE_SIZE, workers: int = DEFAULT_WORKERS,
+                partitions: int = DEFAULT_PARTITIONS, scheduler=None) -> tuple[int, int]:
+    """
+    Delete every document matching `scope` (see scan_scope; None means the whole collection).
+    
+    Document names are read by collection_scanner over `partitions` concurrent ID ranges,
+    and every `page_size` references are deleted in batched commits, with up to
+    `workers` pages in flight at once. With a `scheduler` the scan stops once
+    today's delete budget is used up (pages already read are queued).
+    
+    Returns:
+        tuple: (deleted count, failed count)
+    """
+    deleted = 0
+    failed = 0
+    
+    def delete_page(refs):
+        return commit_in_batches(db, (("delete", ref, None) for ref in refs), min(page_size, MAX_BATCH_SIZE),
+                                 scheduler=scheduler)
+    
+    def collect(future):
+        nonlocal deleted, failed
+        page_deleted, page_failed = future.result()
+        deleted += page_deleted
+        failed += page_failed
+        print(f"   ✗ Deleted {deleted} tasks so far ({failed} failed)")
     
-    deleted_count = 0
-    for doc in docs:
-        doc.reference.delete()
-        print(f"✗ Deleted: {doc.id}")
-        deleted_count += 1
+    docs = scan_collection(db, COLLECTION_NAME, fields=[], partitions=partitions, **(scope or {}))
     
-    if deleted_count > 0:
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        page = []
+        for doc in docs:
+            if scheduler is not None and scheduler.exhausted:
+                print("   ⏸️  Daily delete budget reached, stopping the scan.")
+                break
+            page.append(doc.reference)
+            if len(page) < page_size:
+                continue
+            in_flight.append(pool.submit(delete_page, page))
+            page = []
+            if len(in_flight) >= workers:
+                collect(in_flight.popleft())
+        if page:
+            in_flight.append(pool.submit(delete_page, page))
+        while in_flight:
+            collect(in_flight.popleft())
+    
+    return deleted, failed
+
+
+def delete_all_tasks(db=None):
+    """Delete all documents from the tasks collection in Firestore."""
+    if db is None:
+        db = get_firestore_client(SERVICE_ACCOUNT_PATH)
+    
+    deleted_count, failed_count = bulk_delete(db)
+    print_summary(deleted_count, failed_count)
+
+
+def print_summary(deleted_count: int, failed_count: int):
+    """Print the outcome of a delete run."""
+    if failed_count:
+        print(f"\n⚠️  Deleted {deleted_count} tasks, {failed_count} failed after retries.")
+    elif deleted_count > 0:
         print(f"\n✅ Successfully deleted {deleted_count} tasks from Firestore!")
     else:
         print("\n⚠️  No tasks found to delete.")
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Delete tasks from Firestore.")
+    parser.add_argument('--user-id', help="only delete tasks with this userId")
+    parser.add_argument('--from', dest='from_id', help="first task ID or YYYYMMDD date to delete (inclusive)")
+    parser.add_argument('--to', dest='to_id', help="last task ID or YYYYMMDD date to delete (inclusive)")
+    parser.add_argument('--dry-run', action='store_true', help="only count the matching tasks")
+    parser.add_argument('--mirror', nargs='?', const=MIRROR_PATH,
+                        help="with --dry-run, count in the local mirror (see mirror.py) instead of Firestore")
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"document references fetched per page (default: {DEFAULT_PAGE_SIZE})")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"pages deleted concurrently (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--partitions', type=int, default=DEFAULT_PARTITIONS,
+                        help=f"ID ranges scanned concurrently (default: {DEFAULT_PARTITIONS})")
+    add_quota_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "delete")
+    
+    if args.dry_run and args.mirror:
+        conn = open_mirror(args.mirror)
+        count = count_tasks(conn, args.user_id, args.from_id, args.to_id)
+        print(f"🔍 Dry run (mirror synced {get_state(conn, 'last_sync') or 'never'}): "
+              f"{count} task(s) would be deleted.")
+        return
+    
+    db = get_firestore_client(SERVICE_ACCOUNT_PATH)
+    
+    if args.dry_run:
+        count = count_documents(build_delete_query(db, args.user_id, args.from_id, args.to_id))
+        print(f"🔍 Dry run: {count} task(s) would be deleted.")
+        return
+    
+    scheduler = scheduler_from_args(args, db, "delete")
+    scope = scan_scope(args.user_id, args.from_id, args.to_id)
+    deleted_count, failed_count = bulk_delete(db, scope, args.page_size, max(args.workers, 1), args.partitions,
+                                              scheduler)
+    print_summary(deleted_count, failed_count)
+    print_deferred(scheduler)
+
+
 if __name__ == "__main__":
-    delete_all_tasks()
\ No newline at end of file
+    main()
@@ -0,0 +1,186 @@
+"""
+Firestore Utilities
+===================
+
+Shared helpers for the Firestore scripts: client setup (including the local
+emulator) and batched writes with retries, optionally paced by a daily budget
+(see quota_scheduler.py).
+
+Requirements:
+    pip install firebase-admin
+
+Emulator:
+    When FIRESTORE_EMULATOR_HOST is set, get_firestore_client() connects to the
+    local emulator instead of the real project and needs no service account:
+    
+    firebase emulators:start --only firestore
+    export FIRESTORE_EMULATOR_HOST=localhost:8080
+    export GCLOUD_PROJECT=demo-skillpulse     # optional
+"""
+
+import os
+import random
+import time
+from itertools import chain
+
+from instrumentation import instrument_client, timed
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_SIZE = 500
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+DEFAULT_EMULATOR_PROJECT = "demo-skillpulse"
+
+
+def get_firestore_client(service_account_path: str):
+    """
+    Return a Firestore client, using the emulator when FIRESTORE_EMULATOR_HOST is set.
+    With --profile (see instrumentation.py) the client counts the operations it issues.
+    """
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore as gcloud_firestore
+        project = os.environ.get("GCLOUD_PROJECT", DEFAULT_EMULATOR_PROJECT)
+        return instrument_client(gcloud_firestore.Client(project=project))
+    
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        cred = credentials.Certificate(service_account_path)
+        firebase_admin.initialize_app(cred)
+    return instrument_client(firestore.client())
+
+
+def get_async_firestore_client(service_account_path: str):
+    """Return an asyncio Firestore client, using the emulator when FIRESTORE_EMULATOR_HOST is set."""
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore as gcloud_firestore
+        project = os.environ.get("GCLOUD_PROJECT", DEFAULT_EMULATOR_PROJECT)
+        return gcloud_firestore.AsyncClient(project=project)
+    
+    import firebase_admin
+    from firebase_admin import credentials, firestore_async
+    
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        cred = credentials.Certificate(service_account_path)
+        firebase_admin.initialize_app(cred)
+    return firestore_async.client()
+
+
+def count_documents(query) -> int:
+    """Count the documents matching a query with a server-side count() aggregation (1 read per 1000)."""
+    result = query.count().get()
+    return int(result[0][0].value)
+
+
+def retryable_errors() -> tuple:
+    """Errors worth retrying: contention, timeouts, throttling and transient server failures."""
+    from google.api_core import exceptions
+    return (
+        exceptions.Aborted,
+        exceptions.DeadlineExceeded,
+        exceptions.InternalServerError,
+        exceptions.ResourceExhausted,
+        exceptions.ServiceUnavailable,
+    )
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0, min(BACKOFF_BASE_SECONDS * (2 ** attempt), BACKOFF_MAX_SECONDS))
+
+
+@timed("write")
+def commit_batch(db, operations: list, max_retries: int = DEFAULT_MAX_RETRIES):
+    """
+    Commit a list of operations as one WriteBatch, retrying transient failures.
+    
+    Each operation is a tuple (kind, doc_ref, data) where kind is "set", "merge"
+    (set with merge=True), "update" or "delete" (data is ignored for deletes). A fresh batch is built for every
+    attempt. Raises the last error once the retries are exhausted.
+    """
+    errors = retryable_errors()
+    
+    for attempt in range(max_retries + 1):
+        batch = db.batch()
+        for kind, doc_ref, data in operations:
+            if kind == "set":
+                batch.set(doc_ref, data)
+            elif kind == "merge":
+                batch.set(doc_ref, data, merge=True)
+            elif kind == "update":
+                batch.update(doc_ref, data)
+            elif kind == "delete":
+                batch.delete(doc_ref)
+            else:
+                raise ValueError(f"Unknown batch operation: {kind}")
+        
+        try:
+            return batch.commit()
+        except errors:
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff_delay(attempt))
+
+
+def commit_in_batches(db, operations, batch_size: int = MAX_BATCH_SIZE,
+                      max_retries: int = DEFAULT_MAX_RETRIES, on_progress=None,
+                      scheduler=None) -> tuple[int, int]:
+    """
+    Commit an iterable of (kind, doc_ref, data) operations in WriteBatches of up to `batch_size`.
+    
+    Operations are consumed lazily, so a generator keeps only one batch in memory.
+    A batch that still fails after its retries is counted as failed and the rest go on.
+    on_progress(committed, failed) is called after every batch.
+    
+    With a `scheduler` (quota_scheduler.QuotaScheduler) every batch waits for the
+    ramp-up rate and is counted against the daily budget. The first batch the budget
+    can't cover, and every operation after it, go to the scheduler's work queue
+    (counted in scheduler.deferred, not in the returned counts).
+    
+    Returns:
+        tuple: (committed operation count, failed operation count)
+    """
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+    
+    committed = 0
+    failed = 0
+    pending = []
+    operations = iter(operations)
+    
+    def flush():
+        nonlocal committed, failed
+        if scheduler is not None and not scheduler.acquire(pending):
+            # Queues the rest of the iterator too, which ends the loop below
+            scheduler.defer(chain(pending, operations))
+            pending.clear()
+            return
+        try:
+            commit_batch(db, pending, max_retries)
+            committed += len(pending)
+            if scheduler is not None:
+                scheduler.record(pending)
+        except Exception as e:
+            failed += len(pending)
+            print(f"   ❌ Batch of {len(pending)} failed: {e}")
+            if scheduler is not None:
+                scheduler.record(pending, committed=False)
+        pending.clear()
+        if on_progress:
+            on_progress(committed, failed)
+    
+    for operation in operations:
+        pending.append(operation)
+        if len(pending) >= batch_size:
+            flush()
+    
+    if pending:
+        flush()
+    
+    return committed, failed
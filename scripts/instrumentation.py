@@ -0,0 +1,586 @@
+"""
+Stage Profiling and Metrics
+===========================
+
+The instrumentation behind the --profile option of every script: wall and CPU
+time per stage, the Firestore reads, writes and deletes actually issued, a
+latency histogram per RPC and the peak memory of the run. The results are saved
+as a JSON summary and a Prometheus textfile, optionally with a cProfile dump, so
+a production run shows whether it is CPU-, I/O- or quota-bound.
+
+Requirements:
+    Python 3.9+ (no external dependencies)
+
+Usage:
+    python upload_to_firestore.py --profile                   # saved to ../profiles
+    python delete_tasks.py --profile --profile-dir /var/lib/node_exporter/textfile
+    python convert.py --cprofile                              # implies --profile
+    python -m pstats ../profiles/convert_20251102_141000.prof
+
+Stages:
+    hash     SHA-256 of tasks.txt
+    parse    reading tasks.txt into tasks
+    convert  the raw log into tasks.txt (convert.py)
+    scan     paging through a collection
+    write    batched commits, including retries and backoff
+    quota    waiting for the quota scheduler's ramp-up
+    verify   checking the result (userId counts, snapshot checksums)
+    index    updating the search index
+    fetch    Cloud Monitoring requests (check_firestore_usage.py)
+    
+    Stage times exclude the stages nested in them, so they add up; the rest of
+    the run's wall time is reported as "other". Stages that run in worker
+    threads are summed across the threads.
+
+Output (in --profile-dir, default ../profiles):
+    <script>_<timestamp>.json   stages, operations, RPC latencies and memory
+    skillpulse_<script>.prom    the same as Prometheus gauges and histograms,
+                                replaced atomically after every run (for the
+                                node_exporter textfile collector)
+    <script>_<timestamp>.prof   with --cprofile (main thread only)
+
+Notes:
+    - Firestore operations are counted client-side by wrapping the client that
+      firestore_utils.get_firestore_client() returns (the asyncio client is not
+      wrapped): documents returned by queries and gets count as reads (a query
+      returning nothing as one), and a count() aggregation as one read per 1000
+      documents, as Firestore bills it
+    - Writes and deletes in a batch or transaction are counted when its commit
+      succeeds, so a retried batch or transaction is counted once; every commit
+      attempt is timed
+    - RPC latencies go into fixed buckets, so a long watch.py run doesn't grow
+      them; percentiles are interpolated within a bucket
+    - Without --profile every hook is a single check of a module global; with
+      it, the parse stage reads up to 64 lines ahead. Generators that yield pages
+      or documents are timed one item at a time, so they hold no more in memory
+      than without --profile
+    - The summary is printed to stderr, so piped output stays clean
+"""
+
+import argparse
+import atexit
+import cProfile
+import inspect
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+
+PROFILE_DIR = "../profiles"
+METRIC_PREFIX = "skillpulse"
+# Generator stages are timed this many items at a time by default (they read ahead as far)
+TIMED_CHUNK = 64
+# Upper bounds in seconds: the Prometheus client's defaults, finer at the low end for the emulator
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# The profile of this run, set by start_profile()
+_active = None
+
+
+class Histogram:
+    """Latency histogram with fixed buckets (seconds)."""
+    
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        self.bounds = bounds
+        # One more bucket for everything above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+    
+    def merge(self, other: "Histogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+    
+    def quantile(self, fraction: float) -> float:
+        """Estimated by interpolating within the bucket the quantile falls into."""
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.max
+    
+    def summary(self) -> dict:
+        """Count, mean, p50/p90/p99 and max in milliseconds."""
+        if not self.count:
+            return {}
+        
+        def ms(seconds):
+            return round(1000 * seconds, 3)
+        
+        return {"count": self.count, "mean": ms(self.sum / self.count), "p50": ms(self.quantile(0.50)),
+                "p90": ms(self.quantile(0.90)), "p99": ms(self.quantile(0.99)), "max": ms(self.max)}
+
+
+class OperationStats:
+    """Thread-safe Firestore operation counters and a latency histogram per RPC."""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {"reads": 0, "writes": 0, "deletes": 0, "commits": 0}
+        self.latencies = {}
+    
+    def add(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counts[name] += amount
+    
+    def record(self, rpc: str, seconds: float):
+        with self.lock:
+            histogram = self.latencies.get(rpc)
+            if histogram is None:
+                histogram = self.latencies[rpc] = Histogram()
+            histogram.observe(seconds)
+    
+    def combined(self) -> Histogram:
+        """All RPC latencies in one histogram."""
+        combined = Histogram()
+        with self.lock:
+            for histogram in self.latencies.values():
+                combined.merge(histogram)
+        return combined
+
+
+def unwrap(value):
+    """The real object behind a CountingProxy, for arguments passed back into the client."""
+    if isinstance(value, CountingProxy):
+        return value._target
+    # FieldFilter(DOCUMENT_ID, ">=", collection_ref.document(...)) holds a reference too
+    if isinstance(getattr(value, "value", None), CountingProxy):
+        value.value = value.value._target
+    return value
+
+
+class CountingProxy:
+    """
+    Wraps a Firestore client, collection, query, document, batch or transaction,
+    counting the operations that reach the server and timing the RPCs. Everything
+    else is passed through.
+    """
+    
+    WRAPPED_TYPES = {"Client", "CollectionReference", "DocumentReference", "Query",
+                     "CollectionGroup", "AggregationQuery", "WriteBatch", "Transaction"}
+    # Writes to these are sent by their commit
+    BUFFERED_TYPES = {"WriteBatch", "Transaction"}
+    OWN_ATTRIBUTES = {"_target", "_stats", "_pending"}
+    
+    def __init__(self, target, stats: OperationStats):
+        self._target = target
+        self._stats = stats
+        # Operations added to a batch, counted when it commits
+        self._pending = {"writes": 0, "deletes": 0}
+    
+    @property
+    def __class__(self):
+        # isinstance() checks inside the client (Transaction.get(query), ...) see the real type
+        return type(self._target)
+    
+    def __setattr__(self, name, value):
+        # @transactional sets state on the transaction it is given
+        if name in self.OWN_ATTRIBUTES:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._target, name, value)
+    
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+        handler = getattr(self, f"_wrap_{name}", None)
+        if handler is not None:
+            return handler(attribute)
+        
+        def call(*args, **kwargs):
+            args = [unwrap(arg) for arg in args]
+            kwargs = {key: unwrap(value) for key, value in kwargs.items()}
+            return self._wrap(attribute(*args, **kwargs))
+        return call
+    
+    def _wrap(self, value):
+        """Wrap results that can issue RPCs themselves."""
+        if type(value).__name__ in self.WRAPPED_TYPES:
+            return CountingProxy(value, self._stats)
+        return value
+    
+    def _counted_documents(self, fetch, rpc: str):
+        """Yield the documents `fetch()` returns, counting a read for each (one if there are none)."""
+        # Only the time spent fetching is measured, not the caller's work between documents
+        elapsed = 0.0
+        returned = 0
+        start = time.perf_counter()
+        documents = iter(fetch())
+        try:
+            for doc in documents:
+                elapsed += time.perf_counter() - start
+                returned += 1
+                self._stats.add("reads")
+                yield doc
+                start = time.perf_counter()
+            elapsed += time.perf_counter() - start
+            # A query that returns nothing still costs one read
+            if not returned:
+                self._stats.add("reads")
+        finally:
+            self._stats.record(rpc, elapsed)
+    
+    def _wrap_stream(self, stream):
+        def counted_stream(*args, **kwargs):
+            return self._counted_documents(lambda: stream(*args, **kwargs), "stream")
+        return counted_stream
+    
+    def _wrap_get(self, get):
+        def counted_get(*args, **kwargs):
+            args = [unwrap(arg) for arg in args]
+            kwargs = {key: unwrap(value) for key, value in kwargs.items()}
+            if type(self._target).__name__ == "Transaction":
+                # Transaction.get(document or query) streams snapshots
+                return self._counted_documents(lambda: get(*args, **kwargs), "transaction_get")
+            start = time.perf_counter()
+            result = get(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            if type(self._target).__name__.endswith("AggregationQuery"):
+                self._stats.record("aggregate", elapsed)
+                documents = sum(int(aggregation.value) for row in result for aggregation in row)
+                self._stats.add("reads", max(1, -(-documents // 1000)))
+            elif isinstance(result, list):
+                self._stats.record("query", elapsed)
+                self._stats.add("reads", max(len(result), 1))
+            else:
+                self._stats.record("get", elapsed)
+                self._stats.add("reads")
+            return result
+        return counted_get
+    
+    def _wrap_set(self, set_):
+        return self._counted_write(set_, "writes", "set")
+    
+    def _wrap_update(self, update):
+        return self._counted_write(update, "writes", "update")
+    
+    def _wrap_delete(self, delete):
+        return self._counted_write(delete, "deletes", "delete")
+    
+    def _counted_write(self, method, counter: str, rpc: str):
+        buffered = type(self._target).__name__ in self.BUFFERED_TYPES
+        
+        def counted(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*[unwrap(arg) for arg in args], **kwargs)
+            if buffered:
+                self._pending[counter] += 1
+            else:
+                self._stats.record(rpc, time.perf_counter() - start)
+                self._stats.add(counter)
+            return self if result is self._target else result
+        return counted
+    
+    def _wrap_commit(self, commit):
+        def counted_commit(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = commit(*args, **kwargs)
+            finally:
+                # Failed attempts are timed too; only a successful commit counts its operations
+                self._stats.record("commit", time.perf_counter() - start)
+            self._stats.add("commits")
+            for counter, count in self._pending.items():
+                self._stats.add(counter, count)
+            return result
+        return counted_commit
+    
+    def _wrap__commit(self, commit):
+        # Transaction's commit, called by @transactional
+        return self._wrap_commit(commit)
+    
+    def _wrap__begin(self, begin):
+        def begin_attempt(*args, **kwargs):
+            # A retried transaction runs its function, and so its writes, again
+            self._pending = {"writes": 0, "deletes": 0}
+            return begin(*args, **kwargs)
+        return begin_attempt
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Profile:
+    """Stage timings, Firestore operations and memory of one run of a script."""
+    
+    def __init__(self, script: str, directory: str = PROFILE_DIR, cprofile: bool = False):
+        self.script = script
+        self.directory = directory
+        self.operations = OperationStats()
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        self.profiler = cProfile.Profile() if cprofile else None
+        if self.profiler is not None:
+            self.profiler.enable()
+    
+    @contextmanager
+    def stage(self, name: str, calls: int = 1):
+        """Time the block as stage `name`; time in nested stages is taken off this one."""
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        # [nested wall seconds, nested CPU seconds]
+        nested = [0.0, 0.0]
+        stack.append(nested)
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - start, time.thread_time() - cpu_start
+            stack.pop()
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+            with self.lock:
+                totals = self.stages.get(name)
+                if totals is None:
+                    totals = self.stages[name] = {"calls": 0, "seconds": 0.0,
+                                                  "self_seconds": 0.0, "self_cpu_seconds": 0.0}
+                totals["calls"] += calls
+                totals["seconds"] += wall
+                totals["self_seconds"] += wall - nested[0]
+                totals["self_cpu_seconds"] += cpu - nested[1]
+    
+    def timed_iter(self, name: str, iterable, chunk: int = TIMED_CHUNK):
+        """
+        Yield from `iterable`, timing it as stage `name` (one call per iterable).
+        Items are pulled `chunk` at a time, so timing a step doesn't cost more
+        than the step; an error is raised after the items pulled before it.
+        """
+        iterator = iter(iterable)
+        calls = 1
+        while True:
+            items = []
+            error = None
+            with self.stage(name, calls):
+                try:
+                    for item in iterator:
+                        items.append(item)
+                        if len(items) == chunk:
+                            break
+                except Exception as e:
+                    error = e
+            calls = 0
+            yield from items
+            if error is not None:
+                raise error
+            if len(items) < chunk:
+                return
+    
+    def summary(self) -> dict:
+        """The run so far, as saved in the JSON file."""
+        wall = time.perf_counter() - self.started
+        cpu = time.process_time() - self.cpu_started
+        with self.lock:
+            stages = {name: {key: round(value, 4) if isinstance(value, float) else value
+                             for key, value in totals.items()}
+                      for name, totals in sorted(self.stages.items(), key=lambda item: -item[1]["self_seconds"])}
+        
+        quota = stages.get("quota", {}).get("self_seconds", 0.0)
+        waiting = max(0.0, wall - cpu - quota)
+        bound = max((cpu, "CPU"), (waiting, "I/O"), (quota, "quota"))[1]
+        
+        return {
+            "script": self.script,
+            "argv": sys.argv[1:],
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "bound": bound,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+            "other_seconds": round(max(0.0, wall - sum(totals["self_seconds"] for totals in stages.values())), 4),
+            "operations": dict(self.operations.counts),
+            "rpc_latency_ms": {rpc: histogram.summary()
+                               for rpc, histogram in sorted(self.operations.latencies.items())},
+        }
+    
+    def finish(self) -> dict:
+        """Stop profiling, save the JSON, Prometheus and cProfile files and print the summary."""
+        global _active
+        if self.profiler is not None:
+            self.profiler.disable()
+        if _active is self:
+            _active = None
+        
+        summary = self.summary()
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"{self.script}_{self.started_at:%Y%m%d_%H%M%S}")
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        
+        textfile = os.path.join(self.directory, f"{METRIC_PREFIX}_{self.script}.prom")
+        with open(textfile + ".tmp", "w", encoding="utf-8") as f:
+            f.write(prometheus_text(summary, self.operations))
+        # The collector may read at any moment, so the file is replaced, never rewritten
+        os.replace(textfile + ".tmp", textfile)
+        
+        saved = [base + ".json", textfile]
+        if self.profiler is not None:
+            self.profiler.dump_stats(base + ".prof")
+            saved.append(base + ".prof")
+        
+        print_summary(summary, saved)
+        return summary
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def prometheus_text(summary: dict, operations: OperationStats) -> str:
+    """The summary in the Prometheus text exposition format (gauges for the last run)."""
+    script = f'script="{escape_label(summary["script"])}"'
+    lines = []
+    
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{METRIC_PREFIX}_{name}{suffix}{{{','.join([script, *labels])}}} {value}")
+    
+    metric("run_timestamp_seconds", "gauge", "When the last run finished.", [("", [], round(time.time(), 3))])
+    metric("run_seconds", "gauge", "Wall time of the last run.", [("", [], summary["wall_seconds"])])
+    metric("run_cpu_seconds", "gauge", "CPU time of the last run.", [("", [], summary["cpu_seconds"])])
+    metric("run_peak_rss_bytes", "gauge", "Peak resident memory of the last run.",
+           [("", [], int(summary["peak_rss_mb"] * 1024 * 1024))])
+    
+    stages = [*summary["stages"].items(), ("other", {"self_seconds": summary["other_seconds"]})]
+    metric("stage_seconds", "gauge", "Wall time per stage in the last run, excluding nested stages.",
+           [("", [f'stage="{escape_label(name)}"'], totals["self_seconds"]) for name, totals in stages])
+    metric("stage_cpu_seconds", "gauge", "CPU time per stage in the last run, excluding nested stages.",
+           [("", [f'stage="{escape_label(name)}"'], totals["self_cpu_seconds"])
+            for name, totals in summary["stages"].items()])
+    metric("firestore_operations", "gauge", "Firestore operations issued by the last run.",
+           [("", [f'operation="{name}"'], count) for name, count in summary["operations"].items()])
+    
+    samples = []
+    with operations.lock:
+        histograms = sorted(operations.latencies.items())
+    for rpc, histogram in histograms:
+        rpc_label = f'rpc="{rpc}"'
+        cumulative = 0
+        for bound, count in zip([*histogram.bounds, "+Inf"], histogram.counts):
+            cumulative += count
+            samples.append(("_bucket", [rpc_label, f'le="{bound}"'], cumulative))
+        samples.append(("_sum", [rpc_label], round(histogram.sum, 6)))
+        samples.append(("_count", [rpc_label], histogram.count))
+    metric("firestore_rpc_seconds", "histogram", "Firestore RPC latency in the last run.", samples)
+    
+    return "\n".join(lines) + "\n"
+
+
+def print_summary(summary: dict, saved: list):
+    """Print where the time went, to stderr."""
+    def show(text=""):
+        print(text, file=sys.stderr)
+    
+    show(f"\n📈 Profile of {summary['script']}: {summary['wall_seconds']:.2f}s wall, "
+         f"{summary['cpu_seconds']:.2f}s CPU, peak {summary['peak_rss_mb']:.1f} MB → {summary['bound']}-bound")
+    for name, totals in summary["stages"].items():
+        show(f"   {name:10} {totals['self_seconds']:>9.3f}s  CPU {totals['self_cpu_seconds']:>8.3f}s  "
+             f"{totals['calls']:>8,} call(s)")
+    show(f"   {'other':10} {summary['other_seconds']:>9.3f}s")
+    
+    operations = summary["operations"]
+    if any(operations.values()):
+        show(f"   Firestore: {operations['reads']} reads, {operations['writes']} writes, "
+             f"{operations['deletes']} deletes, {operations['commits']} commits")
+        for rpc, latency in summary["rpc_latency_ms"].items():
+            show(f"   {rpc:10} p50 {latency['p50']:>9.2f}ms  p90 {latency['p90']:>9.2f}ms  "
+                 f"p99 {latency['p99']:>9.2f}ms  ({latency['count']})")
+    show(f"💾 Profile saved to {', '.join(saved)}")
+
+
+def start_profile(script: str, directory: str = PROFILE_DIR, cprofile: bool = False) -> Profile:
+    """Profile the rest of this run; the results are saved when the process exits."""
+    global _active
+    _active = Profile(script, directory, cprofile)
+    atexit.register(_active.finish)
+    return _active
+
+
+def active_profile():
+    """The profile of this run, or None without --profile."""
+    return _active
+
+
+def stage(name: str):
+    """Context manager timing a block as stage `name` (does nothing without a profile)."""
+    return _active.stage(name) if _active is not None else nullcontext()
+
+
+def timed(name: str, chunk: int = TIMED_CHUNK):
+    """
+    Decorator timing every call of a function, or every step of a generator function, as stage `name`.
+    A generator is read `chunk` items ahead; use chunk=1 for one that yields pages or RPC results.
+    """
+    def decorate(function):
+        if inspect.isgeneratorfunction(function):
+            @wraps(function)
+            def generator(*args, **kwargs):
+                items = function(*args, **kwargs)
+                return _active.timed_iter(name, items, chunk) if _active is not None else items
+            return generator
+        
+        @wraps(function)
+        def call(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with _active.stage(name):
+                return function(*args, **kwargs)
+        return call
+    return decorate
+
+
+def instrument_client(db):
+    """`db` wrapped to count and time its operations while a profile is active."""
+    if _active is None or isinstance(db, CountingProxy):
+        return db
+    return CountingProxy(db, _active.operations)
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """Add --profile, --profile-dir and --cprofile to a script's parser."""
+    parser.add_argument('--profile', action='store_true',
+                        help="time each stage, count Firestore operations and save the results")
+    parser.add_argument('--profile-dir', default=PROFILE_DIR,
+                        help=f"where --profile saves its JSON and Prometheus files (default: {PROFILE_DIR})")
+    parser.add_argument('--cprofile', action='store_true',
+                        help="also save a cProfile dump (implies --profile)")
+
+
+def profile_from_args(args, script: str):
+    """Start profiling if --profile or --cprofile was given. Returns the Profile or None."""
+    if not (args.profile or args.cprofile):
+        return None
+    return start_profile(script, args.profile_dir, args.cprofile)
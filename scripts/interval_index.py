@@ -0,0 +1,193 @@
+"""
+Task Interval Index
+===================
+
+Every task is an interval: it starts at its startTime and ends when the next
+task starts. This index sorts the intervals once and answers "what was I doing
+at 14:10 on 2025-11-02?" and "which tasks overlap this window?" with binary
+searches instead of scanning every row, and flags entries that look like
+midnight-crossing mistakes in convert.py.
+
+Requirements:
+    Python 3.9+ (no external dependencies)
+
+Usage:
+    python interval_index.py at "2025-11-02 14:10"
+    python interval_index.py overlap "2025-11-02 14:00" "2025-11-02 16:00"
+    python interval_index.py starting 2025-11-01 2025-11-02
+    python interval_index.py anomalies --long-hours 16
+    python interval_index.py --mirror --user-id a@a.com at "2025-11-02 14:10"
+
+How it works:
+    - starts, ends and the prefix maximum of ends are kept in start order
+    - A point or window query bisects `starts` for the last candidate and the
+      prefix maximum for the first one, so only tasks that can overlap are
+      looked at: O(log n + k) for a task log, where a task ends when the
+      next one starts (an abnormally long task only adds its own span)
+    - Times are wall-clock minutes, parsed by analytics.task_minutes (ISO or
+      HH:MM start times)
+
+Anomalies:
+    zero-length  the next task starts at the same minute
+    backwards    the task starts before the previous task of the same day
+                 in the file (a missed midnight crossing, or a typo)
+    overlap      the task ends after the next task (in time order) starts
+    long         the task lasts longer than --long-hours (a midnight
+                 crossing detected where there was none)
+"""
+
+import argparse
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+
+from analytics import MINUTES_PER_DAY, task_minutes
+from instrumentation import add_profile_arguments, profile_from_args
+
+TXT_FILE_PATH = "../tasks.txt"
+MIRROR_PATH = "../tasks_mirror.sqlite"
+DEFAULT_LONG_HOURS = 16
+EPOCH = date(1970, 1, 1)
+
+
+def to_minutes(value: str) -> int:
+    """Epoch minutes for "YYYY-MM-DD", "YYYY-MM-DD HH:MM" or an ISO timestamp (offset ignored)."""
+    moment = datetime.fromisoformat(value.strip().replace(" ", "T")[:16])
+    return (moment.date() - EPOCH).days * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+def format_minutes(minutes: int) -> str:
+    """Format epoch minutes as "YYYY-MM-DD HH:MM"."""
+    days, minutes = divmod(minutes, MINUTES_PER_DAY)
+    return f"{EPOCH + timedelta(days=days)} {minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class IntervalIndex:
+    """Tasks as [start, end) intervals in epoch minutes, sorted by start."""
+    
+    def __init__(self, tasks):
+        tasks = list(tasks)
+        # Log order is kept for the anomaly checks; queries use start order
+        self.timed = [(start, end, position, task)
+                      for position, (task, (start, end)) in enumerate(zip(tasks, task_minutes(tasks)))]
+        ordered = sorted(self.timed, key=lambda item: (item[0], item[2]))
+        
+        self.starts = [start for start, _, _, _ in ordered]
+        self.ends = [end for _, end, _, _ in ordered]
+        self.tasks = [task for _, _, _, task in ordered]
+        self.max_ends = []
+        highest = None
+        for end in self.ends:
+            highest = end if highest is None or end > highest else highest
+            self.max_ends.append(highest)
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def _window(self, first: int, last: int, start: int) -> list[tuple]:
+        """(start, end, task) for candidates first..last-1 that end after `start`."""
+        return [(self.starts[i], self.ends[i], self.tasks[i])
+                for i in range(first, last) if self.ends[i] > start]
+    
+    def at(self, moment: int) -> list[tuple]:
+        """Tasks running at `moment` (start <= moment < end), as (start, end, task)."""
+        return self._window(bisect_right(self.max_ends, moment), bisect_right(self.starts, moment), moment)
+    
+    def overlapping(self, start: int, end: int) -> list[tuple]:
+        """Tasks that overlap [start, end), as (start, end, task)."""
+        return self._window(bisect_right(self.max_ends, start), bisect_left(self.starts, end), start)
+    
+    def starting_between(self, start: int, end: int) -> list[tuple]:
+        """Tasks that start in [start, end), as (start, end, task)."""
+        first, last = bisect_left(self.starts, start), bisect_left(self.starts, end)
+        return [(self.starts[i], self.ends[i], self.tasks[i]) for i in range(first, last)]
+    
+    def anomalies(self, long_minutes: int = DEFAULT_LONG_HOURS * 60) -> list[tuple]:
+        """
+        Entries that look like conversion mistakes, as (kind, start, end, task).
+        The last task of the log has no end yet and is not reported as zero-length.
+        """
+        found = []
+        last_position = len(self.timed) - 1
+        
+        for start, end, position, task in self.timed:
+            if position > 0:
+                previous_start, _, _, previous_task = self.timed[position - 1]
+                if start < previous_start and task["id"][:8] == previous_task["id"][:8]:
+                    found.append(("backwards", start, end, task))
+            if end == start and position != last_position:
+                found.append(("zero-length", start, end, task))
+            elif end - start > long_minutes:
+                found.append(("long", start, end, task))
+        
+        for i in range(len(self.starts) - 1):
+            if self.ends[i] > self.starts[i + 1]:
+                found.append(("overlap", self.starts[i], self.ends[i], self.tasks[i]))
+        
+        return found
+
+
+def load_tasks(file_path: str = TXT_FILE_PATH, mirror_path: str = None, user_id: str = None) -> list[dict]:
+    """Tasks from tasks.txt, or from the local mirror (optionally one user's) in ID order."""
+    if mirror_path is None:
+        from upload_to_firestore import iter_txt_file
+        return list(iter_txt_file(file_path))
+    
+    from mirror import open_mirror, preview_tasks
+    conn = open_mirror(mirror_path)
+    rows = preview_tasks(conn, user_id, limit=-1)
+    conn.close()
+    return [{"id": task_id, "description": description, "startTime": start_time, "endTime": end_time}
+            for task_id, description, start_time, end_time, _ in rows]
+
+
+def print_intervals(rows):
+    """Print (start, end, task) rows."""
+    for start, end, task in rows:
+        print(f"   {format_minutes(start)} → {format_minutes(end)}  {task['id']}: {task['description']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Point-in-time and window queries over tasks.")
+    parser.add_argument('--file', default=TXT_FILE_PATH, help=f"tasks file (default: {TXT_FILE_PATH})")
+    parser.add_argument('--mirror', nargs='?', const=MIRROR_PATH, help="read from the local mirror instead")
+    parser.add_argument('--user-id', help="with --mirror, only this user's tasks")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    at_parser = commands.add_parser('at', help="tasks running at a moment")
+    at_parser.add_argument('moment', help='e.g. "2025-11-02 14:10"')
+    
+    for name, help_text in (('overlap', "tasks overlapping a window"), ('starting', "tasks starting in a window")):
+        window_parser = commands.add_parser(name, help=help_text)
+        window_parser.add_argument('start', help='e.g. "2025-11-02 14:00" or 2025-11-02')
+        window_parser.add_argument('end', help="exclusive")
+    
+    anomalies_parser = commands.add_parser('anomalies', help="find zero-length, backwards, overlapping or long tasks")
+    anomalies_parser.add_argument('--long-hours', type=float, default=DEFAULT_LONG_HOURS,
+                                  help=f"tasks longer than this are reported (default: {DEFAULT_LONG_HOURS})")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "intervals")
+    
+    index = IntervalIndex(load_tasks(args.file, args.mirror, args.user_id))
+    print(f"🗂️  {len(index):,} tasks indexed")
+    
+    if args.command == 'at':
+        rows = index.at(to_minutes(args.moment))
+    elif args.command == 'overlap':
+        rows = index.overlapping(to_minutes(args.start), to_minutes(args.end))
+    elif args.command == 'starting':
+        rows = index.starting_between(to_minutes(args.start), to_minutes(args.end))
+    else:
+        found = index.anomalies(int(args.long_hours * 60))
+        print(f"🔎 {len(found)} anomalies")
+        for kind, start, end, task in found:
+            print(f"   {kind:12} {format_minutes(start)} → {format_minutes(end)}  {task['id']}: {task['description']}")
+        return
+    
+    if not rows:
+        print("📭 No tasks")
+    print_intervals(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Local Tasks Mirror
+==================
+
+Keeps a local SQLite copy of the Firestore 'tasks' collection, so counting,
+verification and previews can run locally instead of paying one read per
+document every time.
+
+Requirements:
+    pip install firebase-admin      (only for "sync")
+
+Setup:
+    1. Place serviceAccountKey.json in the parent directory (or update SERVICE_ACCOUNT_PATH)
+
+Usage:
+    python mirror.py sync                     # incremental: only tasks since the watermark
+    python mirror.py sync --full              # rebuild from a full (parallel) scan
+    python mirror.py count                    # tasks per userId
+    python mirror.py verify --user-id a@a.com # same report as update_tasks_user_id.py
+    python mirror.py preview --from 20251101 --to 20251107 --limit 20
+
+How syncing works:
+    - The first sync (or --full) reads the whole collection with collection_scanner
+      and records the newest 'timestamp' as the watermark
+    - Later syncs only query tasks whose 'timestamp' is at or after the watermark,
+      so they cost one read per new or re-uploaded task, plus the tasks that
+      share the watermark's second. Timestamps only have one-second precision
+      (an upload stamps every task with the same one), so a task written in that
+      second after the last sync would be lost with a strict comparison; the
+      ones read again are simply replaced
+    - Deletes, and updates that don't touch 'timestamp' (like the userId
+      migration), are only picked up by "sync --full"
+    - Timestamps are compared as ISO strings, which assumes they all use the
+      same UTC offset (-03:00 for everything written so far)
+
+Mirror structure (tasks_mirror.sqlite):
+    Table tasks: doc_id, id, userId, description, startTime, endTime, timestamp
+        Indexes: id, userId, startTime
+    Table sync_state: key, value (watermark, last_sync, last_full_sync)
+"""
+
+import argparse
+import sqlite3
+from datetime import datetime
+
+from instrumentation import add_profile_arguments, profile_from_args, timed
+
+SERVICE_ACCOUNT_PATH = "../serviceAccountKey.json"
+COLLECTION_NAME = "tasks"
+MIRROR_PATH = "../tasks_mirror.sqlite"
+SYNC_PAGE_SIZE = 500
+
+FIELDS = ("id", "userId", "description", "startTime", "endTime", "timestamp")
+
+
+def open_mirror(path: str = MIRROR_PATH) -> sqlite3.Connection:
+    """Open (and create if needed) the mirror database."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            doc_id TEXT PRIMARY KEY,
+            id TEXT,
+            userId TEXT,
+            description TEXT,
+            startTime TEXT,
+            endTime TEXT,
+            timestamp TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_id ON tasks (id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_user ON tasks (userId);
+        CREATE INDEX IF NOT EXISTS idx_tasks_start ON tasks (startTime);
+        CREATE TABLE IF NOT EXISTS sync_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """)
+    return conn
+
+
+def get_state(conn: sqlite3.Connection, key: str):
+    """Read one sync_state value, or None."""
+    row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_state(conn: sqlite3.Connection, key: str, value: str):
+    """Write one sync_state value."""
+    conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+
+def upsert_docs(conn: sqlite3.Connection, docs) -> tuple[int, str]:
+    """Insert or replace snapshots in the mirror. Returns (count, newest timestamp seen)."""
+    count = 0
+    newest = None
+    rows = []
+    
+    for doc in docs:
+        data = doc.to_dict() or {}
+        rows.append((doc.id, *(data.get(field) for field in FIELDS)))
+        timestamp = data.get("timestamp")
+        if isinstance(timestamp, str) and (newest is None or timestamp > newest):
+            newest = timestamp
+        count += 1
+        if len(rows) >= SYNC_PAGE_SIZE:
+            conn.executemany("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            rows.clear()
+    
+    if rows:
+        conn.executemany("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return count, newest
+
+
+@timed("scan", chunk=1)
+def iter_since(db, watermark: str, page_size: int = SYNC_PAGE_SIZE):
+    """
+    Yield tasks whose timestamp is at or after `watermark`, paging by cursor
+    (the snapshot cursor also orders by document ID, so ties page correctly).
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    
+    query = db.collection(COLLECTION_NAME) \
+        .where(filter=FieldFilter("timestamp", ">=", watermark)) \
+        .order_by("timestamp") \
+        .limit(page_size)
+    last_doc = None
+    
+    while True:
+        page_query = query.start_after(last_doc) if last_doc is not None else query
+        docs = list(page_query.stream())
+        yield from docs
+        if len(docs) < page_size:
+            return
+        last_doc = docs[-1]
+
+
+def sync_mirror(db, conn: sqlite3.Connection, full: bool = False) -> dict:
+    """
+    Bring the mirror up to date with Firestore.
+    
+    Returns:
+        dict: mode ("full" or "incremental"), documents read, and the new watermark
+    """
+    from collection_scanner import scan_collection
+    
+    watermark = None if full else get_state(conn, "watermark")
+    now = datetime.now().isoformat()
+    
+    with conn:
+        if watermark is None:
+            conn.execute("DELETE FROM tasks")
+            count, newest = upsert_docs(conn, scan_collection(db, COLLECTION_NAME))
+            mode = "full"
+            set_state(conn, "last_full_sync", now)
+        else:
+            count, newest = upsert_docs(conn, iter_since(db, watermark))
+            mode = "incremental"
+        
+        watermark = max(filter(None, (watermark, newest)), default=None)
+        if watermark is not None:
+            set_state(conn, "watermark", watermark)
+        set_state(conn, "last_sync", now)
+    
+    return {"mode": mode, "read": count, "watermark": watermark}
+
+
+def count_by_user(conn: sqlite3.Connection) -> list[tuple]:
+    """Task counts per userId (None for tasks without one)."""
+    return conn.execute(
+        "SELECT userId, COUNT(*) FROM tasks GROUP BY userId ORDER BY COUNT(*) DESC"
+    ).fetchall()
+
+
+def userid_counts(conn: sqlite3.Connection, user_id: str) -> dict:
+    """Same counts as update_tasks_user_id.userid_counts, computed from the mirror."""
+    total, matching, missing = conn.execute("""
+        SELECT COUNT(*),
+               COALESCE(SUM(userId = ?), 0),
+               COALESCE(SUM(userId IS NULL), 0)
+        FROM tasks
+    """, (user_id,)).fetchone()
+    return {
+        "total": total,
+        "matching": matching,
+        "mismatched": total - matching - missing,
+        "missing": missing,
+    }
+
+
+def scope_clause(user_id: str = None, from_id: str = None, to_id: str = None) -> tuple[str, list]:
+    """WHERE clause for an optional userId and an inclusive ID prefix range (as in delete_tasks.py)."""
+    clauses, params = [], []
+    if user_id:
+        clauses.append("userId = ?")
+        params.append(user_id)
+    if from_id:
+        clauses.append("id >= ?")
+        params.append(from_id)
+    if to_id:
+        clauses.append("id < ?")
+        params.append(to_id + "\uf8ff")
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+def count_tasks(conn: sqlite3.Connection, user_id: str = None, from_id: str = None, to_id: str = None) -> int:
+    """Count mirrored tasks, optionally filtered like preview_tasks."""
+    where, params = scope_clause(user_id, from_id, to_id)
+    return conn.execute(f"SELECT COUNT(*) FROM tasks {where}", params).fetchone()[0]
+
+
+def preview_tasks(conn: sqlite3.Connection, user_id: str = None, from_id: str = None,
+                  to_id: str = None, limit: int = 20) -> list[tuple]:
+    """Tasks ordered by ID, optionally filtered by userId and an inclusive ID prefix range."""
+    where, params = scope_clause(user_id, from_id, to_id)
+    return conn.execute(
+        f"SELECT id, description, startTime, endTime, userId FROM tasks {where} ORDER BY id LIMIT ?",
+        (*params, limit),
+    ).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SQLite mirror of the tasks collection.")
+    parser.add_argument('--mirror', default=MIRROR_PATH, help=f"mirror database (default: {MIRROR_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    sync_parser = commands.add_parser('sync', help="update the mirror from Firestore")
+    sync_parser.add_argument('--full', action='store_true', help="rebuild from a full scan")
+    
+    commands.add_parser('count', help="count tasks per userId")
+    
+    verify_parser = commands.add_parser('verify', help="check every task has the expected userId")
+    verify_parser.add_argument('--user-id', required=True)
+    
+    preview_parser = commands.add_parser('preview', help="list tasks")
+    preview_parser.add_argument('--user-id')
+    preview_parser.add_argument('--from', dest='from_id', help="first task ID or YYYYMMDD date (inclusive)")
+    preview_parser.add_argument('--to', dest='to_id', help="last task ID or YYYYMMDD date (inclusive)")
+    preview_parser.add_argument('--limit', type=int, default=20)
+    
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "mirror")
+    conn = open_mirror(args.mirror)
+    
+    if args.command == 'sync':
+        from firestore_utils import get_firestore_client
+        db = get_firestore_client(SERVICE_ACCOUNT_PATH)
+        print(f"🔄 Syncing {COLLECTION_NAME} into {args.mirror}...")
+        result = sync_mirror(db, conn, args.full)
+        print(f"✅ {result['mode'].capitalize()} sync: {result['read']} task(s) read")
+        print(f"   Watermark: {result['watermark']}")
+        return
+    
+    last_sync = get_state(conn, "last_sync")
+    print(f"🪞 Mirror last synced: {last_sync or 'never (run: python mirror.py sync)'}")
+    
+    if args.command == 'count':
+        rows = count_by_user(conn)
+        print(f"\n📊 Total tasks: {sum(count for _, count in rows)}")
+        for user_id, count in rows:
+            print(f"   {user_id or '(no userId)':30} {count:,}")
+    
+    elif args.command == 'verify':
+        counts = userid_counts(conn, args.user_id)
+        print(f"\n📊 Verification Results:")
+        print(f"  Total tasks: {counts['total']}")
+        print(f"  With userId: {counts['matching'] + counts['mismatched']}")
+        print(f"  Different userId: {counts['mismatched']}")
+        print(f"  Without userId: {counts['missing']}")
+        if counts["missing"] == 0:
+            print(f"\n✅ All tasks have a userId!")
+        else:
+            print(f"\n⚠️  Some tasks still need updating")
+    
+    elif args.command == 'preview':
+        print()
+        for task_id, description, start_time, end_time, user_id in preview_tasks(
+                conn, args.user_id, args.from_id, args.to_id, args.limit):
+            print(f"   {task_id}: {description} ({start_time} → {end_time}) [{user_id or '-'}]")
+    
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+"""
+Firestore Quota Scheduler
+=========================
+
+Paces the batched writes and deletes of the upload, delete and migration
+scripts so they stay inside the daily free tier (see check_firestore_usage.py)
+and ramp up traffic the way Firestore asks for, instead of firing operations
+until they finish or fail.
+
+Requirements:
+    pip install firebase-admin
+    pip install google-cloud-monitoring    (optional, to seed today's usage)
+
+Usage:
+    python quota_scheduler.py status            # today's budget and the work queue
+    python quota_scheduler.py seed              # refresh today's usage from the Monitoring API
+    python quota_scheduler.py drain             # replay queued operations within today's budget
+    python quota_scheduler.py clear-queue       # drop queued operations (they are lost)
+    
+    The scripts take the same options:
+    python upload_to_firestore.py --reserve 0.2    # leave 20% of the free tier for the app
+    python delete_tasks.py --no-quota              # ignore budgets and ramp-up
+
+How it works:
+    - Token bucket: every batch waits for one token per operation. The rate
+      follows the 500/50/5 rule: start at 500 operations per second and grow
+      by 50% every 5 minutes, so a bulk job runs as fast as is safe for a cold
+      collection (and the sequential YYYYMMDDNNN IDs) without hotspotting
+    - Daily budget: writes (set, merge, update) and deletes are counted in a
+      local ledger per quota day (midnight to midnight, Pacific time, when the
+      free tier resets). At most once an hour the ledger is raised to what the
+      Monitoring API reports for today, which includes the app's own traffic
+    - A batch is charged to the budget when it is admitted, before it is sent,
+      so parallel workers can't all spend the same remainder; a batch whose
+      commit fails gets its share back
+    - A batch that doesn't fit in what is left of today's budget (minus
+      --reserve) is not sent. Its operations and everything after it are saved
+      to a work queue, which the next run (or "drain") replays first, in order,
+      so a large job spreads over several days without overage charges. A
+      queued batch that fails to commit stays queued for the next run
+    - update_tasks_user_id.py pauses at the budget and resumes from its saved
+      cursor; delete_tasks.py stops scanning (only the pages already read are
+      queued), and a rerun simply finds the remaining tasks
+    - Reads are not scheduled, and nothing is scheduled against the emulator
+
+Ledger structure (firestore_quota.sqlite):
+    Table usage: day, metric, used
+    Table work_queue: seq, job, kind, path, data (JSON), queued_at
+    Table quota_state: key, value (last_seed, last_seed_attempt)
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from instrumentation import add_profile_arguments, profile_from_args, timed
+
+SERVICE_ACCOUNT_PATH = "../serviceAccountKey.json"
+QUOTA_PATH = "../firestore_quota.sqlite"
+
+# Same limits as check_firestore_usage.FREE_TIER_LIMITS, which sets credentials on import
+DAILY_LIMITS = {"writes": 20_000, "deletes": 20_000}
+OPERATION_METRICS = {"set": "writes", "merge": "writes", "update": "writes", "delete": "deletes"}
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+# Share of each daily limit left for the app itself
+DEFAULT_RESERVE = 0.1
+
+# 500/50/5: start at 500 operations per second, +50% every 5 minutes
+RAMP_START_RATE = 500
+RAMP_GROWTH = 1.5
+RAMP_PERIOD_SECONDS = 300
+
+SEED_INTERVAL_SECONDS = 3600
+DRAIN_BATCH_SIZE = 500
+
+DATETIME_KEY = "$datetime"
+MAXIMUM_KEY = "$maximum"
+
+
+def quota_day(now: datetime = None) -> str:
+    """The quota day (YYYY-MM-DD in Pacific time, when the free tier resets) of a moment."""
+    return (now or datetime.now(timezone.utc)).astimezone(QUOTA_TIMEZONE).strftime('%Y-%m-%d')
+
+
+def ramp_rate(elapsed_seconds: float) -> float:
+    """Operations per second allowed `elapsed_seconds` after a job started (500/50/5 rule)."""
+    return RAMP_START_RATE * RAMP_GROWTH ** int(elapsed_seconds // RAMP_PERIOD_SECONDS)
+
+
+def operation_counts(operations) -> dict:
+    """{metric: count} of (kind, doc_ref, data) operations."""
+    counts = {}
+    for kind, _, _ in operations:
+        metric = OPERATION_METRICS[kind]
+        counts[metric] = counts.get(metric, 0) + 1
+    return counts
+
+
+class TokenBucket:
+    """Token bucket whose refill rate follows ramp_rate() from the first request on."""
+    
+    def __init__(self, clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.started = None
+        self.tokens = 0.0
+        self.updated = None
+    
+    def rate(self) -> float:
+        """Current refill rate in operations per second."""
+        return ramp_rate(self.clock() - self.started) if self.started is not None else RAMP_START_RATE
+    
+    @timed("quota")
+    def take(self, count: int) -> float:
+        """Take `count` tokens, sleeping until they are available. Returns the seconds slept."""
+        now = self.clock()
+        if self.started is None:
+            self.started = self.updated = now
+            self.tokens = self.rate()
+        
+        rate = self.rate()
+        # A full second of tokens at most, but always enough for one batch
+        self.tokens = min(max(rate, count), self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        self.tokens -= count
+        if self.tokens >= 0:
+            return 0.0
+        
+        # The shortfall is paid back by refilling during the sleep
+        delay = -self.tokens / rate
+        self.sleep(delay)
+        return delay
+
+
+def open_ledger(path: str = QUOTA_PATH) -> sqlite3.Connection:
+    """Open (and create if needed) the usage ledger and work queue."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS usage (
+            day TEXT,
+            metric TEXT,
+            used INTEGER,
+            PRIMARY KEY (day, metric)
+        );
+        CREATE TABLE IF NOT EXISTS work_queue (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            job TEXT,
+            kind TEXT,
+            path TEXT,
+            data TEXT,
+            queued_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS quota_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """)
+    return conn
+
+
+def get_state(conn: sqlite3.Connection, key: str):
+    """Read one quota_state value, or None."""
+    row = conn.execute("SELECT value FROM quota_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_state(conn: sqlite3.Connection, key: str, value: str):
+    """Write one quota_state value."""
+    conn.execute("INSERT OR REPLACE INTO quota_state (key, value) VALUES (?, ?)", (key, value))
+
+
+def used_today(conn: sqlite3.Connection, day: str) -> dict:
+    """{metric: operations used} of one quota day."""
+    used = {metric: 0 for metric in DAILY_LIMITS}
+    used.update(conn.execute("SELECT metric, used FROM usage WHERE day = ?", (day,)))
+    return used
+
+
+def record_usage(conn: sqlite3.Connection, day: str, counts: dict):
+    """Add operation counts to a quota day."""
+    with conn:
+        for metric, count in counts.items():
+            conn.execute("""
+                INSERT INTO usage (day, metric, used) VALUES (?, ?, ?)
+                ON CONFLICT (day, metric) DO UPDATE SET used = used + excluded.used
+            """, (day, metric, count))
+
+
+def seed_usage(conn: sqlite3.Connection, day: str, usage: dict):
+    """Raise a quota day's counts to at least `usage` (e.g. what the Monitoring API reports)."""
+    with conn:
+        for metric, value in usage.items():
+            conn.execute("""
+                INSERT INTO usage (day, metric, used) VALUES (?, ?, ?)
+                ON CONFLICT (day, metric) DO UPDATE SET used = MAX(used, excluded.used)
+            """, (day, metric, value))
+        set_state(conn, "last_seed", datetime.now(timezone.utc).isoformat())
+
+
+def monitoring_usage_today(now: datetime = None):
+    """
+    Today's writes and deletes so far (since midnight Pacific) from the Monitoring API,
+    or None if it can't be reached (no google-cloud-monitoring, no credentials, ...).
+    """
+    try:
+        from check_firestore_usage import get_firestore_usage
+        usage = get_firestore_usage(days=1, now=now)
+    except Exception as e:
+        print(f"   ⚠️  Monitoring API unavailable ({e}); using the local ledger")
+        return None
+    if usage is None:
+        return None
+    
+    now = usage["window"][1]
+    midnight = now.astimezone(QUOTA_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+    since = int(midnight.timestamp())
+    return {
+        metric: sum(value for bucket_start, value in usage["hourly"][metric].items() if bucket_start >= since)
+        + usage["current_hour"][metric]
+        for metric in DAILY_LIMITS
+    }
+
+
+def seed_if_stale(conn: sqlite3.Connection, interval: int = SEED_INTERVAL_SECONDS) -> bool:
+    """Seed today's usage from the Monitoring API unless that was tried in the last `interval` seconds."""
+    now = datetime.now(timezone.utc)
+    last_attempt = get_state(conn, "last_seed_attempt")
+    if last_attempt and (now - datetime.fromisoformat(last_attempt)).total_seconds() < interval:
+        return False
+    with conn:
+        set_state(conn, "last_seed_attempt", now.isoformat())
+    usage = monitoring_usage_today()
+    if usage is None:
+        return False
+    seed_usage(conn, quota_day(), usage)
+    return True
+
+
+def encode_value(value):
+    """json.dumps default= hook for datetimes and maximum transforms in queued operations."""
+    if isinstance(value, datetime):
+        return {DATETIME_KEY: value.isoformat()}
+    if type(value).__name__ == "Maximum":
+        return {MAXIMUM_KEY: value.value}
+    raise TypeError(f"Cannot queue value of type {type(value).__name__}")
+
+
+def decode_object(obj: dict):
+    """json.loads object_hook that restores what encode_value wrote."""
+    if len(obj) == 1 and DATETIME_KEY in obj:
+        return datetime.fromisoformat(obj[DATETIME_KEY])
+    if len(obj) == 1 and MAXIMUM_KEY in obj:
+        from google.cloud.firestore_v1.transforms import Maximum
+        return Maximum(obj[MAXIMUM_KEY])
+    return obj
+
+
+def queued_count(conn: sqlite3.Connection) -> int:
+    """Operations waiting in the work queue."""
+    return conn.execute("SELECT COUNT(*) FROM work_queue").fetchone()[0]
+
+
+class QuotaScheduler:
+    """
+    Shared pacing for batched commits (see firestore_utils.commit_in_batches):
+    acquire() before a batch, record() once its commit succeeded or failed, defer() what
+    doesn't fit today. Safe to use from several threads.
+    """
+    
+    def __init__(self, conn: sqlite3.Connection, job: str, reserve: float = DEFAULT_RESERVE,
+                 limits: dict = None, bucket: TokenBucket = None):
+        self.conn = conn
+        self.job = job
+        self.limits = {metric: int(limit * (1 - reserve)) for metric, limit in (limits or DAILY_LIMITS).items()}
+        self.bucket = bucket or TokenBucket()
+        self.lock = threading.RLock()
+        # Admitted operations whose commit hasn't finished yet, already taken from the budget
+        self.reserved = {}
+        self.deferred = 0
+        self.exhausted = False
+        self.queued = queued_count(conn)
+    
+    def remaining(self) -> dict:
+        """{metric: operations left} of today's budget, not counting admitted batches still in flight."""
+        with self.lock:
+            used = used_today(self.conn, quota_day())
+            return {metric: max(limit - used.get(metric, 0) - self.reserved.get(metric, 0), 0)
+                    for metric, limit in self.limits.items()}
+    
+    def admit(self, operations) -> bool:
+        """
+        Wait for the rate limit and return True if today's budget covers `operations`,
+        which are then reserved until record() settles them.
+        """
+        counts = operation_counts(operations)
+        with self.lock:
+            remaining = self.remaining()
+            if any(count > remaining.get(metric, 0) for metric, count in counts.items()):
+                self.exhausted = True
+                return False
+            for metric, count in counts.items():
+                self.reserved[metric] = self.reserved.get(metric, 0) + count
+            self.bucket.take(len(operations))
+            return True
+    
+    def acquire(self, operations) -> bool:
+        """Like admit(), but also refuses while older operations are still queued, to keep their order."""
+        with self.lock:
+            return not self.queued and not self.exhausted and self.admit(operations)
+    
+    def record(self, operations, committed: bool = True):
+        """
+        Settle admitted operations: count them against today's budget if they were
+        committed, or give their reservation back if the commit failed.
+        """
+        counts = operation_counts(operations)
+        with self.lock:
+            for metric, count in counts.items():
+                self.reserved[metric] = max(self.reserved.get(metric, 0) - count, 0)
+            if committed:
+                record_usage(self.conn, quota_day(), counts)
+    
+    def defer(self, operations) -> int:
+        """Save operations to the work queue, in order. Returns how many were queued."""
+        now = datetime.now().isoformat()
+        rows = (
+            (self.job, kind, doc_ref.path, json.dumps(data, default=encode_value), now)
+            for kind, doc_ref, data in operations
+        )
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT INTO work_queue (job, kind, path, data, queued_at) VALUES (?, ?, ?, ?, ?)", rows)
+            count = self.conn.total_changes - before
+            self.deferred += count
+            self.queued += count
+        return count
+    
+    def drain(self, db, batch_size: int = DRAIN_BATCH_SIZE) -> int:
+        """
+        Replay queued operations in order while today's budget lasts. Returns how many were committed.
+        A batch that fails to commit stops the replay and stays queued with everything after it.
+        """
+        from firestore_utils import commit_batch
+        
+        drained = 0
+        with self.lock:
+            while True:
+                rows = self.conn.execute(
+                    "SELECT seq, kind, path, data FROM work_queue ORDER BY seq LIMIT ?", (batch_size,)).fetchall()
+                if not rows:
+                    break
+                operations = [(kind, db.document(path), json.loads(data, object_hook=decode_object))
+                              for _, kind, path, data in rows]
+                if not self.admit(operations):
+                    break
+                try:
+                    commit_batch(db, operations)
+                except Exception as e:
+                    self.record(operations, committed=False)
+                    print(f"   ❌ Replaying a queued batch of {len(operations)} failed: {e}")
+                    break
+                self.record(operations)
+                with self.conn:
+                    self.conn.execute("DELETE FROM work_queue WHERE seq <= ?", (rows[-1][0],))
+                drained += len(rows)
+            self.queued = queued_count(self.conn)
+        return drained
+
+
+def add_quota_arguments(parser: argparse.ArgumentParser):
+    """Add the scheduler options shared by the scripts that write."""
+    parser.add_argument('--no-quota', action='store_true',
+                        help="ignore the daily free-tier budget and the ramp-up rate")
+    parser.add_argument('--reserve', type=float, default=DEFAULT_RESERVE,
+                        help=f"share of each daily limit to leave for the app (default: {DEFAULT_RESERVE})")
+    parser.add_argument('--quota-ledger', default=QUOTA_PATH,
+                        help=f"usage ledger and work queue (default: {QUOTA_PATH})")
+
+
+def scheduler_from_args(args, db, job: str):
+    """
+    Build the scheduler for a script run, or None with --no-quota or against the emulator.
+    Seeds today's usage if stale and replays queued operations first.
+    """
+    if args.no_quota or os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        return None
+    
+    conn = open_ledger(args.quota_ledger)
+    seed_if_stale(conn)
+    scheduler = QuotaScheduler(conn, job, args.reserve)
+    
+    if scheduler.queued:
+        print(f"⏳ Replaying {scheduler.queued:,} queued operation(s) first...")
+        drained = scheduler.drain(db)
+        print(f"   {drained:,} committed, {scheduler.queued:,} still queued")
+        if scheduler.queued:
+            print("   New operations are queued behind them, to keep the order.")
+    
+    remaining = scheduler.remaining()
+    print(f"🎫 Today's budget: {remaining['writes']:,} writes, {remaining['deletes']:,} deletes left")
+    return scheduler
+
+
+def print_deferred(scheduler):
+    """Tell the user about operations left for another day, if any."""
+    if scheduler is not None and scheduler.deferred:
+        print(f"\n⏳ Daily budget reached: {scheduler.deferred:,} operation(s) queued. "
+              f"They are sent first on the next run (or: python quota_scheduler.py drain).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Firestore daily budget and work queue.")
+    parser.add_argument('command', choices=('status', 'seed', 'drain', 'clear-queue'))
+    parser.add_argument('--reserve', type=float, default=DEFAULT_RESERVE,
+                        help=f"share of each daily limit to leave for the app (default: {DEFAULT_RESERVE})")
+    parser.add_argument('--quota-ledger', default=QUOTA_PATH,
+                        help=f"usage ledger and work queue (default: {QUOTA_PATH})")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "quota")
+    
+    conn = open_ledger(args.quota_ledger)
+    
+    if args.command == 'seed':
+        usage = monitoring_usage_today()
+        if usage is None:
+            return
+        seed_usage(conn, quota_day(), usage)
+        print(f"✅ Seeded {quota_day()}: {usage['writes']:,} writes, {usage['deletes']:,} deletes so far")
+    
+    elif args.command == 'drain':
+        from firestore_utils import get_firestore_client
+        
+        scheduler = QuotaScheduler(conn, "drain", args.reserve)
+        seed_if_stale(conn)
+        db = get_firestore_client(SERVICE_ACCOUNT_PATH)
+        print(f"⏳ Replaying {scheduler.queued:,} queued operation(s)...")
+        drained = scheduler.drain(db)
+        print(f"✅ {drained:,} committed, {scheduler.queued:,} still queued")
+    
+    elif args.command == 'clear-queue':
+        with conn:
+            cleared = conn.execute("DELETE FROM work_queue").rowcount
+        print(f"🗑️  {cleared:,} queued operation(s) dropped")
+    
+    else:
+        scheduler = QuotaScheduler(conn, "status", args.reserve)
+        day = quota_day()
+        used = used_today(conn, day)
+        remaining = scheduler.remaining()
+        print(f"🎫 Quota day {day} (Pacific time), last seeded: {get_state(conn, 'last_seed') or 'never'}")
+        for metric, limit in DAILY_LIMITS.items():
+            print(f"   {metric.capitalize():8} {used[metric]:>7,} used of {limit:,}, "
+                  f"{remaining[metric]:,} left after the {args.reserve:.0%} reserve")
+        print(f"\n📬 Work queue: {scheduler.queued:,} operation(s)")
+        for job, count, first in conn.execute(
+                "SELECT job, COUNT(*), MIN(queued_at) FROM work_queue GROUP BY job ORDER BY MIN(seq)"):
+            print(f"   {job:10} {count:>7,}  since {first}")
+    
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Daily Task Rollups
+==================
+
+One Firestore document per user per day with that day's totals, so daily and
+weekly summaries cost one read per day instead of reading every task.
+
+upload_to_firestore.py builds the rollups while it streams tasks.txt and only
+writes the ones for days whose tasks changed in that upload.
+
+Requirements:
+    pip install firebase-admin
+
+Usage:
+    python rollups.py summary --from 20251027 --to 20251102   # one read per day
+    python rollups.py summary --weekly --from 20251001
+    python rollups.py rebuild                                  # rewrite every day from tasks.txt
+
+Firestore structure:
+    Collection: daily_rollups
+        Document ID: {userId}_{YYYYMMDD}  (e.g., a@a.com_20251101)
+        Fields: userId, day, task_count, total_minutes,
+                minutes_by_description (map of description → minutes),
+                first_timestamp (first task's startTime),
+                last_timestamp (last task's endTime), updated_at
+
+Notes:
+    - A day is the date in the task ID, so tasks after midnight count towards
+      the day they were logged in
+    - A task lasts until the next one starts, so the last task of the file
+      has no minutes yet
+"""
+
+import argparse
+from datetime import date, datetime, timedelta
+from itertools import tee
+
+from analytics import task_minutes
+from firestore_utils import MAX_BATCH_SIZE, commit_in_batches, get_firestore_client
+from instrumentation import add_profile_arguments, profile_from_args
+
+SERVICE_ACCOUNT_PATH = "../serviceAccountKey.json"
+TXT_FILE_PATH = "../tasks.txt"
+ROLLUP_COLLECTION = "daily_rollups"
+DEFAULT_USER_ID = "a@a.com"
+
+
+def task_day(task: dict) -> str:
+    """The YYYYMMDD day a task belongs to (from its ID)."""
+    return task["id"][:8]
+
+
+def rollup_doc_id(user_id: str, day: str) -> str:
+    """Document ID of one user's rollup for one day."""
+    return f"{user_id}_{day}"
+
+
+def track_rollups(tasks, rollups: dict):
+    """
+    Yield `tasks` unchanged while adding each one to `rollups` ({day: rollup}),
+    so the totals are ready once the upload has consumed the file.
+    """
+    tasks, timed = tee(tasks)
+    for task, (start, end) in zip(tasks, task_minutes(timed)):
+        day = task_day(task)
+        rollup = rollups.get(day)
+        if rollup is None:
+            rollup = rollups[day] = {
+                "task_count": 0,
+                "total_minutes": 0,
+                "minutes_by_description": {},
+                "first_timestamp": task["startTime"],
+                "last_timestamp": task["endTime"],
+            }
+        minutes = end - start
+        by_description = rollup["minutes_by_description"]
+        by_description[task["description"]] = by_description.get(task["description"], 0) + minutes
+        rollup["task_count"] += 1
+        rollup["total_minutes"] += minutes
+        rollup["last_timestamp"] = task["endTime"]
+        yield task
+
+
+def rollup_operations(db, rollups: dict, days, user_id: str = DEFAULT_USER_ID):
+    """
+    Batch operations that rewrite the rollups of `days` for one user.
+    Days that no longer have tasks get their rollup deleted.
+    """
+    collection_ref = db.collection(ROLLUP_COLLECTION)
+    updated_at = datetime.now().isoformat()
+    
+    for day in sorted(days):
+        doc_ref = collection_ref.document(rollup_doc_id(user_id, day))
+        rollup = rollups.get(day)
+        if rollup is None:
+            yield "delete", doc_ref, None
+        else:
+            yield "set", doc_ref, {"userId": user_id, "day": day, **rollup, "updated_at": updated_at}
+
+
+def write_rollups(db, rollups: dict, days, user_id: str = DEFAULT_USER_ID,
+                  batch_size: int = MAX_BATCH_SIZE, scheduler=None) -> tuple[int, int]:
+    """
+    Write the rollups of `days` in batched commits (paced by `scheduler`, if given).
+    
+    Returns:
+        tuple: (days committed, days failed)
+    """
+    return commit_in_batches(db, rollup_operations(db, rollups, days, user_id), batch_size, scheduler=scheduler)
+
+
+def load_rollups(db, user_id: str, from_day: str, to_day: str) -> dict:
+    """Read one user's rollups for an inclusive day range (one read per day). Returns {day: document}."""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    
+    collection_ref = db.collection(ROLLUP_COLLECTION)
+    query = collection_ref \
+        .where(filter=FieldFilter("__name__", ">=", collection_ref.document(rollup_doc_id(user_id, from_day)))) \
+        .where(filter=FieldFilter("__name__", "<=", collection_ref.document(rollup_doc_id(user_id, to_day))))
+    return {doc.get("day"): doc.to_dict() for doc in query.stream()}
+
+
+def weekly_totals(rollups: dict) -> dict:
+    """Combine daily rollup documents into {Monday (YYYYMMDD): {task_count, total_minutes, minutes_by_description}}."""
+    weeks = {}
+    for day, rollup in rollups.items():
+        day_date = date(int(day[:4]), int(day[4:6]), int(day[6:8]))
+        monday = (day_date - timedelta(days=day_date.weekday())).strftime('%Y%m%d')
+        week = weeks.setdefault(monday, {"task_count": 0, "total_minutes": 0, "minutes_by_description": {}})
+        week["task_count"] += rollup["task_count"]
+        week["total_minutes"] += rollup["total_minutes"]
+        for description, minutes in rollup["minutes_by_description"].items():
+            week["minutes_by_description"][description] = week["minutes_by_description"].get(description, 0) + minutes
+    return weeks
+
+
+def format_minutes(minutes: int) -> str:
+    """Format minutes as e.g. "12h05"."""
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours}h{minutes:02d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily task rollups.")
+    parser.add_argument('--user-id', default=DEFAULT_USER_ID, help=f"user (default: {DEFAULT_USER_ID})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    summary_parser = commands.add_parser('summary', help="show daily or weekly totals from the rollups")
+    summary_parser.add_argument('--from', dest='from_day', help="first day (YYYYMMDD, default: 6 days ago)")
+    summary_parser.add_argument('--to', dest='to_day', help="last day (YYYYMMDD, default: today)")
+    summary_parser.add_argument('--weekly', action='store_true', help="group the days by week")
+    summary_parser.add_argument('--top', type=int, default=3, help="activities to show per row (default: 3)")
+    
+    rebuild_parser = commands.add_parser('rebuild', help="rewrite the rollups of every day in the tasks file")
+    rebuild_parser.add_argument('--file', default=TXT_FILE_PATH, help=f"tasks file (default: {TXT_FILE_PATH})")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "rollups")
+    
+    db = get_firestore_client(SERVICE_ACCOUNT_PATH)
+    
+    if args.command == 'rebuild':
+        from upload_to_firestore import iter_txt_file
+        
+        rollups = {}
+        for _ in track_rollups(iter_txt_file(args.file), rollups):
+            pass
+        committed, failed = write_rollups(db, rollups, rollups, args.user_id)
+        print(f"✅ {committed} daily rollups written for {args.user_id} ({failed} failed)")
+        return
+    
+    today = date.today()
+    to_day = args.to_day or today.strftime('%Y%m%d')
+    from_day = args.from_day or (today - timedelta(days=6)).strftime('%Y%m%d')
+    rollups = load_rollups(db, args.user_id, from_day, to_day)
+    rows = weekly_totals(rollups) if args.weekly else rollups
+    
+    print(f"📊 {args.user_id}: {from_day} → {to_day} ({len(rollups)} reads)")
+    print()
+    print(f"   {'Week of' if args.weekly else 'Day':10} {'Tasks':>6} {'Time':>9}  Top activities")
+    for day in sorted(rows):
+        row = rows[day]
+        top = sorted(row["minutes_by_description"].items(), key=lambda item: -item[1])[:args.top]
+        activities = ", ".join(f"{description} {format_minutes(minutes)}" for description, minutes in top)
+        print(f"   {day:10} {row['task_count']:>6} {format_minutes(row['total_minutes']):>9}  {activities}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+Task Description Search Index
+=============================
+
+A persistent SQLite inverted index over task descriptions, so finding every
+"Ida ao banheiro" (or "ida ao BANHEIRO", or "Bate-papo" when you typed
+"bate papo") is a few index lookups instead of a substring scan of tasks.txt.
+
+Requirements:
+    Python 3.9+ (no external dependencies)
+
+Usage:
+    python search_index.py build                      # index ../tasks.txt from scratch
+    python search_index.py build --mirror             # index the local mirror instead
+    python search_index.py search banheiro            # every token must match
+    python search_index.py search "bate pa" --prefix  # last token is a prefix
+    python search_index.py fuzzy "bate boca tayane"   # trigram similarity, typos allowed
+    python search_index.py groups --top 20            # activities over the full history
+    python search_index.py stats
+
+Index structure (tasks_search.sqlite):
+    Table descriptions: desc_id, description, folded, trigram_count
+    Table tasks: id, desc_id                  (the posting list of each description;
+                                               IDs as in Firestore, YYYYMMDDNNN)
+    Table tokens: token, desc_id              (folded word → descriptions)
+    Table trigrams: trigram, desc_id          (for fuzzy matches)
+    Table index_state: key, value (source, last_build, last_update)
+
+How it works:
+    - Text is folded before indexing and searching: NFKD, accents dropped,
+      casefolded, so "Almoçar" and "almocar" are the same token
+    - The log repeats the same few hundred descriptions thousands of times, so
+      tokens and trigrams point to distinct descriptions, and each description
+      to its task IDs; a lookup touches one posting per description
+    - Prefix matches are a range scan over the tokens primary key
+    - Trigrams are taken per token with "  " / " " padding (as pg_trgm does);
+      fuzzy similarity is shared / (query + description - shared) trigrams
+
+Incremental updates:
+    - convert.py --incremental --search-index indexes the tasks it re-parses
+    - upload_to_firestore.py indexes the tasks it uploads (the manifest delta)
+      and drops the ones it deletes, if the index exists
+    - Build the index once with "build"; after that it only sees changes
+"""
+
+import argparse
+import re
+import sqlite3
+import unicodedata
+from datetime import datetime
+
+from instrumentation import add_profile_arguments, profile_from_args, timed
+
+TXT_FILE_PATH = "../tasks.txt"
+MIRROR_PATH = "../tasks_mirror.sqlite"
+SEARCH_INDEX_PATH = "../tasks_search.sqlite"
+DEFAULT_FUZZY_THRESHOLD = 0.3
+# Sorts after every folded token, so token < prefix + PREFIX_END covers all tokens starting with prefix
+PREFIX_END = "\U0010ffff"
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Accent- and case-folded text: "Almoçar" → "almocar"."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text: str) -> list[str]:
+    """Folded word tokens of a description."""
+    return TOKEN_PATTERN.findall(fold(text))
+
+
+def trigrams(text: str) -> set[str]:
+    """Trigrams of each folded token, padded with two spaces in front and one after."""
+    grams = set()
+    for token in tokenize(text):
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def open_index(path: str = SEARCH_INDEX_PATH) -> sqlite3.Connection:
+    """Open (and create if needed) the search index."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS descriptions (
+            desc_id INTEGER PRIMARY KEY,
+            description TEXT UNIQUE,
+            folded TEXT,
+            trigram_count INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_descriptions_folded ON descriptions (folded);
+        CREATE TABLE IF NOT EXISTS tasks (
+            id TEXT PRIMARY KEY,
+            desc_id INTEGER
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_tasks_desc ON tasks (desc_id, id);
+        CREATE TABLE IF NOT EXISTS tokens (
+            token TEXT,
+            desc_id INTEGER,
+            PRIMARY KEY (token, desc_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS trigrams (
+            trigram TEXT,
+            desc_id INTEGER,
+            PRIMARY KEY (trigram, desc_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS index_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """)
+    return conn
+
+
+def set_state(conn: sqlite3.Connection, key: str, value: str):
+    """Write one index_state value."""
+    conn.execute("INSERT OR REPLACE INTO index_state (key, value) VALUES (?, ?)", (key, value))
+
+
+def get_state(conn: sqlite3.Connection, key: str):
+    """Read one index_state value, or None."""
+    row = conn.execute("SELECT value FROM index_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def description_id(conn: sqlite3.Connection, description: str, cache: dict) -> int:
+    """The desc_id of a description, adding it and its tokens and trigrams the first time it is seen."""
+    desc_id = cache.get(description)
+    if desc_id is not None:
+        return desc_id
+    
+    row = conn.execute("SELECT desc_id FROM descriptions WHERE description = ?", (description,)).fetchone()
+    if row:
+        desc_id = row[0]
+    else:
+        grams = trigrams(description)
+        desc_id = conn.execute(
+            "INSERT INTO descriptions (description, folded, trigram_count) VALUES (?, ?, ?)",
+            (description, " ".join(tokenize(description)), len(grams)),
+        ).lastrowid
+        conn.executemany("INSERT OR IGNORE INTO tokens VALUES (?, ?)",
+                         ((token, desc_id) for token in set(tokenize(description))))
+        conn.executemany("INSERT OR IGNORE INTO trigrams VALUES (?, ?)", ((gram, desc_id) for gram in grams))
+    
+    cache[description] = desc_id
+    return desc_id
+
+
+def prune_descriptions(conn: sqlite3.Connection) -> int:
+    """Drop descriptions (and their tokens and trigrams) that no task uses any more."""
+    orphans = [row[0] for row in conn.execute(
+        "SELECT desc_id FROM descriptions WHERE NOT EXISTS "
+        "(SELECT 1 FROM tasks WHERE tasks.desc_id = descriptions.desc_id)"
+    )]
+    for table in ("tokens", "trigrams", "descriptions"):
+        conn.executemany(f"DELETE FROM {table} WHERE desc_id = ?", ((desc_id,) for desc_id in orphans))
+    return len(orphans)
+
+
+@timed("index")
+def index_tasks(conn: sqlite3.Connection, rows) -> int:
+    """
+    Add or re-index (task_id, description) rows; a task whose description changed
+    moves to the new one. Commits once at the end. Returns the number of rows.
+    """
+    cache = {}
+    count = 0
+    
+    with conn:
+        for task_id, description in rows:
+            conn.execute("INSERT OR REPLACE INTO tasks VALUES (?, ?)",
+                         (task_id, description_id(conn, description, cache)))
+            count += 1
+        prune_descriptions(conn)
+        set_state(conn, "last_update", datetime.now().isoformat())
+    return count
+
+
+@timed("index")
+def remove_tasks(conn: sqlite3.Connection, task_ids) -> int:
+    """Remove tasks from the index. Returns the number of task IDs given."""
+    task_ids = list(task_ids)
+    with conn:
+        conn.executemany("DELETE FROM tasks WHERE id = ?", ((task_id,) for task_id in task_ids))
+        prune_descriptions(conn)
+        set_state(conn, "last_update", datetime.now().isoformat())
+    return len(task_ids)
+
+
+def build_index(conn: sqlite3.Connection, rows, source: str) -> int:
+    """Replace the whole index with (task_id, description) rows."""
+    with conn:
+        for table in ("tasks", "tokens", "trigrams", "descriptions"):
+            conn.execute(f"DELETE FROM {table}")
+        set_state(conn, "source", source)
+        set_state(conn, "last_build", datetime.now().isoformat())
+    return index_tasks(conn, rows)
+
+
+def search(conn: sqlite3.Connection, query: str, prefix: bool = False) -> list[int]:
+    """
+    desc_ids of descriptions containing every token of the query
+    (the last one as a prefix with prefix=True), most used first.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    
+    matches = None
+    for position, token in enumerate(tokens):
+        if prefix and position == len(tokens) - 1:
+            found = {row[0] for row in conn.execute(
+                "SELECT desc_id FROM tokens WHERE token >= ? AND token < ?", (token, token + PREFIX_END))}
+        else:
+            found = {row[0] for row in conn.execute("SELECT desc_id FROM tokens WHERE token = ?", (token,))}
+        matches = found if matches is None else matches & found
+        if not matches:
+            return []
+    
+    return sorted(matches, key=lambda desc_id: -task_count(conn, desc_id))
+
+
+def fuzzy_search(conn: sqlite3.Connection, query: str, threshold: float = DEFAULT_FUZZY_THRESHOLD) -> list[tuple]:
+    """(similarity, desc_id) of descriptions sharing enough trigrams with the query, best first."""
+    grams = trigrams(query)
+    if not grams:
+        return []
+    
+    placeholders = ", ".join("?" * len(grams))
+    rows = conn.execute(f"""
+        SELECT trigrams.desc_id, COUNT(*), descriptions.trigram_count
+        FROM trigrams JOIN descriptions ON descriptions.desc_id = trigrams.desc_id
+        WHERE trigram IN ({placeholders})
+        GROUP BY trigrams.desc_id
+    """, list(grams)).fetchall()
+    
+    scored = []
+    for desc_id, shared, total in rows:
+        similarity = shared / (len(grams) + total - shared)
+        if similarity >= threshold:
+            scored.append((similarity, desc_id))
+    return sorted(scored, reverse=True)
+
+
+def task_count(conn: sqlite3.Connection, desc_id: int) -> int:
+    """Number of tasks with a description."""
+    return conn.execute("SELECT COUNT(*) FROM tasks WHERE desc_id = ?", (desc_id,)).fetchone()[0]
+
+
+def describe(conn: sqlite3.Connection, desc_id: int) -> str:
+    """The original text of a description."""
+    return conn.execute("SELECT description FROM descriptions WHERE desc_id = ?", (desc_id,)).fetchone()[0]
+
+
+def task_ids(conn: sqlite3.Connection, desc_ids, limit: int = -1) -> list[str]:
+    """Task IDs of the given descriptions, in ID order."""
+    desc_ids = list(desc_ids)
+    if not desc_ids:
+        return []
+    placeholders = ", ".join("?" * len(desc_ids))
+    return [row[0] for row in conn.execute(
+        f"SELECT id FROM tasks WHERE desc_id IN ({placeholders}) ORDER BY id LIMIT ?", (*desc_ids, limit))]
+
+
+def activity_groups(conn: sqlite3.Connection, limit: int = -1) -> list[tuple]:
+    """
+    Activities over the full history: descriptions that fold to the same text are
+    one group. Returns (folded text, task count, distinct spellings), largest first.
+    """
+    return conn.execute("""
+        SELECT descriptions.folded, COUNT(*), COUNT(DISTINCT descriptions.desc_id)
+        FROM tasks JOIN descriptions ON descriptions.desc_id = tasks.desc_id
+        GROUP BY descriptions.folded
+        ORDER BY COUNT(*) DESC
+        LIMIT ?
+    """, (limit,)).fetchall()
+
+
+def load_rows(file_path: str = TXT_FILE_PATH, mirror_path: str = None):
+    """(task_id, description) rows from tasks.txt, or from the local mirror."""
+    if mirror_path is None:
+        from upload_to_firestore import iter_txt_file
+        return ((task["id"], task["description"]) for task in iter_txt_file(file_path))
+    
+    mirror = sqlite3.connect(mirror_path)
+    return mirror.execute("SELECT id, description FROM tasks WHERE id IS NOT NULL AND description IS NOT NULL")
+
+
+def print_matches(conn: sqlite3.Connection, desc_ids, show: int):
+    """Print each matching description with its task count and first task IDs."""
+    total = 0
+    for desc_id in desc_ids:
+        count = task_count(conn, desc_id)
+        total += count
+        sample = ", ".join(task_ids(conn, [desc_id], show))
+        more = " …" if count > show else ""
+        print(f"   {count:>6}  {describe(conn, desc_id)}  [{sample}{more}]")
+    print(f"\n🔎 {total:,} task(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inverted index over task descriptions.")
+    parser.add_argument('--index', default=SEARCH_INDEX_PATH, help=f"index database (default: {SEARCH_INDEX_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    build_parser = commands.add_parser('build', help="rebuild the index from tasks.txt or the mirror")
+    build_parser.add_argument('--file', default=TXT_FILE_PATH, help=f"tasks file (default: {TXT_FILE_PATH})")
+    build_parser.add_argument('--mirror', nargs='?', const=MIRROR_PATH, help="index the local mirror instead")
+    
+    search_parser = commands.add_parser('search', help="descriptions containing every word of the query")
+    search_parser.add_argument('query')
+    search_parser.add_argument('--prefix', action='store_true', help="match the last word as a prefix")
+    search_parser.add_argument('--show', type=int, default=3, help="task IDs to show per description (default: 3)")
+    
+    fuzzy_parser = commands.add_parser('fuzzy', help="descriptions similar to the query (trigrams)")
+    fuzzy_parser.add_argument('query')
+    fuzzy_parser.add_argument('--threshold', type=float, default=DEFAULT_FUZZY_THRESHOLD,
+                              help=f"minimum similarity, 0..1 (default: {DEFAULT_FUZZY_THRESHOLD})")
+    fuzzy_parser.add_argument('--show', type=int, default=3, help="task IDs to show per description (default: 3)")
+    
+    groups_parser = commands.add_parser('groups', help="task counts per activity over the full history")
+    groups_parser.add_argument('--top', type=int, default=20, help="activities to show (default: 20)")
+    
+    commands.add_parser('stats', help="index size and state")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "search")
+    
+    conn = open_index(args.index)
+    
+    if args.command == 'build':
+        source = args.mirror or args.file
+        print(f"🗂️  Indexing {source}...")
+        count = build_index(conn, load_rows(args.file, args.mirror), source)
+        descriptions = conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+        print(f"✅ {count:,} tasks indexed ({descriptions:,} distinct descriptions) in {args.index}")
+    
+    elif args.command == 'search':
+        print_matches(conn, search(conn, args.query, args.prefix), args.show)
+    
+    elif args.command == 'fuzzy':
+        scored = fuzzy_search(conn, args.query, args.threshold)
+        for similarity, desc_id in scored:
+            print(f"   {similarity:.2f}  {describe(conn, desc_id)}")
+        print()
+        print_matches(conn, [desc_id for _, desc_id in scored], args.show)
+    
+    elif args.command == 'groups':
+        for folded, count, spellings in activity_groups(conn, args.top):
+            variants = f"  ({spellings} spellings)" if spellings > 1 else ""
+            print(f"   {count:>6}  {folded}{variants}")
+    
+    elif args.command == 'stats':
+        for table in ("tasks", "descriptions", "tokens", "trigrams"):
+            print(f"   {table:13} {conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:,}")
+        for key in ("source", "last_build", "last_update"):
+            print(f"   {key:13} {get_state(conn, key) or '-'}")
+    
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
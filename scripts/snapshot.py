@@ -0,0 +1,358 @@
+"""
+Collection Snapshots
+====================
+
+Exports a Firestore collection to gzip-compressed NDJSON chunks and restores
+them, for backups or for moving the tasks between projects.
+
+Requirements:
+    pip install firebase-admin
+
+Setup:
+    1. Place serviceAccountKey.json in the parent directory (or pass --service-account)
+
+Usage:
+    python snapshot.py export ../snapshots/2025-11-02
+    python snapshot.py export ../snapshots/2025-11-02 --partitions 32 --workers 8
+    python snapshot.py verify ../snapshots/2025-11-02
+    python snapshot.py restore ../snapshots/2025-11-02 --service-account ../otherProject.json
+    python snapshot.py restore ../snapshots/2025-11-02 --collection tasks_copy
+
+How it works:
+    - export splits the collection into ID ranges (collection_scanner.plan_id_ranges)
+      and reads them in parallel; each range becomes one chunk file
+    - manifest.json lists every chunk with its ID range, document count,
+      size and SHA-256, and is rewritten atomically as chunks finish
+    - restore checks each chunk's checksum and writes the chunks concurrently
+      in 500-document batches (firestore_utils.commit_in_batches)
+    - Restore writes are paced by quota_scheduler.py; once today's free-tier
+      budget is used up, the rest of the chunk in flight is queued and the
+      chunks not yet started are left for the next run (--no-quota to skip)
+
+Resuming:
+    Both commands can be re-run after a failure. export keeps the ranges it
+    planned and only re-reads chunks that are not finished; restore records the
+    chunks it has fully written in restore_state.json and skips them. The state
+    remembers the checksum of the manifest it was made for, so re-exporting into
+    the same directory starts the restore over. Use --restart to start over.
+
+Snapshot layout:
+    manifest.json
+    chunk-0000.ndjson.gz    one {"id": ..., "data": {...}} object per line
+    chunk-0001.ndjson.gz
+    ...
+    restore_state.json      (written by restore)
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from collection_scanner import DEFAULT_PAGE_SIZE, iter_range, plan_id_ranges
+from firestore_utils import MAX_BATCH_SIZE, commit_in_batches, get_firestore_client
+from instrumentation import add_profile_arguments, profile_from_args, timed
+from quota_scheduler import add_quota_arguments, print_deferred, scheduler_from_args
+
+SERVICE_ACCOUNT_PATH = "../serviceAccountKey.json"
+COLLECTION_NAME = "tasks"
+MANIFEST_NAME = "manifest.json"
+RESTORE_STATE_NAME = "restore_state.json"
+SNAPSHOT_VERSION = 1
+DEFAULT_PARTITIONS = 16
+DEFAULT_WORKERS = 8
+# Marks Firestore timestamps in the NDJSON, so restore writes them back as timestamps
+DATETIME_KEY = "$datetime"
+
+
+def chunk_name(index: int) -> str:
+    """File name of one chunk."""
+    return f"chunk-{index:04d}.ndjson.gz"
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file."""
+    sha256_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256_hash.update(block)
+    return sha256_hash.hexdigest()
+
+
+def load_json(path: str):
+    """Read a JSON file, or None if it is missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_json(path: str, data: dict):
+    """Write a JSON file atomically."""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def encode_value(value):
+    """json.dumps default= hook for values JSON has no type for."""
+    if isinstance(value, datetime):
+        return {DATETIME_KEY: value.isoformat()}
+    raise TypeError(f"Cannot export value of type {type(value).__name__}")
+
+
+def decode_object(obj: dict):
+    """json.loads object_hook that turns exported timestamps back into datetimes."""
+    if len(obj) == 1 and DATETIME_KEY in obj:
+        return datetime.fromisoformat(obj[DATETIME_KEY])
+    return obj
+
+
+def export_chunk(db, collection_name: str, directory: str, chunk: dict,
+                 page_size: int = DEFAULT_PAGE_SIZE) -> dict:
+    """
+    Read one ID range into its chunk file (written to a .tmp file, then renamed).
+    Returns the chunk entry updated with documents, bytes and sha256.
+    """
+    path = os.path.join(directory, chunk["file"])
+    temp_path = path + ".tmp"
+    documents = 0
+    
+    with gzip.open(temp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+        for doc in iter_range(db, collection_name, (chunk["start_id"], chunk["end_id"]), page_size=page_size):
+            f.write(json.dumps({"id": doc.id, "data": doc.to_dict()}, ensure_ascii=False,
+                               separators=(",", ":"), default=encode_value))
+            f.write("\n")
+            documents += 1
+    
+    os.replace(temp_path, path)
+    return {**chunk, "status": "done", "documents": documents,
+            "bytes": os.path.getsize(path), "sha256": file_sha256(path)}
+
+
+def export_snapshot(db, directory: str, collection_name: str = COLLECTION_NAME,
+                    partitions: int = DEFAULT_PARTITIONS, workers: int = DEFAULT_WORKERS,
+                    restart: bool = False) -> dict:
+    """
+    Export a collection into `directory`, resuming an unfinished export there unless `restart`.
+    Returns the final manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    manifest = None if restart else load_json(manifest_path)
+    
+    if manifest and manifest.get("collection") == collection_name and manifest.get("status") != "complete":
+        pending = [chunk for chunk in manifest["chunks"] if chunk["status"] != "done"]
+        print(f"⏯️  Resuming export: {len(manifest['chunks']) - len(pending)} of "
+              f"{len(manifest['chunks'])} chunks already done")
+    else:
+        ranges = plan_id_ranges(db, collection_name, partitions)
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "collection": collection_name,
+            "status": "running",
+            "started_at": datetime.now().isoformat(),
+            "chunks": [
+                {"index": index, "file": chunk_name(index), "start_id": start_id, "end_id": end_id,
+                 "status": "pending"}
+                for index, (start_id, end_id) in enumerate(ranges)
+            ],
+        }
+        save_json(manifest_path, manifest)
+        pending = list(manifest["chunks"])
+    
+    lock = threading.Lock()
+    failed = 0
+    started = time.perf_counter()
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as pool:
+        futures = {pool.submit(export_chunk, db, collection_name, directory, chunk): chunk for chunk in pending}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                done = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"   ❌ {chunk['file']} failed: {e}")
+                continue
+            with lock:
+                manifest["chunks"][done["index"]] = done
+                save_json(manifest_path, manifest)
+            print(f"   ✓ {done['file']}: {done['documents']} documents, {done['bytes']:,} bytes")
+    
+    if not failed:
+        manifest["status"] = "complete"
+        manifest["completed_at"] = datetime.now().isoformat()
+        manifest["documents"] = sum(chunk["documents"] for chunk in manifest["chunks"])
+        save_json(manifest_path, manifest)
+    manifest["elapsed"] = time.perf_counter() - started
+    return manifest
+
+
+@timed("verify")
+def verify_chunk(directory: str, chunk: dict) -> bool:
+    """True if the chunk file exists and matches the manifest checksum."""
+    path = os.path.join(directory, chunk["file"])
+    return os.path.exists(path) and file_sha256(path) == chunk.get("sha256")
+
+
+def iter_chunk(directory: str, chunk: dict):
+    """Yield (document ID, data) from one chunk file."""
+    with gzip.open(os.path.join(directory, chunk["file"]), "rt", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line, object_hook=decode_object)
+            yield record["id"], record["data"]
+
+
+def restore_chunk(db, collection_name: str, directory: str, chunk: dict,
+                  batch_size: int = MAX_BATCH_SIZE, scheduler=None) -> tuple[int, int]:
+    """
+    Write one chunk back to Firestore, paced by `scheduler` (see quota_scheduler.py), if given.
+    Returns (documents written, documents failed); documents deferred to the work queue are neither.
+    """
+    if not verify_chunk(directory, chunk):
+        raise ValueError(f"{chunk['file']} is missing or its checksum doesn't match the manifest")
+    
+    collection_ref = db.collection(collection_name)
+    operations = (
+        ("set", collection_ref.document(doc_id), data)
+        for doc_id, data in iter_chunk(directory, chunk)
+    )
+    return commit_in_batches(db, operations, batch_size, scheduler=scheduler)
+
+
+def restore_snapshot(db, directory: str, collection_name: str = None, workers: int = DEFAULT_WORKERS,
+                     restart: bool = False, scheduler=None) -> dict:
+    """
+    Restore a complete snapshot into `collection_name` (default: the exported collection),
+    skipping chunks a previous restore of the same manifest already wrote unless `restart`.
+    With a `scheduler`, chunks not started once today's budget is used up are left
+    for the next run.
+    
+    Returns:
+        dict: documents written, documents failed, chunks skipped, chunks failed and chunks postponed
+    """
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    manifest = load_json(manifest_path)
+    if not manifest or manifest.get("status") != "complete":
+        raise ValueError(f"{directory} has no complete snapshot; finish the export first")
+    
+    collection_name = collection_name or manifest["collection"]
+    manifest_sha256 = file_sha256(manifest_path)
+    state_path = os.path.join(directory, RESTORE_STATE_NAME)
+    state = None if restart else load_json(state_path)
+    if not state or state.get("collection") != collection_name or state.get("manifest_sha256") != manifest_sha256:
+        if state:
+            print("🔄 The snapshot or the target collection changed since the last restore, starting over")
+        state = {"collection": collection_name, "manifest_sha256": manifest_sha256,
+                 "manifest_started_at": manifest.get("started_at"),
+                 "started_at": datetime.now().isoformat(), "done": []}
+    
+    done = set(state["done"])
+    pending = [chunk for chunk in manifest["chunks"] if chunk["index"] not in done]
+    result = {"written": 0, "failed": 0, "skipped": len(done), "failed_chunks": 0, "postponed_chunks": 0}
+    if done:
+        print(f"⏯️  Resuming restore: {len(done)} of {len(manifest['chunks'])} chunks already written")
+    
+    def restore(chunk):
+        if scheduler is not None and scheduler.exhausted:
+            return None
+        return restore_chunk(db, collection_name, directory, chunk, scheduler=scheduler)
+    
+    lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as pool:
+        futures = {pool.submit(restore, chunk): chunk for chunk in pending}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                outcome = future.result()
+            except Exception as e:
+                result["failed_chunks"] += 1
+                print(f"   ❌ {chunk['file']} failed: {e}")
+                continue
+            if outcome is None:
+                result["postponed_chunks"] += 1
+                continue
+            written, failed = outcome
+            result["written"] += written
+            result["failed"] += failed
+            if failed:
+                result["failed_chunks"] += 1
+                print(f"   ⚠️  {chunk['file']}: {failed} documents failed, will be retried on the next run")
+                continue
+            with lock:
+                state["done"].append(chunk["index"])
+                state["updated_at"] = datetime.now().isoformat()
+                save_json(state_path, state)
+            # Deferred documents are in the work queue, which is replayed before anything else
+            queued = chunk.get("documents", written) - written - failed
+            print(f"   ✓ {chunk['file']}: {written} documents" + (f", {queued} queued" if queued > 0 else ""))
+    
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or restore a Firestore collection.")
+    parser.add_argument('command', choices=('export', 'restore', 'verify'))
+    parser.add_argument('directory', help="snapshot directory")
+    parser.add_argument('--collection', help=f"collection to export or restore into (default: {COLLECTION_NAME})")
+    parser.add_argument('--partitions', type=int, default=DEFAULT_PARTITIONS,
+                        help=f"ID ranges (chunks) to export (default: {DEFAULT_PARTITIONS})")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"chunks read or written concurrently (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--service-account', default=SERVICE_ACCOUNT_PATH,
+                        help=f"service account of the project to use (default: {SERVICE_ACCOUNT_PATH})")
+    parser.add_argument('--restart', action='store_true', help="ignore a previous unfinished run")
+    add_quota_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "snapshot")
+    
+    if args.command == 'verify':
+        manifest = load_json(os.path.join(args.directory, MANIFEST_NAME))
+        if not manifest:
+            raise SystemExit(f"❌ No manifest in {args.directory}")
+        bad = [chunk["file"] for chunk in manifest["chunks"] if not verify_chunk(args.directory, chunk)]
+        print(f"🔍 {len(manifest['chunks'])} chunks, {manifest.get('documents', '?')} documents, "
+              f"status: {manifest.get('status')}")
+        if bad:
+            raise SystemExit(f"❌ Missing or corrupt: {', '.join(bad)}")
+        print("✅ All checksums match")
+        return
+    
+    db = get_firestore_client(args.service_account)
+    
+    if args.command == 'export':
+        collection_name = args.collection or COLLECTION_NAME
+        print(f"📦 Exporting {collection_name} to {args.directory}...")
+        manifest = export_snapshot(db, args.directory, collection_name, args.partitions, args.workers, args.restart)
+        if manifest["status"] != "complete":
+            raise SystemExit("\n⚠️  Some chunks failed. Run the same command again to resume.")
+        print(f"\n✅ Exported {manifest['documents']} documents in {len(manifest['chunks'])} chunks "
+              f"({manifest['elapsed']:.1f}s)")
+    
+    else:
+        scheduler = scheduler_from_args(args, db, "restore")
+        print(f"♻️  Restoring {args.directory}...")
+        started = time.perf_counter()
+        result = restore_snapshot(db, args.directory, args.collection, args.workers, args.restart, scheduler)
+        print(f"\n📊 {result['written']} documents written, {result['failed']} failed, "
+              f"{result['skipped']} chunks skipped ({time.perf_counter() - started:.1f}s)")
+        print_deferred(scheduler)
+        if result["failed_chunks"]:
+            raise SystemExit("⚠️  Some chunks failed. Run the same command again to resume.")
+        if result["postponed_chunks"]:
+            print(f"⏸️  {result['postponed_chunks']} chunks left for tomorrow. Run the same command again to resume.")
+            return
+        print("✅ Restore complete")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Synthetic Task Logs
+===================
+
+Generates deterministic, realistic-looking task logs in the convert.py input format,
+or already converted in the tasks.txt CSV format (ID;DESCRIPTION;TIMESTAMP).
+Used by the benchmarks so they can run without any private data.
+
+Requirements:
+    Python 3.6+ (no external dependencies)
+
+Usage:
+    python synthetic_data.py --days 1095 --tasks-per-day 40 > synthetic_input.txt
+    python synthetic_data.py --days 365 --users 3 --format csv > synthetic_tasks.txt
+
+Notes:
+    - Each day starts in the morning and runs past midnight every few days,
+      so the midnight crossing logic is exercised
+    - Some lines use the short "HHh" form, others carry a "+X" duration,
+      and a few blank or free-text lines are mixed in (notes, and "+" lines
+      without a time), so the parsers' non-task path is exercised too
+    - With --users N, user i gets its own seed and the i-th block of `days`
+      days, so the logs can share one file (and one collection) without
+      their task IDs colliding
+"""
+
+import argparse
+import random
+import sys
+from datetime import date, timedelta
+
+DESCRIPTIONS = [
+    "Acordar",
+    "Ficar deitado",
+    "Ida ao banheiro",
+    "Lavar o rosto",
+    "Bate-papo com Tayane",
+    "Café da manhã",
+    "Trabalho no SkillPulse",
+    "Almoçar",
+    "Cochilo",
+    "Academia",
+    "Leitura",
+    "Jantar",
+    "Assistir série",
+    "Dormir",
+]
+
+# Lines that are not tasks: both parsers must skip them without counting a task
+FREE_TEXT = [
+    "Obs: dormi mal",
+    "Dia corrido, sem pausas",
+    "Lembrar: pagar a conta de luz",
+    "- reunião cancelada",
+    "+ Ideia para o app: modo escuro",
+    "+ Ligar para a Tayane",
+]
+
+
+def generate_task_log(days=365, tasks_per_day=40, start_date=date(2023, 1, 1), seed=42):
+    """Yield the lines of a synthetic task log, one day block after another."""
+    rng = random.Random(seed)
+    current = start_date
+    
+    for _ in range(days):
+        yield current.strftime('%d/%m/%Y')
+        
+        minutes = 6 * 60 + rng.randint(0, 180)
+        # Days last 15 to 20 hours, so about half of them run past midnight
+        step = max(rng.randint(15 * 60, 20 * 60) // max(tasks_per_day, 1), 2)
+        
+        for _ in range(tasks_per_day):
+            hour, minute = divmod(minutes % 1440, 60)
+            time_part = f"{hour}h{minute:02d}" if minute else f"{hour}h"
+            if rng.random() < 0.1:
+                time_part += f" +{rng.randint(5, 60)}"
+            yield f"+ {rng.choice(DESCRIPTIONS):<36}{time_part}"
+            
+            if rng.random() < 0.02:
+                yield "" if rng.random() < 0.5 else rng.choice(FREE_TEXT)
+            minutes += max(step + rng.randint(-step // 2, step // 2), 1)
+        
+        yield ""
+        current += timedelta(days=1)
+
+
+def generate_user_logs(days=365, tasks_per_day=40, users=1, start_date=date(2023, 1, 1), seed=42):
+    """Yield the lines of one synthetic log per user, each on its own range of dates."""
+    for user in range(users):
+        yield from generate_task_log(days, tasks_per_day, start_date + timedelta(days=user * days), seed + user)
+
+
+def generate_tasks_csv(days=365, tasks_per_day=40, users=1, start_date=date(2023, 1, 1), seed=42):
+    """Yield tasks.txt CSV lines (convert.py output) for the same logs as generate_user_logs."""
+    from convert import iter_csv_rows
+    
+    yield from iter_csv_rows(generate_user_logs(days, tasks_per_day, users, start_date, seed))
+
+
+def write_lines(path, lines):
+    """Write lines to a UTF-8 file. Returns the number of lines written."""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + "\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic task log to stdout.")
+    parser.add_argument('--days', type=int, default=365, help="days per user")
+    parser.add_argument('--tasks-per-day', type=int, default=40)
+    parser.add_argument('--users', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', choices=('log', 'csv'), default='log',
+                        help="convert.py input (log) or tasks.txt (csv) (default: log)")
+    args = parser.parse_args()
+    
+    generate = generate_tasks_csv if args.format == 'csv' else generate_user_logs
+    sys.stdout.reconfigure(encoding='utf-8')
+    for line in generate(args.days, args.tasks_per_day, args.users, seed=args.seed):
+        sys.stdout.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
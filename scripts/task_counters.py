@@ -0,0 +1,211 @@
+"""
+Per-Day Task Counters
+=====================
+
+Keeps one counter document per day with the highest task number used that day,
+so the next task ID (YYYYMMDDNNN, see pad_task_id in upload_to_firestore.py)
+is allocated with one transactional read and write instead of reading the whole
+tasks collection.
+
+Requirements:
+    pip install firebase-admin
+
+Setup:
+    1. Place serviceAccountKey.json in the parent directory (or update SERVICE_ACCOUNT_PATH)
+
+Usage:
+    python task_counters.py backfill                 # build the counters from existing tasks
+    python task_counters.py show --from 20251101     # list counters
+    python task_counters.py allocate --date 20251102 # reserve and print the next task ID
+
+Firestore structure:
+    Collection: _metadata
+        Document: task_counters
+            Subcollection: days
+                Document ID: YYYYMMDD
+                Fields: last (highest task number used that day), updated_at
+
+How the counters stay current:
+    - backfill reads only document names (no bodies) with collection_scanner
+    - upload_to_firestore.py and update_tasks_user_id.py bump the counters of
+      the days they write or scan
+    - Bumps use a server-side maximum transform, so they cost one write per
+      day, need no read, and never move a counter backwards
+    - Deleting tasks doesn't lower a counter, so task numbers are never reused
+    - A day without a counter is seeded from its highest existing task ID
+      (one read) the first time a number is allocated
+"""
+
+import argparse
+from datetime import datetime
+
+from collection_scanner import DEFAULT_PARTITIONS, scan_collection
+from firestore_utils import MAX_BATCH_SIZE, commit_in_batches, get_firestore_client
+from instrumentation import add_profile_arguments, profile_from_args
+
+SERVICE_ACCOUNT_PATH = "../serviceAccountKey.json"
+COLLECTION_NAME = "tasks"
+COUNTERS_COLLECTION = "_metadata"
+COUNTERS_DOC = "task_counters"
+DAYS_COLLECTION = "days"
+
+DOCUMENT_ID = "__name__"
+PREFIX_END = "\uf8ff"
+# pad_task_id pads task numbers to 3 digits
+NUMBER_WIDTH = 3
+
+
+def split_task_id(task_id: str):
+    """
+    Return (YYYYMMDD, task number) for a YYYYMMDDNNN or YYYYMMDD_N task ID,
+    or None if the ID doesn't follow either scheme.
+    """
+    day, number = task_id[:8], task_id[8:].lstrip("_")
+    if not (day.isdigit() and number.isdigit()):
+        return None
+    return day, int(number)
+
+
+def track_task_id(maxima: dict, task_id: str):
+    """Record a task ID in a {YYYYMMDD: highest task number} dict."""
+    parts = split_task_id(task_id)
+    if parts is not None:
+        day, number = parts
+        if number > maxima.get(day, 0):
+            maxima[day] = number
+
+
+def day_maxima(task_ids) -> dict:
+    """Highest task number per day among the given task IDs."""
+    maxima = {}
+    for task_id in task_ids:
+        track_task_id(maxima, task_id)
+    return maxima
+
+
+def days_collection(db):
+    """The _metadata/task_counters/days collection."""
+    return db.collection(COUNTERS_COLLECTION).document(COUNTERS_DOC).collection(DAYS_COLLECTION)
+
+
+def counter_operations(db, maxima: dict):
+    """
+    Batch operations that raise each day's counter to at least the given task number:
+    one merge per day with a maximum transform, so counters never go down.
+    """
+    from google.cloud.firestore_v1.transforms import Maximum
+    
+    days_ref = days_collection(db)
+    now = datetime.now().isoformat()
+    for day, number in sorted(maxima.items()):
+        yield "merge", days_ref.document(day), {"last": Maximum(number), "updated_at": now}
+
+
+def bump_counters(db, maxima: dict, batch_size: int = MAX_BATCH_SIZE, scheduler=None) -> tuple[int, int]:
+    """
+    Raise each day's counter to at least the given task number (see counter_operations).
+    Write-only, one write per day. Paced by `scheduler` (see quota_scheduler.py), if given.
+    
+    Returns:
+        tuple: (days committed, days failed)
+    """
+    if not maxima:
+        return 0, 0
+    return commit_in_batches(db, counter_operations(db, maxima), batch_size, scheduler=scheduler)
+
+
+def backfill_counters(db, partitions: int = DEFAULT_PARTITIONS) -> dict:
+    """
+    Build the counters from the task IDs already in Firestore.
+    Only document names are read. Returns the {day: highest task number} that was written.
+    """
+    maxima = day_maxima(doc.id for doc in scan_collection(db, COLLECTION_NAME, fields=[], partitions=partitions))
+    committed, failed = bump_counters(db, maxima)
+    if failed:
+        raise RuntimeError(f"{failed} of {len(maxima)} day counters could not be written")
+    return maxima
+
+
+def highest_task_number(db, day: str, transaction=None) -> int:
+    """The highest task number among the existing tasks of a day (one read), or 0."""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    
+    collection_ref = db.collection(COLLECTION_NAME)
+    query = collection_ref \
+        .where(filter=FieldFilter(DOCUMENT_ID, ">=", collection_ref.document(day))) \
+        .where(filter=FieldFilter(DOCUMENT_ID, "<", collection_ref.document(day + PREFIX_END))) \
+        .order_by(DOCUMENT_ID, direction="DESCENDING") \
+        .select([]) \
+        .limit(1)
+    docs = transaction.get(query) if transaction is not None else query.stream()
+    for doc in docs:
+        parts = split_task_id(doc.id)
+        return parts[1] if parts else 0
+    return 0
+
+
+def allocate_task_id(db, day: str) -> str:
+    """
+    Reserve the next task number of a day and return the padded task ID (YYYYMMDDNNN).
+    One transactional read and write of the day's counter; a missing counter is
+    seeded from the day's existing tasks inside the same transaction.
+    """
+    from google.cloud.firestore_v1 import transactional
+    
+    counter_ref = days_collection(db).document(day)
+    
+    @transactional
+    def allocate(transaction):
+        snapshot = counter_ref.get(transaction=transaction)
+        if snapshot.exists:
+            last = snapshot.get("last") or 0
+        else:
+            last = highest_task_number(db, day, transaction)
+        transaction.set(counter_ref, {"last": last + 1, "updated_at": datetime.now().isoformat()}, merge=True)
+        return last + 1
+    
+    return f"{day}{allocate(db.transaction()):0{NUMBER_WIDTH}d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-day task ID counters.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    backfill_parser = commands.add_parser('backfill', help="build the counters from existing task IDs")
+    backfill_parser.add_argument('--partitions', type=int, default=DEFAULT_PARTITIONS)
+    
+    show_parser = commands.add_parser('show', help="list day counters")
+    show_parser.add_argument('--from', dest='from_day', help="first day (YYYYMMDD)")
+    show_parser.add_argument('--to', dest='to_day', help="last day (YYYYMMDD)")
+    
+    allocate_parser = commands.add_parser('allocate', help="reserve the next task ID of a day")
+    allocate_parser.add_argument('--date', required=True, help="day (YYYYMMDD)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "counters")
+    
+    db = get_firestore_client(SERVICE_ACCOUNT_PATH)
+    
+    if args.command == 'backfill':
+        print(f"🔢 Reading task IDs from {COLLECTION_NAME}...")
+        maxima = backfill_counters(db, args.partitions)
+        print(f"✅ {len(maxima)} day counters written ({len(maxima)} writes, names-only reads)")
+    
+    elif args.command == 'show':
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        
+        days_ref = days_collection(db)
+        query = days_ref
+        if args.from_day:
+            query = query.where(filter=FieldFilter(DOCUMENT_ID, ">=", days_ref.document(args.from_day)))
+        if args.to_day:
+            query = query.where(filter=FieldFilter(DOCUMENT_ID, "<=", days_ref.document(args.to_day)))
+        for doc in query.stream():
+            print(f"   {doc.id}  last: {doc.get('last')}")
+    
+    elif args.command == 'allocate':
+        print(allocate_task_id(db, args.date))
+
+
+if __name__ == "__main__":
+    main()
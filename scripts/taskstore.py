@@ -0,0 +1,298 @@
+"""
+Columnar Task Store
+===================
+
+A compact binary alternative to the ID;DESCRIPTION;TIMESTAMP text written by
+convert.py. Each column is a fixed-width integer array and descriptions are
+stored once in a dictionary table, so a store is a fraction of the size of
+the text and loads through mmap without parsing anything.
+
+Requirements:
+    Python 3.8+ (no external dependencies)
+
+Usage:
+    python convert.py ../input.txt ../tasks.bin --format binary
+    python taskstore.py info ../tasks.bin
+    python taskstore.py dump ../tasks.bin > output.txt   # back to convert.py text
+    
+    from taskstore import TaskStore
+    with TaskStore("../tasks.bin") as store:
+        store.start[-1]                 # epoch minutes, straight from the page cache
+        store.row(0)                    # ("20251101_1", "Acordar", "2025-11-01T06:45:00-03:00")
+
+File layout (little-endian, every column starts on an 8-byte boundary):
+    Header (72 bytes): magic "SPTS", version, task count, description count,
+                       UTC offset in minutes, then the byte offset of each column
+    dates        uint32[count]     task ID date as YYYYMMDD
+    start        int32[count]      wall-clock start, in minutes since 1970-01-01
+    codes        uint32[count]     index into the description table
+    sequence     uint16[count]     task number within its day (the N in YYYYMMDD_N)
+    text_offsets uint32[descriptions + 1]
+    text         UTF-8 bytes of all distinct descriptions, back to back
+
+Notes:
+    - Columns are memoryviews over the mapped file (zero-copy); NumPy can wrap
+      them with np.frombuffer, see analytics.load_from_store()
+    - All timestamps must share one UTC offset (convert.py always writes -03:00)
+    - Stores are written to a temporary file and renamed, so readers never see
+      a half-written store
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import date, timedelta
+
+from instrumentation import add_profile_arguments, profile_from_args
+
+MAGIC = b"SPTS"
+VERSION = 1
+ALIGNMENT = 8
+# magic, version, count, descriptions, utc offset, 6 column offsets
+HEADER = struct.Struct("<4sIIIh2x6Q")
+HEADER_SIZE = -(-HEADER.size // ALIGNMENT) * ALIGNMENT
+
+MINUTES_PER_DAY = 1440
+EPOCH = date(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+# (name, array typecode, memoryview format)
+COLUMNS = (
+    ("dates", "I", "I"),
+    ("start", "i", "i"),
+    ("codes", "I", "I"),
+    ("sequence", "H", "H"),
+)
+
+
+def aligned(offset: int) -> int:
+    """Round an offset up to the next column boundary."""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def parse_offset(timestamp: str) -> int:
+    """UTC offset in minutes of an ISO timestamp ending in +HH:MM or -HH:MM."""
+    sign = -1 if timestamp[-6] == "-" else 1
+    return sign * (int(timestamp[-5:-3]) * 60 + int(timestamp[-2:]))
+
+
+def format_offset(minutes: int) -> str:
+    """Format an offset in minutes as +HH:MM or -HH:MM."""
+    sign = "-" if minutes < 0 else "+"
+    hours, minutes = divmod(abs(minutes), 60)
+    return f"{sign}{hours:02d}:{minutes:02d}"
+
+
+def write_store(path: str, rows) -> int:
+    """
+    Write (task_id, description, timestamp) rows, as yielded by convert.iter_task_rows,
+    to a store at `path`. Returns the number of tasks written.
+    """
+    columns = {name: array(typecode) for name, typecode, _ in COLUMNS}
+    descriptions = {}
+    utc_offset = None
+    suffix = None
+    day_cache = {}
+    
+    for task_id, description, timestamp in rows:
+        date_part, sequence = task_id.split("_")
+        
+        if suffix is None:
+            suffix = timestamp[-6:]
+            utc_offset = parse_offset(timestamp)
+        elif not timestamp.endswith(suffix):
+            raise ValueError(f"Task {task_id}: all timestamps must use the UTC offset {suffix}")
+        
+        day = day_cache.get(timestamp[:10])
+        if day is None:
+            day = day_cache[timestamp[:10]] = date.fromisoformat(timestamp[:10]).toordinal() - EPOCH_ORDINAL
+        
+        columns["dates"].append(int(date_part))
+        columns["start"].append(day * MINUTES_PER_DAY + int(timestamp[11:13]) * 60 + int(timestamp[14:16]))
+        columns["codes"].append(descriptions.setdefault(description, len(descriptions)))
+        columns["sequence"].append(int(sequence))
+    
+    text = bytearray()
+    text_offsets = array("I", [0])
+    for description in descriptions:
+        text += description.encode("utf-8")
+        text_offsets.append(len(text))
+    
+    if sys.byteorder != "little":
+        for column in (*columns.values(), text_offsets):
+            column.byteswap()
+    
+    sections = [columns[name].tobytes() for name, _, _ in COLUMNS] + [text_offsets.tobytes(), bytes(text)]
+    offsets = []
+    position = HEADER_SIZE
+    for section in sections:
+        position = aligned(position)
+        offsets.append(position)
+        position += len(section)
+    
+    count = len(columns["dates"])
+    header = HEADER.pack(MAGIC, VERSION, count, len(descriptions), utc_offset or 0, *offsets)
+    
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        for offset, section in zip(offsets, sections):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(section)
+    os.replace(temp_path, path)
+    return count
+
+
+class TaskStore:
+    """
+    Read-only, memory-mapped view of a task store.
+    
+    Attributes:
+        dates, start, codes, sequence: memoryview columns (see the module docstring)
+        utc_offset: UTC offset of every timestamp, in minutes
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER_SIZE:
+            self._file.close()
+            raise ValueError(f"{path} is not a task store")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version, count, description_count, utc_offset, *offsets = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} task store")
+        
+        self.count = count
+        self.utc_offset = utc_offset
+        self._suffix = format_offset(utc_offset)
+        self._view = memoryview(self._map)
+        
+        for (name, typecode, fmt), offset in zip(COLUMNS, offsets):
+            setattr(self, name, self._column(offset, count, typecode, fmt))
+        self._text_offsets = self._column(offsets[4], description_count + 1, "I", "I")
+        self._text_start = offsets[5]
+        self._descriptions = [None] * description_count
+    
+    def _column(self, offset: int, length: int, typecode: str, fmt: str):
+        """A zero-copy view of one column (a byte-swapped copy on big-endian hosts)."""
+        size = array(typecode).itemsize * length
+        if sys.byteorder == "little":
+            with self._view[offset:offset + size] as view:
+                return view.cast(fmt)
+        column = array(typecode)
+        column.frombytes(self._map[offset:offset + size])
+        column.byteswap()
+        return column
+    
+    def __len__(self):
+        return self.count
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        """Release the columns and unmap the file."""
+        for name, _, _ in COLUMNS:
+            column = self.__dict__.pop(name, None)
+            if isinstance(column, memoryview):
+                column.release()
+        text_offsets = self.__dict__.pop("_text_offsets", None)
+        if isinstance(text_offsets, memoryview):
+            text_offsets.release()
+        if "_view" in self.__dict__:
+            self._view.release()
+            del self._view
+        if "_map" in self.__dict__:
+            self._map.close()
+            del self._map
+        self._file.close()
+    
+    @property
+    def descriptions(self) -> list[str]:
+        """The description table, decoded."""
+        return [self.description_text(code) for code in range(len(self._descriptions))]
+    
+    def description_text(self, code: int) -> str:
+        """Decode one entry of the description table (cached)."""
+        text = self._descriptions[code]
+        if text is None:
+            start = self._text_start + self._text_offsets[code]
+            end = self._text_start + self._text_offsets[code + 1]
+            text = self._descriptions[code] = str(self._map[start:end], "utf-8")
+        return text
+    
+    def task_id(self, index: int) -> str:
+        """Task ID as convert.py writes it (YYYYMMDD_N)."""
+        return f"{self.dates[index]}_{self.sequence[index]}"
+    
+    def timestamp(self, index: int) -> str:
+        """Start time as an ISO timestamp with the store's UTC offset."""
+        days, minutes = divmod(self.start[index], MINUTES_PER_DAY)
+        hour, minute = divmod(minutes, 60)
+        day = EPOCH + timedelta(days=days)
+        return f"{day.isoformat()}T{hour:02d}:{minute:02d}:00{self._suffix}"
+    
+    def row(self, index: int) -> tuple:
+        """(task_id, description, timestamp), like convert.iter_task_rows."""
+        return self.task_id(index), self.description_text(self.codes[index]), self.timestamp(index)
+    
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.row(index)
+    
+    def iter_tasks(self):
+        """
+        Yield task dicts like upload_to_firestore.iter_txt_file: padded id, description,
+        startTime and endTime (the next task's startTime).
+        """
+        from upload_to_firestore import pad_task_id
+        
+        for index in range(self.count):
+            start_time = self.timestamp(index)
+            yield {
+                "id": pad_task_id(self.task_id(index)),
+                "description": self.description_text(self.codes[index]),
+                "startTime": start_time,
+                "endTime": self.timestamp(index + 1) if index + 1 < self.count else start_time,
+                "timestamp": None,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a columnar task store.")
+    parser.add_argument('command', choices=('info', 'dump'),
+                        help="info: summary; dump: write convert.py text to stdout")
+    parser.add_argument('store', help="store file written by convert.py --format binary")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "taskstore")
+    
+    with TaskStore(args.store) as store:
+        if args.command == 'dump':
+            sys.stdout.reconfigure(encoding='utf-8')
+            for task_id, description, timestamp in store:
+                sys.stdout.write(f"{task_id};{description};{timestamp}\n")
+            return
+        
+        size = os.path.getsize(args.store)
+        print(f"📦 {args.store}: {size:,} bytes")
+        print(f"   Tasks: {len(store):,}")
+        print(f"   Distinct descriptions: {len(store.descriptions):,}")
+        if len(store):
+            print(f"   First: {store.timestamp(0)}  ({store.task_id(0)})")
+            print(f"   Last:  {store.timestamp(len(store) - 1)}  ({store.task_id(len(store) - 1)})")
+            print(f"   Bytes per task: {size / len(store):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Offline tests for the Firestore usage cache, using StubMetricServiceClient.
+
+Run from scripts/:
+    python -m pytest -q test_check_firestore_usage.py
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from check_firestore_usage import (
+    BUCKET_SECONDS, METRICS, StubMetricServiceClient, get_firestore_usage, open_cache,
+)
+
+NOW = datetime(2025, 11, 2, 14, 30, tzinfo=timezone.utc)
+HOUR_END = int(NOW.timestamp()) // BUCKET_SECONDS * BUCKET_SECONDS
+
+
+class LateStub(StubMetricServiceClient):
+    """Adds `extra` to every point, as if late points had arrived since the last run."""
+    
+    def __init__(self, extra: int = 0):
+        super().__init__()
+        self.extra = extra
+    
+    def list_time_series(self, request):
+        series = super().list_time_series(request)
+        for point in series[0].points:
+            point.value.int64_value += self.extra
+        return series
+
+
+class FailingStub(StubMetricServiceClient):
+    """Fails every request for one metric."""
+    
+    def __init__(self, failing: str):
+        super().__init__()
+        self.failing = failing
+    
+    def list_time_series(self, request):
+        if METRICS[self.failing] in request["filter"]:
+            raise RuntimeError("monitoring unavailable")
+        return super().list_time_series(request)
+
+
+def usage(client, cache, days=1, now=NOW):
+    return get_firestore_usage(client, "stub-project", str(cache), days, now)
+
+
+def intervals(client) -> list[tuple]:
+    """(start, end) of every request made for the reads metric."""
+    return [(request["interval"]["start_time"]["seconds"], request["interval"]["end_time"]["seconds"])
+            for request in client.requests if METRICS["reads"] in request["filter"]]
+
+
+def cached_spans(cache) -> dict:
+    conn = open_cache(str(cache))
+    spans = {name: (fetched_from, fetched_until) for name, fetched_from, fetched_until
+             in conn.execute("SELECT metric, fetched_from, fetched_until FROM usage_fetches")}
+    conn.close()
+    return spans
+
+
+def test_incremental_fetch_matches_a_full_fetch(tmp_path):
+    first = StubMetricServiceClient()
+    usage(first, tmp_path / "cache.sqlite")
+    
+    later = NOW + timedelta(hours=2)
+    second = StubMetricServiceClient()
+    result = usage(second, tmp_path / "cache.sqlite", now=later)
+    
+    # Only the hours since the last settled one, and the current partial hour
+    assert intervals(second) == [(HOUR_END, HOUR_END + 2 * BUCKET_SECONDS),
+                                 (HOUR_END + 2 * BUCKET_SECONDS, int(later.timestamp()))]
+    assert result == usage(StubMetricServiceClient(), tmp_path / "fresh.sqlite", now=later)
+
+
+def test_partial_hour_is_never_cached(tmp_path):
+    result = usage(StubMetricServiceClient(), tmp_path / "cache.sqlite")
+    
+    assert all(bucket_start < HOUR_END for buckets in result["hourly"].values() for bucket_start in buckets)
+    assert all(value > 0 for value in result["current_hour"].values())
+    assert len(result["hourly"]["reads"]) == 24
+
+
+def test_growing_days_backfills_once(tmp_path):
+    cache = tmp_path / "cache.sqlite"
+    usage(StubMetricServiceClient(), cache)
+    
+    client = StubMetricServiceClient()
+    result = usage(client, cache, days=7)
+    week_start = HOUR_END - 7 * 24 * BUCKET_SECONDS
+    day_start = HOUR_END - 24 * BUCKET_SECONDS
+    assert (week_start, day_start) in intervals(client)
+    assert len(result["hourly"]["reads"]) == 7 * 24
+    assert cached_spans(cache)["reads"][0] == week_start
+    
+    again = StubMetricServiceClient()
+    usage(again, cache, days=7)
+    assert all(start >= HOUR_END - BUCKET_SECONDS for start, _ in intervals(again))
+
+
+def test_recently_closed_hour_is_fetched_again(tmp_path):
+    cache = tmp_path / "cache.sqlite"
+    just_after = datetime.fromtimestamp(HOUR_END + BUCKET_SECONDS + 60, timezone.utc)
+    closed_hour = HOUR_END
+    first = usage(LateStub(), cache, now=just_after)
+    assert cached_spans(cache)["reads"][1] == closed_hour
+    
+    settled = just_after + timedelta(minutes=10)
+    second = usage(LateStub(extra=7), cache, now=settled)
+    assert second["hourly"]["reads"][closed_hour] == first["hourly"]["reads"][closed_hour] + 7
+    assert cached_spans(cache)["reads"][1] == closed_hour + BUCKET_SECONDS
+
+
+def test_failing_metric_is_reported_and_retried(tmp_path, capsys):
+    cache = tmp_path / "cache.sqlite"
+    result = usage(FailingStub("writes"), cache)
+    
+    assert "Writes" in capsys.readouterr().out
+    assert result["hourly"]["writes"] == {}
+    assert result["hourly"]["reads"]
+    spans = cached_spans(cache)
+    assert spans["writes"][1] < spans["reads"][1]
+    
+    client = StubMetricServiceClient()
+    result = usage(client, cache)
+    assert len(result["hourly"]["writes"]) == 24
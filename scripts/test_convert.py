@@ -0,0 +1,103 @@
+"""
+Tests for convert.py's --incremental checkpoint.
+
+Run from scripts/:
+    python -m pytest -q test_convert.py
+"""
+
+import shutil
+
+from convert import CHECKPOINT_SUFFIX, convert_incremental, convert_tasks_to_csv
+
+# Enough days that the first one lies well before the input fingerprint of the last block
+DAYS = 60
+
+
+def day_block(day: int) -> str:
+    return (f"{day % 28 + 1:02d}/{day // 28 + 1:02d}/2023\n"
+            "+ Acordar                           6h45\n"
+            "+ Trabalhar                         8h51\n"
+            "+ Almoçar                           12h30 +15\n"
+            "+ Dormir                            23h10\n"
+            "\n")
+
+
+def write_log(path, days=DAYS):
+    path.write_text("".join(day_block(day) for day in range(days)), encoding="utf-8")
+
+
+def full_conversion(tmp_path, input_file) -> str:
+    expected = tmp_path / "expected.txt"
+    convert_tasks_to_csv(str(input_file), str(expected))
+    return expected.read_text(encoding="utf-8")
+
+
+def test_append_only_matches_a_full_conversion(tmp_path):
+    log, output = tmp_path / "input.txt", tmp_path / "output.txt"
+    write_log(log)
+    convert_incremental(str(log), str(output))
+    
+    with open(log, "a", encoding="utf-8") as f:
+        f.write(day_block(DAYS))
+    total, reparsed = convert_incremental(str(log), str(output))
+    
+    assert (total, reparsed) == ((DAYS + 1) * 4, 8)
+    assert output.read_text(encoding="utf-8") == full_conversion(tmp_path, log)
+
+
+def test_full_run_after_editing_history_resets_the_checkpoint(tmp_path):
+    log, output = tmp_path / "input.txt", tmp_path / "output.txt"
+    write_log(log)
+    convert_incremental(str(log), str(output))
+    
+    # Same-length edit to the first day that turns a task into a free-text line
+    text = log.read_text(encoding="utf-8")
+    log.write_text(text.replace("+ Trabalhar", "- Trabalhar", 1), encoding="utf-8")
+    convert_tasks_to_csv(str(log), str(output))
+    assert not (tmp_path / ("output.txt" + CHECKPOINT_SUFFIX)).exists()
+    
+    with open(log, "a", encoding="utf-8") as f:
+        f.write(day_block(DAYS))
+    convert_incremental(str(log), str(output))
+    
+    assert output.read_text(encoding="utf-8") == full_conversion(tmp_path, log)
+
+
+def test_output_replaced_behind_the_checkpoint_is_rebuilt(tmp_path):
+    log, output = tmp_path / "input.txt", tmp_path / "output.txt"
+    write_log(log)
+    convert_incremental(str(log), str(output))
+    
+    # A shorter output written by something else, with the checkpoint left in place
+    text = log.read_text(encoding="utf-8")
+    log.write_text(text.replace("+ Trabalhar", "- Trabalhar", 1), encoding="utf-8")
+    shutil.copy(tmp_path / "input.txt", tmp_path / "edited.txt")
+    convert_tasks_to_csv(str(tmp_path / "edited.txt"), str(tmp_path / "rebuilt.txt"))
+    shutil.copy(tmp_path / "rebuilt.txt", output)
+    
+    with open(log, "a", encoding="utf-8") as f:
+        f.write(day_block(DAYS))
+    convert_incremental(str(log), str(output))
+    
+    assert output.read_text(encoding="utf-8") == full_conversion(tmp_path, log)
+
+
+def test_search_index_drops_tasks_removed_from_the_reparsed_block(tmp_path):
+    from search_index import open_index
+    from upload_to_firestore import pad_task_id
+    
+    log, output, index = tmp_path / "input.txt", tmp_path / "output.txt", tmp_path / "search.sqlite"
+    write_log(log, days=3)
+    convert_incremental(str(log), str(output), search_index=str(index))
+    
+    # Drop a task from the last day, which the next run re-parses
+    text = log.read_text(encoding="utf-8")
+    head, last_day = text[:text.rindex("/2023\n") - 5], text[text.rindex("/2023\n") - 5:]
+    log.write_text(head + last_day.replace("+ Trabalhar                         8h51\n", ""), encoding="utf-8")
+    convert_incremental(str(log), str(output), search_index=str(index))
+    
+    conn = open_index(str(index))
+    indexed = {task_id for (task_id,) in conn.execute("SELECT id FROM tasks")}
+    conn.close()
+    assert indexed == {pad_task_id(line.split(";")[0]) for line in output.read_text(encoding="utf-8").splitlines()}
+    assert len(indexed) == 3 * 4 - 1
@@ -0,0 +1,109 @@
+"""
+Tests for the quota scheduler's budget reservations and work queue replay.
+
+Run from scripts/:
+    python -m pytest -q test_quota_scheduler.py
+"""
+
+import threading
+
+from firestore_utils import commit_in_batches
+from quota_scheduler import QuotaScheduler, open_ledger, queued_count, quota_day, used_today
+
+
+class NoWait:
+    """Token bucket that never sleeps."""
+    
+    def take(self, count):
+        return 0.0
+
+
+class FakeRef:
+    def __init__(self, path):
+        self.path = path
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.operations = []
+    
+    def set(self, doc_ref, data, merge=False):
+        self.operations.append(doc_ref.path)
+    
+    def delete(self, doc_ref):
+        self.operations.append(doc_ref.path)
+    
+    def commit(self):
+        if self.db.fail:
+            raise RuntimeError("commit refused")
+        self.db.committed.extend(self.operations)
+
+
+class FakeClient:
+    """Just enough of a Firestore client for commit_batch and drain."""
+    
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.committed = []
+    
+    def document(self, path):
+        return FakeRef(path)
+    
+    def batch(self):
+        return FakeBatch(self)
+
+
+def scheduler(tmp_path, writes=100):
+    conn = open_ledger(str(tmp_path / "quota.sqlite"))
+    return QuotaScheduler(conn, "test", reserve=0, limits={"writes": writes, "deletes": writes}, bucket=NoWait())
+
+
+def writes(count, prefix="tasks/t"):
+    return [("set", FakeRef(f"{prefix}{i}"), {"n": i}) for i in range(count)]
+
+
+def test_parallel_admissions_cannot_spend_the_same_budget(tmp_path):
+    quota = scheduler(tmp_path)
+    admitted = []
+    threads = [threading.Thread(target=lambda: admitted.append(quota.admit(writes(20)))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert admitted.count(True) == 5
+    assert quota.remaining()["writes"] == 0
+    
+    for _ in range(2):
+        quota.record(writes(20))
+    for _ in range(3):
+        quota.record(writes(20), committed=False)
+    assert used_today(quota.conn, quota_day())["writes"] == 40
+    assert quota.remaining()["writes"] == 60
+
+
+def test_failed_commit_gives_its_reservation_back(tmp_path):
+    quota = scheduler(tmp_path)
+    
+    committed, failed = commit_in_batches(FakeClient(fail=True), writes(30), batch_size=10,
+                                          max_retries=0, scheduler=quota)
+    
+    assert (committed, failed) == (0, 30)
+    assert quota.remaining()["writes"] == 100
+    assert used_today(quota.conn, quota_day())["writes"] == 0
+
+
+def test_failed_replay_keeps_the_queue(tmp_path):
+    quota = scheduler(tmp_path)
+    quota.defer(writes(5))
+    
+    assert quota.drain(FakeClient(fail=True), batch_size=2) == 0
+    assert queued_count(quota.conn) == quota.queued == 5
+    assert quota.remaining()["writes"] == 100
+    
+    client = FakeClient()
+    assert quota.drain(client, batch_size=2) == 5
+    assert client.committed == [f"tasks/t{i}" for i in range(5)]
+    assert queued_count(quota.conn) == quota.queued == 0
+    assert used_today(quota.conn, quota_day())["writes"] == 5
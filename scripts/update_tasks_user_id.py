@@ -4,15 +4,42 @@ Firebase Task Migration Script
 Updates all existing tasks in Firestore by adding userId field
 
 Usage:
-    python update_tasks_userid.py
+    python update_tasks_user_id.py
+    python update_tasks_user_id.py --yes        # no confirmation prompt
+    python update_tasks_user_id.py --restart    # ignore a saved resume cursor
+    python update_tasks_user_id.py --sample 25  # show up to 25 offending tasks when verifying
+
+How it works:
+    Firestore cannot query for a missing field, so the collection is scanned once,
+    ordered by document ID and with only the userId field selected. Each page's
+    updates are committed in one batch together with the progress document
+    (migrations/userid_migration: cursor and counters), so an interrupted run
+    resumes right after the last committed page instead of rescanning from zero.
+    
+    Counting and verification use count() aggregation queries (1 read per 1000
+    tasks); tasks without userId are total - (userId == target) - (userId != target).
+    Only a small sample of offending tasks is ever read in full; examples of
+    tasks without userId are found by paging through the collection (userId
+    only) until the sample is full, so they cost reads up to the last example.
+    
+    The scan also sees every task ID, so after each page the per-day task ID
+    counters (see task_counters.py) are raised, which backfills them without
+    extra reads. The bumps are idempotent, so a resumed run can repeat them.
+    
+    Pages are paced by quota_scheduler.py (ramp-up and today's free-tier write
+    budget). When the budget runs out the migration pauses at the saved cursor,
+    and running it again on a later day resumes there. --no-quota turns this off.
 """
 
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
+import argparse
 import sys
 from datetime import datetime
 
+from firestore_utils import MAX_BATCH_SIZE, commit_batch, count_documents, get_firestore_client
+from instrumentation import add_profile_arguments, profile_from_args, timed
+from quota_scheduler import add_quota_arguments, print_deferred, scheduler_from_args
+from task_counters import bump_counters, day_maxima
+
 # ============================================================================
 # CONFIGURATION - MODIFY THESE BEFORE RUNNING
 # ============================================================================
@@ -33,170 +60,244 @@ METADATA_DOC = "userid_migration"
 # The userId to assign to all tasks
 TARGET_USER_ID = "a@a.com"
 
+# Documents scanned per page; one slot of the 500-write batch is kept for the progress document
+PAGE_SIZE = MAX_BATCH_SIZE - 1
+
+# Verification counts with aggregation queries and only reads a sample of offending tasks
+SAMPLE_SIZE = 10
+# Tasks without userId can't be queried, so the sample of those pages through the collection
+SAMPLE_PAGE_SIZE = 1000
+
 # ============================================================================
 # MAIN SCRIPT
 # ============================================================================
 
 def initialize_firebase():
-    """Initialize Firebase Admin SDK"""
-    try:
-        # Check if Firebase is already initialized
-        firebase_admin.get_app()
-    except ValueError:
-        # Firebase not initialized yet
-        try:
-            cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
-            firebase_admin.initialize_app(cred)
-            print(f"✅ Firebase initialized with: {SERVICE_ACCOUNT_PATH}")
-        except FileNotFoundError:
-            print(f"❌ Error: Firebase credentials file not found at: {SERVICE_ACCOUNT_PATH}")
-            print("\nHow to fix:")
-            print("1. Go to Firebase Console > Project Settings > Service Accounts")
-            print("2. Click 'Generate New Private Key'")
-            print("3. Save the JSON file and update SERVICE_ACCOUNT_PATH in this script")
-            sys.exit(1)
-        except Exception as e:
-            print(f"❌ Error initializing Firebase: {e}")
-            sys.exit(1)
-
-
-def count_tasks():
-    """Count total number of tasks in Firestore"""
+    """Initialize Firebase Admin SDK and return a Firestore client"""
     try:
-        db = firestore.client()
-        docs = db.collection(COLLECTION_NAME).stream()
-        count = 0
-        for _ in docs:
-            count += 1
-        return count
+        db = get_firestore_client(SERVICE_ACCOUNT_PATH)
+        print(f"✅ Firebase initialized with: {SERVICE_ACCOUNT_PATH}")
+        return db
+    except FileNotFoundError:
+        print(f"❌ Error: Firebase credentials file not found at: {SERVICE_ACCOUNT_PATH}")
+        print("\nHow to fix:")
+        print("1. Go to Firebase Console > Project Settings > Service Accounts")
+        print("2. Click 'Generate New Private Key'")
+        print("3. Save the JSON file and update SERVICE_ACCOUNT_PATH in this script")
+        sys.exit(1)
     except Exception as e:
-        print(f"❌ Error counting tasks: {e}")
-        return 0
+        print(f"❌ Error initializing Firebase: {e}")
+        sys.exit(1)
 
 
-def get_tasks_without_userid():
-    """Get all tasks that don't have userId field"""
-    try:
-        db = firestore.client()
-        docs = db.collection(COLLECTION_NAME).stream()
-        
-        tasks_without_userid = []
-        for doc in docs:
-            data = doc.to_dict()
-            if "userId" not in data:
-                tasks_without_userid.append({
-                    "doc_id": doc.id,
-                    "data": data
-                })
-        
-        return tasks_without_userid
-    except Exception as e:
-        print(f"❌ Error fetching tasks: {e}")
-        return []
+def load_migration_state(db):
+    """Read the saved migration progress, or None if there is none"""
+    doc = db.collection(METADATA_COLLECTION).document(METADATA_DOC).get()
+    return doc.to_dict() if doc.exists else None
 
 
-def update_task_with_userid(doc_id, user_id):
-    """Update a single task with userId field"""
-    try:
-        db = firestore.client()
-        db.collection(COLLECTION_NAME).document(doc_id).update({
-            "userId": user_id
-        })
-        return True
-    except Exception as e:
-        print(f"❌ Error updating task {doc_id}: {e}")
-        return False
+def new_migration_state(user_id):
+    """Progress document for a migration starting from the first task"""
+    now = datetime.now().isoformat()
+    return {
+        "status": "running",
+        "target_user_id": user_id,
+        "cursor": None,
+        "scanned": 0,
+        "updated": 0,
+        "already_set": 0,
+        "mismatched": 0,
+        "started_at": now,
+        "updated_at": now,
+        "completed_at": None,
+    }
 
 
-def update_all_tasks(user_id):
-    """Update all tasks without userId"""
-    print(f"\n🔍 Searching for tasks without userId field...")
-    
-    tasks_to_update = get_tasks_without_userid()
+@timed("scan", chunk=1)
+def iter_userid_pages(db, cursor=None, page_size=PAGE_SIZE):
+    """Yield pages of task snapshots holding only userId, ordered by document ID, after `cursor`"""
+    collection_ref = db.collection(COLLECTION_NAME)
+    query = collection_ref.order_by("__name__").select(["userId"]).limit(page_size)
     
-    if not tasks_to_update:
-        print("✅ No tasks found without userId field. All tasks are already updated!")
-        return True
-    
-    total = len(tasks_to_update)
-    print(f"📊 Found {total} task(s) to update")
+    while True:
+        page_query = query.start_after(collection_ref.document(cursor)) if cursor else query
+        docs = list(page_query.stream())
+        if not docs:
+            return
+        
+        yield docs
+        
+        if len(docs) < page_size:
+            return
+        cursor = docs[-1].id
+
+
+def run_migration(db, user_id, restart=False, confirm=None, scheduler=None):
+    """
+    Add userId to every task that lacks it, in one resumable scan.
     
-    # Show preview
-    print(f"\n📋 Preview of tasks to be updated:")
-    for i, task in enumerate(tasks_to_update[:3], 1):
-        print(f"\n  Task {i}:")
-        print(f"    Document ID: {task['doc_id']}")
-        print(f"    Description: {task['data'].get('description', 'N/A')}")
-        print(f"    Task ID: {task['data'].get('id', 'N/A')}")
+    Each page's updates and the progress document are committed in the same batch,
+    so the saved cursor and counters always match what was written. `confirm` is
+    called with the first page's tasks to update and may return False to cancel.
+    With a `scheduler`, a page that doesn't fit in today's write budget pauses the
+    migration (status stays "running", so the next run resumes there).
     
-    if total > 3:
-        print(f"\n  ... and {total - 3} more task(s)")
+    Returns the final migration state, or None if cancelled.
+    """
+    collection_ref = db.collection(COLLECTION_NAME)
+    state_ref = db.collection(METADATA_COLLECTION).document(METADATA_DOC)
     
-    # Confirmation
-    print(f"\n⚠️  About to update {total} task(s) with userId = '{user_id}'")
-    response = input("\nContinue? (yes/no): ").strip().lower()
+    state = None if restart else load_migration_state(db)
+    if state and state.get("status") == "running" and state.get("target_user_id") == user_id:
+        print(f"⏯️  Resuming after task {state['cursor']} "
+              f"({state['scanned']} scanned, {state['updated']} updated so far)")
+    else:
+        state = new_migration_state(user_id)
     
-    if response not in ["yes", "y"]:
-        print("❌ Operation cancelled by user")
-        return False
+    confirmed = confirm is None
     
-    # Update tasks
-    print(f"\n🔄 Updating tasks...")
-    successful = 0
-    failed = 0
-    
-    for i, task in enumerate(tasks_to_update, 1):
-        doc_id = task["doc_id"]
-        if update_task_with_userid(doc_id, user_id):
-            successful += 1
-            status = "✅"
-        else:
-            failed += 1
-            status = "❌"
+    for page_number, docs in enumerate(iter_userid_pages(db, state["cursor"]), 1):
+        to_update = []
+        for doc in docs:
+            value = (doc.to_dict() or {}).get("userId")
+            if value is None:
+                to_update.append(doc.id)
+            elif value == user_id:
+                state["already_set"] += 1
+            else:
+                state["mismatched"] += 1
+                print(f"⚠️  Task {doc.id} has userId: {value} (expected: {user_id})")
+        
+        if to_update and not confirmed:
+            if not confirm(to_update):
+                return None
+            confirmed = True
+        
+        committed_state = dict(state)
+        state["scanned"] += len(docs)
+        state["updated"] += len(to_update)
+        state["cursor"] = docs[-1].id
+        state["updated_at"] = datetime.now().isoformat()
+        
+        operations = [("update", collection_ref.document(doc_id), {"userId": user_id}) for doc_id in to_update]
+        operations.append(("set", state_ref, dict(state)))
+        if scheduler is not None and not scheduler.acquire(operations):
+            print(f"⏸️  Daily write budget reached before page {page_number}. Run again tomorrow to resume.")
+            return committed_state
+        try:
+            commit_batch(db, operations)
+        except Exception as e:
+            if scheduler is not None:
+                scheduler.record(operations, committed=False)
+            print(f"❌ Error committing page {page_number}: {e}")
+            print("   Progress is saved up to the previous page. Run again to resume.")
+            raise
+        if scheduler is not None:
+            scheduler.record(operations)
         
-        # Progress indicator
-        if i % 10 == 0 or i == total:
-            print(f"  {status} Progress: {i}/{total}")
+        bump_counters(db, day_maxima(doc.id for doc in docs), scheduler=scheduler)
+        
+        print(f"  🔄 Page {page_number}: {state['scanned']} scanned, {state['updated']} updated")
     
-    # Summary
+    state["status"] = "completed"
+    state["completed_at"] = datetime.now().isoformat()
+    state_ref.set(state)
+    return state
+
+
+def confirm_update(user_id):
+    """Build the confirmation callback that previews the first tasks to update"""
+    def confirm(doc_ids):
+        print(f"\n📋 Preview of tasks to be updated:")
+        for i, doc_id in enumerate(doc_ids[:3], 1):
+            print(f"  Task {i}: {doc_id}")
+        if len(doc_ids) > 3:
+            print(f"  ... and more")
+        
+        print(f"\n⚠️  About to add userId = '{user_id}' to every task without it")
+        response = input("\nContinue? (yes/no): ").strip().lower()
+        if response not in ["yes", "y"]:
+            print("❌ Operation cancelled by user")
+            return False
+        return True
+    return confirm
+
+
+def print_results(state):
+    """Print the counters gathered during the migration scan"""
     print(f"\n{'='*50}")
-    print(f"✅ Successfully updated: {successful}")
-    print(f"❌ Failed: {failed}")
-    print(f"📊 Total: {total}")
+    print(f"📊 Total tasks scanned: {state['scanned']}")
+    print(f"✅ Updated: {state['updated']}")
+    print(f"☑️  Already had userId: {state['already_set']}")
+    print(f"⚠️  Different userId: {state['mismatched']}")
     print(f"{'='*50}")
+
+
+def userid_counts(db, user_id):
+    """
+    Count tasks by userId state with three count() aggregations, without reading any document.
+    Tasks without the field are not indexed, so they are derived from the other counts.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
     
-    return failed == 0
+    collection_ref = db.collection(COLLECTION_NAME)
+    total = count_documents(collection_ref)
+    matching = count_documents(collection_ref.where(filter=FieldFilter("userId", "==", user_id)))
+    mismatched = count_documents(collection_ref.where(filter=FieldFilter("userId", "!=", user_id)))
+    return {
+        "total": total,
+        "matching": matching,
+        "mismatched": mismatched,
+        "missing": total - matching - mismatched,
+    }
 
 
-def verify_updates(user_id):
-    """Verify that all tasks were updated with userId"""
-    print(f"\n✔️  Verifying updates...")
+def sample_offenders(db, user_id, counts, sample_size=SAMPLE_SIZE):
+    """
+    Read a bounded sample of tasks with a different or missing userId.
+    Missing fields can't be queried, so those are looked for page by page, in document ID
+    order, until `sample_size` of them (or all that counts["missing"] reports) are found.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
     
-    db = firestore.client()
-    docs = db.collection(COLLECTION_NAME).stream()
+    collection_ref = db.collection(COLLECTION_NAME)
+    mismatched = []
+    missing = []
     
-    total = 0
-    with_userid = 0
-    without_userid = 0
+    if counts["mismatched"]:
+        query = collection_ref.where(filter=FieldFilter("userId", "!=", user_id)).select(["userId"])
+        mismatched = [(doc.id, doc.to_dict().get("userId")) for doc in query.limit(sample_size).stream()]
     
-    for doc in docs:
-        data = doc.to_dict()
-        total += 1
-        
-        if "userId" in data:
-            with_userid += 1
-            if data["userId"] != user_id:
-                print(f"⚠️  Task {doc.id} has userId: {data['userId']} (expected: {user_id})")
-        else:
-            without_userid += 1
-            print(f"❌ Task {doc.id} still missing userId field")
+    wanted = min(sample_size, counts["missing"])
+    if wanted > 0:
+        for docs in iter_userid_pages(db, page_size=SAMPLE_PAGE_SIZE):
+            missing.extend(doc.id for doc in docs if "userId" not in (doc.to_dict() or {}))
+            if len(missing) >= wanted:
+                break
+    
+    return mismatched, missing[:sample_size]
+
+
+@timed("verify")
+def verify_updates(db, user_id, sample_size=SAMPLE_SIZE):
+    """Verify that all tasks were updated with userId, using aggregation counts"""
+    print(f"\n✔️  Verifying updates...")
+    
+    counts = userid_counts(db, user_id)
+    mismatched, missing = sample_offenders(db, user_id, counts, sample_size)
+    
+    for doc_id, value in mismatched:
+        print(f"⚠️  Task {doc_id} has userId: {value} (expected: {user_id})")
+    for doc_id in missing:
+        print(f"❌ Task {doc_id} still missing userId field")
     
     print(f"\n📊 Verification Results:")
-    print(f"  Total tasks: {total}")
-    print(f"  With userId: {with_userid}")
-    print(f"  Without userId: {without_userid}")
+    print(f"  Total tasks: {counts['total']}")
+    print(f"  With userId: {counts['matching'] + counts['mismatched']}")
+    print(f"  Different userId: {counts['mismatched']}")
+    print(f"  Without userId: {counts['missing']}")
     
-    if without_userid == 0:
+    if counts["missing"] == 0:
         print(f"\n✅ All tasks successfully updated!")
         return True
     else:
@@ -206,6 +307,16 @@ def verify_updates(user_id):
 
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description="Add userId to every task in Firestore.")
+    parser.add_argument("--yes", action="store_true", help="don't ask for confirmation")
+    parser.add_argument("--restart", action="store_true", help="ignore a saved cursor and scan from the start")
+    parser.add_argument("--sample", type=int, default=SAMPLE_SIZE,
+                        help=f"offending tasks to show during verification (default: {SAMPLE_SIZE})")
+    add_quota_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "migrate")
+    
     print("="*60)
     print("Firebase Task Migration - Add userId Field")
     print("="*60)
@@ -218,26 +329,42 @@ def main():
     
     # Initialize Firebase
     print(f"\n🔐 Initializing Firebase...")
-    initialize_firebase()
+    db = initialize_firebase()
     
     # Count tasks
-    print(f"\n📊 Counting total tasks...")
-    total_tasks = count_tasks()
-    print(f"  Total tasks in database: {total_tasks}")
+    print(f"\n📊 Counting tasks...")
+    counts = userid_counts(db, TARGET_USER_ID)
+    print(f"  Total tasks in database: {counts['total']}")
+    print(f"  Without userId: {counts['missing']}")
     
-    if total_tasks == 0:
+    if counts["total"] == 0:
         print("⚠️  No tasks found in database. Nothing to update.")
         return
     
-    # Update tasks
-    success = update_all_tasks(TARGET_USER_ID)
+    if counts["missing"] == 0:
+        print("✅ No tasks found without userId field. All tasks are already updated!")
+        verify_updates(db, TARGET_USER_ID, args.sample)
+        return
+    
+    # Scan and update in one pass
+    print(f"\n🔍 Scanning for tasks without userId field...")
+    confirm = None if args.yes else confirm_update(TARGET_USER_ID)
+    scheduler = scheduler_from_args(args, db, "migrate")
+    state = run_migration(db, TARGET_USER_ID, restart=args.restart, confirm=confirm, scheduler=scheduler)
     
-    if not success:
+    if state is None:
         print("\n⚠️  Update process completed with issues")
         return
     
+    print_results(state)
+    print_deferred(scheduler)
+    if state["status"] != "completed":
+        print("\n⏸️  Migration paused at the daily budget; progress is saved.")
+        return
+    
     # Verify
-    verify_updates(TARGET_USER_ID)
+    if not verify_updates(db, TARGET_USER_ID, args.sample):
+        return
     
     print(f"\n{'='*60}")
     print(f"✅ Migration completed successfully!")
@@ -245,4 +372,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
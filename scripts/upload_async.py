@@ -0,0 +1,119 @@
+"""
+Async Upload Engine
+===================
+
+Uploads parsed tasks with the asyncio Firestore client, keeping several
+commits in flight at once to hide network latency during large backfills.
+
+Requirements:
+    pip install firebase-admin
+
+Usage:
+    python upload_to_firestore.py --concurrency 16
+    
+    Or from Python:
+        report = asyncio.run(upload_tasks_async(tasks, async_db, max_in_flight=16))
+
+Notes:
+    - Documents are built by upload_to_firestore.task_document, so the same
+      documents are written as with the sequential uploader
+    - Each request is a batched commit of up to `batch_size` sets; use
+      batch_size=1 for one request per task
+    - Contention, DEADLINE_EXCEEDED and other transient errors are retried
+      per request with jittered exponential backoff
+"""
+
+import asyncio
+import time
+
+from firestore_utils import DEFAULT_MAX_RETRIES, MAX_BATCH_SIZE, backoff_delay, retryable_errors
+from rollups import DEFAULT_USER_ID
+from upload_to_firestore import COLLECTION_NAME, current_upload_time, task_document
+
+DEFAULT_MAX_IN_FLIGHT = 16
+DEFAULT_ASYNC_BATCH_SIZE = 50
+
+
+def iter_batches(tasks, batch_size: int):
+    """Group tasks into lists of up to `batch_size`, consuming the input lazily."""
+    batch = []
+    for task in tasks:
+        batch.append(task)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def commit_with_retry(db, collection_ref, tasks: list[dict], upload_time: str, user_id: str,
+                            max_retries: int, report: dict):
+    """Commit one batch of sets, retrying transient errors. Returns True on success."""
+    errors = retryable_errors()
+    
+    for attempt in range(max_retries + 1):
+        batch = db.batch()
+        for task in tasks:
+            batch.set(collection_ref.document(task["id"]), task_document(task, upload_time, user_id))
+        
+        try:
+            await batch.commit()
+            return True
+        except errors as e:
+            if attempt == max_retries:
+                report["errors"].append(f"{tasks[0]['id']}..{tasks[-1]['id']}: {e}")
+                return False
+            report["retries"] += 1
+            await asyncio.sleep(backoff_delay(attempt))
+        except Exception as e:
+            report["errors"].append(f"{tasks[0]['id']}..{tasks[-1]['id']}: {e}")
+            return False
+
+
+async def upload_tasks_async(tasks, db, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                             batch_size: int = DEFAULT_ASYNC_BATCH_SIZE,
+                             max_retries: int = DEFAULT_MAX_RETRIES, upload_time: str = None,
+                             user_id: str = DEFAULT_USER_ID) -> dict:
+    """
+    Upload tasks with at most `max_in_flight` commits running concurrently.
+    
+    `tasks` can be any iterable of parsed tasks (e.g. parse_txt_file output); it is
+    consumed lazily by a fixed pool of worker coroutines.
+    
+    Returns:
+        dict: written and failed task counts, failed_ids, retries, errors, elapsed seconds
+    """
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+    
+    collection_ref = db.collection(COLLECTION_NAME)
+    upload_time = upload_time or current_upload_time()
+    batches = iter_batches(tasks, batch_size)
+    report = {"written": 0, "failed": 0, "failed_ids": [], "retries": 0, "errors": []}
+    started = time.perf_counter()
+    
+    async def worker():
+        # Workers share one iterator; asyncio runs them on a single thread, so next() is safe
+        for batch in batches:
+            if await commit_with_retry(db, collection_ref, batch, upload_time, user_id, max_retries, report):
+                report["written"] += len(batch)
+            else:
+                report["failed"] += len(batch)
+                report["failed_ids"].extend(task["id"] for task in batch)
+    
+    await asyncio.gather(*(worker() for _ in range(max(max_in_flight, 1))))
+    
+    report["elapsed"] = time.perf_counter() - started
+    return report
+
+
+def print_report(report: dict):
+    """Print the final summary of an async upload."""
+    print(f"\n📊 Async upload report ({report['elapsed']:.1f}s):")
+    print(f"   ✅ Written: {report['written']}")
+    print(f"   ❌ Failed: {report['failed']}")
+    print(f"   🔁 Retries: {report['retries']}")
+    for error in report["errors"][:10]:
+        print(f"   ⚠️  {error}")
+    if len(report["errors"]) > 10:
+        print(f"   ... and {len(report['errors']) - 10} more error(s)")
@@ -16,6 +16,14 @@ Setup:
 
 Usage:
     python upload_to_firestore.py
+    python upload_to_firestore.py --batch-size 200
+    python upload_to_firestore.py --delete-removed
+    python upload_to_firestore.py --full
+    python upload_to_firestore.py --concurrency 16   # asyncio client, 16 commits in flight
+    python upload_to_firestore.py --user-id b@b.com  # owner of the tasks and rollups (default: a@a.com)
+    
+    To try it offline, start the Firestore emulator and set FIRESTORE_EMULATOR_HOST
+    (see firestore_utils.py); no service account is needed then.
 
 File format (tasks.txt):
     Each line should be: ID;DESCRIPTION;TIMESTAMP
@@ -24,17 +32,67 @@ File format (tasks.txt):
 Firestore structure:
     Collection: tasks
         Document ID: task ID (e.g., 20251101_1)
-        Fields: id, description, startTime, endTime, timestamp
+        Fields: id, userId, description, startTime, endTime, timestamp
     
     Collection: _metadata
         Document: tasks_upload
-        Fields: last_file_hash, last_upload, task_count
+        Fields: last_file_hash, last_upload, task_count, manifest_hash
+        Document: task_counters/days/{YYYYMMDD}
+        Fields: last (highest task number of the day, see task_counters.py)
+    
+    Collection: daily_rollups
+        Document ID: {userId}_{YYYYMMDD}
+        Fields: task_count, total_minutes, minutes_by_description, first/last timestamp
+        (see rollups.py; only days with added, changed or deleted tasks are rewritten)
+
+Search index:
+    If tasks_search.sqlite exists (see search_index.py), the uploaded tasks are
+    indexed and deleted ones removed from it, so it follows the manifest delta.
+
+Row-level delta:
+    tasks_manifest.json (next to tasks.txt) maps every uploaded task ID to a hash
+    of its description, startTime and endTime. Only tasks whose hash changed are
+    written, so editing one line costs a couple of writes instead of re-uploading
+    everything. --delete-removed also deletes tasks that are gone from the file.
+    The manifest is trusted only if its hash matches manifest_hash in _metadata;
+    otherwise (or with --full) every task is uploaded and the manifest rebuilt.
+    The userId isn't part of the hash: after changing --user-id, run once with
+    --full (or update_tasks_user_id.py for tasks uploaded without a userId).
+
+Streaming:
+    tasks.txt is read once: the SHA-256 file hash, the parsing (with one task of
+    lookahead for endTime) and the manifest diff all happen while the uploader
+    consumes the tasks, so memory stays proportional to one batch (plus one small
+    rollup per day). Only without a usable manifest is the file hashed first, to
+    skip unchanged uploads.
+
+Writes are sent in batched commits of up to 500 tasks each, with retries
+and backoff for transient errors.
+
+Quota:
+    Batched commits are paced by quota_scheduler.py: they ramp up from 500
+    writes per second and stop at today's free-tier budget. What doesn't fit is
+    queued and sent first on the next run, so the manifest and metadata are
+    still updated. --no-quota turns this off; --concurrency uploads are not paced.
 """
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+import argparse
 from datetime import datetime, timezone
 import hashlib
+import json
+import os
+
+from firestore_utils import (
+    MAX_BATCH_SIZE,
+    commit_in_batches,
+    get_async_firestore_client,
+    get_firestore_client,
+)
+from instrumentation import add_profile_arguments, profile_from_args, timed
+from quota_scheduler import add_quota_arguments, print_deferred, scheduler_from_args
+from rollups import DEFAULT_USER_ID, track_rollups, write_rollups
+from search_index import SEARCH_INDEX_PATH, index_tasks, open_index, remove_tasks
+from task_counters import bump_counters, track_task_id
 
 # === CONFIGURATION ===
 TXT_FILE_PATH = "../tasks.txt"
@@ -42,7 +100,9 @@ SERVICE_ACCOUNT_PATH = "../serviceAccountKey.json"
 COLLECTION_NAME = "tasks"
 METADATA_COLLECTION = "_metadata"
 METADATA_DOC = "tasks_upload"
+MANIFEST_PATH = "../tasks_manifest.json"
 
+@timed("hash")
 def calculate_file_hash(file_path: str) -> str:
     """Calculate SHA256 hash of a file to detect changes."""
     sha256_hash = hashlib.sha256()
@@ -86,38 +146,55 @@ def pad_task_id(task_id: str) -> str:
         return f"{date_part}{padded_num}"  # ← no underscore (CHANGED)
     return task_id
 
+@timed("parse")
+def iter_txt_file(file_path: str, digest=None, offset: int = 0):
+    """
+    Read the tasks.txt CSV file once and yield task dictionaries one at a time.
+    Each task has: id, description, startTime, endTime, timestamp.
+    The endTime is the next task's startTime, so one task is held back as lookahead.
+    
+    If `digest` is given (e.g. hashlib.sha256()), every byte read is fed into it, so the
+    file hash is ready once the generator is exhausted without reading the file twice.
+    A non-zero `offset` (the start of a line) reads only the rest of the file.
+    """
+    pending = None
+    
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        for raw_line in f:
+            if digest is not None:
+                digest.update(raw_line)
+            
+            line = raw_line.decode("utf-8").strip()
+            if not line:
+                continue
+            
+            parts = line.split(";")
+            start_time = parts[2]
+            
+            if pending is not None:
+                pending["endTime"] = start_time
+                yield pending
+            
+            pending = {
+                "id": pad_task_id(parts[0]),
+                "description": parts[1],
+                "startTime": start_time,
+                "endTime": start_time,
+                "timestamp": None
+            }
+    
+    if pending is not None:
+        yield pending
+
+
 def parse_txt_file(file_path: str) -> list[dict]:
     """
     Parse the tasks.txt CSV file into a list of task dictionaries.
     Each task has: id, description, startTime, endTime, timestamp.
     The endTime is calculated from the next task's startTime.
     """
-    tasks = []
-    
-    with open(file_path, "r", encoding="utf-8") as f:
-        lines = [line.strip() for line in f if line.strip()]
-    
-    for i, line in enumerate(lines):
-        parts = line.split(";")
-        task_id = pad_task_id(parts[0])
-        description = parts[1]
-        start_time = parts[2]
-        
-        if i + 1 < len(lines):
-            next_parts = lines[i + 1].split(";")
-            end_time = next_parts[2]
-        else:
-            end_time = start_time
-        
-        tasks.append({
-            "id": task_id,
-            "description": description,
-            "startTime": start_time,
-            "endTime": end_time,
-            "timestamp": None
-        })
-    
-    return tasks
+    return list(iter_txt_file(file_path))
 
 
 def is_collection_empty(db) -> bool:
@@ -127,7 +204,13 @@ def is_collection_empty(db) -> bool:
     return len(list(docs)) == 0
 
 
-def check_file_changed(db, file_hash: str) -> bool:
+def get_metadata(db) -> dict:
+    """Read the upload metadata document, or an empty dict if there is none yet."""
+    meta_doc = db.collection(METADATA_COLLECTION).document(METADATA_DOC).get()
+    return meta_doc.to_dict() if meta_doc.exists else {}
+
+
+def check_file_changed(db, file_hash: str, metadata: dict = None) -> bool:
     """
     Check if file has changed since last upload by comparing SHA256 hashes.
     Also returns True if the collection is empty (data was deleted).
@@ -139,82 +222,302 @@ def check_file_changed(db, file_hash: str) -> bool:
         print("   Collection is empty. Will upload.")
         return True
     
-    meta_ref = db.collection(METADATA_COLLECTION).document(METADATA_DOC)
-    meta_doc = meta_ref.get()
+    if metadata is None:
+        metadata = get_metadata(db)
     
-    if meta_doc.exists:
-        stored_hash = meta_doc.to_dict().get('last_file_hash')
-        if stored_hash == file_hash:
-            return False
-    
-    return True
+    return metadata.get('last_file_hash') != file_hash
 
 
-def update_metadata(db, file_hash: str, task_count: int):
-    """Store the current file hash in Firestore to detect future changes."""
+def update_metadata(db, file_hash: str, task_count: int, manifest_hash: str = None):
+    """Store the current file and manifest hashes in Firestore to detect future changes."""
     meta_ref = db.collection(METADATA_COLLECTION).document(METADATA_DOC)
     meta_ref.set({
         'last_file_hash': file_hash,
         'last_upload': datetime.now().isoformat(),
-        'task_count': task_count
+        'task_count': task_count,
+        'manifest_hash': manifest_hash
     })
 
 
-def upload_to_firestore(tasks: list[dict], db):
-    """Upload all tasks to Firestore using task ID as document ID."""
-    collection_ref = db.collection(COLLECTION_NAME)
+def task_content_hash(task: dict) -> str:
+    """Hash the uploaded content of a task (the timestamp is set at upload time, so it is left out)."""
+    content = "\x1f".join((task["description"], task["startTime"], task["endTime"]))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+def manifest_digest(manifest: dict) -> str:
+    """Hash a whole manifest, so a local copy can be checked against _metadata."""
+    encoded = json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def load_manifest(file_path: str, expected_digest: str = None):
+    """
+    Load the local manifest (task ID → content hash).
+    Returns None if it is missing, unreadable or doesn't match `expected_digest`.
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
     
+    if expected_digest is None or manifest_digest(manifest) != expected_digest:
+        return None
+    return manifest
+
+
+def save_manifest(file_path: str, manifest: dict):
+    """Write the manifest atomically."""
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(temp_path, file_path)
+
+
+def iter_changed_tasks(tasks, manifest: dict, new_manifest: dict):
+    """
+    Yield only the tasks whose content hash differs from `manifest`, consuming `tasks` lazily.
+    Every task seen is recorded in `new_manifest`, which is complete once the generator is exhausted.
+    """
     for task in tasks:
-        doc_ref = collection_ref.document(task["id"])
-        
-        task_data = {
-            "id": task["id"],
-            "description": task["description"],
-            "startTime": task["startTime"],
-            "endTime": task["endTime"],
-            "timestamp": datetime.now().astimezone().replace(microsecond=0).isoformat()
-        }
-        
-        doc_ref.set(task_data)
-        print(f"✓ Uploaded: {task['id']} - {task['description']}")
-    
-    print(f"\n✅ Successfully uploaded {len(tasks)} tasks to Firestore!")
+        content_hash = task_content_hash(task)
+        new_manifest[task["id"]] = content_hash
+        if manifest.get(task["id"]) != content_hash:
+            yield task
+
+
+def diff_against_manifest(tasks: list[dict], manifest: dict):
+    """
+    Compare parsed tasks with the manifest of the last upload.
+    
+    Returns:
+        tuple: (tasks added or changed, IDs no longer in the file, manifest for `tasks`)
+    """
+    new_manifest = {}
+    changed = list(iter_changed_tasks(tasks, manifest, new_manifest))
+    removed = [task_id for task_id in manifest if task_id not in new_manifest]
+    return changed, removed, new_manifest
+
+
+def upload_concurrently(tasks, max_in_flight: int, user_id: str = DEFAULT_USER_ID) -> bool:
+    """Upload tasks through the asyncio engine in upload_async.py. Returns True if all were written."""
+    import asyncio
+    from upload_async import print_report, upload_tasks_async
+    
+    async def run():
+        async_db = get_async_firestore_client(SERVICE_ACCOUNT_PATH)
+        return await upload_tasks_async(tasks, async_db, max_in_flight=max_in_flight, user_id=user_id)
+    
+    report = asyncio.run(run())
+    print_report(report)
+    return report["failed"] == 0
+
+
+def delete_from_firestore(task_ids: list[str], db, batch_size: int = MAX_BATCH_SIZE, scheduler=None) -> bool:
+    """Delete tasks by ID in batched commits. Returns True if every delete succeeded (or was queued)."""
+    collection_ref = db.collection(COLLECTION_NAME)
+    operations = (("delete", collection_ref.document(task_id), None) for task_id in task_ids)
+    
+    committed, failed = commit_in_batches(db, operations, batch_size, scheduler=scheduler)
+    
+    if failed:
+        print(f"\n⚠️  Deleted {committed} tasks, {failed} failed after retries.")
+        return False
+    
+    print(f"\n✅ Deleted {committed} tasks no longer in the file.")
+    return True
+
+
+def current_upload_time() -> str:
+    """The timestamp stored on every task of one upload, e.g. 2025-11-01T10:15:00-03:00."""
+    return datetime.now().astimezone().replace(microsecond=0).isoformat()
+
+
+def task_document(task: dict, upload_time: str, user_id: str = DEFAULT_USER_ID) -> dict:
+    """Build the Firestore document for a parsed task owned by `user_id`."""
+    return {
+        "id": task["id"],
+        "userId": user_id,
+        "description": task["description"],
+        "startTime": task["startTime"],
+        "endTime": task["endTime"],
+        "timestamp": upload_time
+    }
+
+
+def upload_to_firestore(tasks, db, batch_size: int = MAX_BATCH_SIZE, scheduler=None,
+                        user_id: str = DEFAULT_USER_ID) -> bool:
+    """
+    Upload all tasks to Firestore using task ID as document ID, owned by `user_id`.
+    Writes are grouped into batched commits of up to `batch_size` tasks, and failed
+    batches are retried with backoff. `tasks` may be a list or a lazy iterable.
+    With a `scheduler`, tasks beyond today's budget are queued instead (see quota_scheduler.py).
+    Returns True if every task was written or queued.
+    """
+    collection_ref = db.collection(COLLECTION_NAME)
+    total = f"/{len(tasks)}" if hasattr(tasks, "__len__") else ""
+    upload_time = current_upload_time()
+    
+    operations = (
+        ("set", collection_ref.document(task["id"]), task_document(task, upload_time, user_id))
+        for task in tasks
+    )
+    
+    def show_progress(committed, failed):
+        print(f"   ✓ {committed + failed}{total} tasks processed ({failed} failed)")
+    
+    committed, failed = commit_in_batches(db, operations, batch_size, on_progress=show_progress,
+                                          scheduler=scheduler)
+    
+    if failed:
+        print(f"\n⚠️  Uploaded {committed} tasks, {failed} failed after retries.")
+        return False
+    
+    if scheduler is not None and scheduler.deferred:
+        print(f"\n✅ Uploaded {committed} tasks to Firestore, {scheduler.deferred} queued for the next run.")
+        return True
+    
+    print(f"\n✅ Successfully uploaded {committed} tasks to Firestore!")
+    return True
 
 
 def main():
     """Main entry point. Checks for file changes before uploading to save Firebase costs."""
-    print("🔐 Calculating file hash...")
-    file_hash = calculate_file_hash(TXT_FILE_PATH)
-    print(f"   Hash: {file_hash[:16]}...")
-    
-    cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    
-    print("\n🔍 Checking if file has changed since last upload...")
-    if not check_file_changed(db, file_hash):
-        print("⏭️  File unchanged since last upload. Skipping upload.")
-        print("   (0 writes, 1 read)")
+    parser = argparse.ArgumentParser(description="Upload tasks.txt to Firestore.")
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE,
+                        help=f"tasks per batched commit, at most {MAX_BATCH_SIZE} (default: {MAX_BATCH_SIZE})")
+    parser.add_argument('--delete-removed', action='store_true',
+                        help="also delete tasks that were uploaded before but are gone from the file")
+    parser.add_argument('--full', action='store_true',
+                        help="ignore the manifest and upload every task")
+    parser.add_argument('--concurrency', type=int, default=0,
+                        help="upload with the asyncio client, keeping this many commits in flight")
+    parser.add_argument('--verbose', action='store_true',
+                        help="print every task that is uploaded")
+    parser.add_argument('--user-id', default=DEFAULT_USER_ID,
+                        help=f"owner written on the tasks and their daily rollups (default: {DEFAULT_USER_ID})")
+    add_quota_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "upload")
+    
+    db = get_firestore_client(SERVICE_ACCOUNT_PATH)
+    scheduler = scheduler_from_args(args, db, "upload")
+    
+    print("🔍 Checking previous upload...")
+    metadata = get_metadata(db)
+    collection_empty = is_collection_empty(db)
+    
+    manifest = None
+    if collection_empty:
+        print("   Collection is empty. Will upload.")
+    elif not args.full:
+        manifest = load_manifest(MANIFEST_PATH, metadata.get('manifest_hash'))
+    
+    if manifest is None and not collection_empty and not (args.full or args.delete_removed):
+        # Without a manifest every task would be written, so check the whole file first
+        print("\n🔐 Calculating file hash...")
+        file_hash = calculate_file_hash(TXT_FILE_PATH)
+        print(f"   Hash: {file_hash[:16]}...")
+        if metadata.get('last_file_hash') == file_hash:
+            print("⏭️  File unchanged since last upload. Skipping upload.")
+            print("   (0 writes, 2 reads)")
+            return
+    
+    if manifest is None:
+        print("\n🧾 No usable manifest. Uploading every task.")
+        manifest = {}
+    
+    # Single pass over tasks.txt: hash, parse and diff while the uploader consumes the tasks
+    digest = hashlib.sha256()
+    new_manifest = {}
+    changed_count = 0
+    day_maxima = {}
+    rollups = {}
+    changed_days = set()
+    indexed = [] if os.path.exists(SEARCH_INDEX_PATH) else None
+    
+    def counted(tasks):
+        nonlocal changed_count
+        for task in tasks:
+            changed_count += 1
+            track_task_id(day_maxima, task["id"])
+            changed_days.add(task["id"][:8])
+            if indexed is not None:
+                indexed.append((task["id"], task["description"]))
+            if args.verbose:
+                start_readable = timestamp_to_readable(task["startTime"])
+                end_readable = timestamp_to_readable(task["endTime"])
+                print(f"   {task['id']}: {task['description']} ({start_readable} → {end_readable})")
+            yield task
+    
+    print("\n☁️  Streaming tasks.txt to Firestore...")
+    tasks = track_rollups(iter_txt_file(TXT_FILE_PATH, digest), rollups)
+    changed = counted(iter_changed_tasks(tasks, manifest, new_manifest))
+    if args.concurrency > 0:
+        uploaded = upload_concurrently(changed, args.concurrency, args.user_id)
+    else:
+        uploaded = upload_to_firestore(changed, db, args.batch_size, scheduler, args.user_id)
+    
+    file_hash = digest.hexdigest()
+    removed = [task_id for task_id in manifest if task_id not in new_manifest]
+    print(f"\n🧾 {len(new_manifest)} tasks: {changed_count} added or changed, {len(removed)} removed, "
+          f"{len(new_manifest) - changed_count} unchanged.")
+    
+    # Raise the per-day ID counters even after a partial upload; skipped numbers are harmless
+    counter_writes, _ = bump_counters(db, day_maxima, scheduler=scheduler)
+    if counter_writes:
+        print(f"🔢 Task ID counters raised for {counter_writes} day(s).")
+    
+    if not uploaded:
+        print("\n⏭️  Metadata not updated, so the next run uploads again.")
         return
     
-    print("   File changed or first upload. Proceeding...")
+    # Only once the tasks are in Firestore (or queued), so the index never gets ahead of it
+    if indexed:
+        search_conn = open_index(SEARCH_INDEX_PATH)
+        index_tasks(search_conn, indexed)
+        search_conn.close()
+        print(f"🔎 {len(indexed)} task(s) added to the search index.")
     
-    print("\n📖 Reading TXT file...")
-    tasks = parse_txt_file(TXT_FILE_PATH)
+    deletes = 0
+    if removed and args.delete_removed:
+        print("\n🗑️  Deleting removed tasks...")
+        if not delete_from_firestore(removed, db, args.batch_size, scheduler):
+            print("\n⏭️  Metadata not updated, so the next run tries again.")
+            return
+        deletes = len(removed)
+        changed_days.update(task_id[:8] for task_id in removed)
+        if indexed is not None:
+            search_conn = open_index(SEARCH_INDEX_PATH)
+            remove_tasks(search_conn, removed)
+            search_conn.close()
+    elif removed:
+        # Keep them in the manifest so --delete-removed can still find them later
+        for task_id in removed:
+            new_manifest[task_id] = manifest[task_id]
+        print(f"\nℹ️  {len(removed)} task(s) no longer in the file were kept. Use --delete-removed to delete them.")
     
-    print(f"📝 Parsed {len(tasks)} tasks:")
-    for task in tasks:
-        start_readable = timestamp_to_readable(task["startTime"])
-        end_readable = timestamp_to_readable(task["endTime"])
-        print(f"   {task['id']}: {task['description']} ({start_readable} → {end_readable})")
+    new_manifest_hash = manifest_digest(new_manifest)
+    if changed_count == 0 and deletes == 0 and metadata.get('manifest_hash') == new_manifest_hash \
+            and metadata.get('last_file_hash') == file_hash:
+        print("\n⏭️  Nothing changed since last upload.")
+        print("   (0 writes, 2 reads)")
+        return
     
-    print("\n☁️  Uploading to Firestore...")
-    upload_to_firestore(tasks, db)
+    print(f"\n📅 Updating daily rollups for {len(changed_days)} day(s)...")
+    rollup_writes, rollup_failed = write_rollups(db, rollups, changed_days, args.user_id, args.batch_size, scheduler)
+    if rollup_failed:
+        print("\n⏭️  Metadata not updated, so the next run rewrites the rollups.")
+        return
     
     print("\n📋 Updating metadata...")
-    update_metadata(db, file_hash, len(tasks))
+    save_manifest(MANIFEST_PATH, new_manifest)
+    update_metadata(db, file_hash, len(new_manifest), new_manifest_hash)
     
-    print(f"\n📊 Total operations: {len(tasks) + 1} writes, 1 read")
+    print(f"\n📊 Total operations: {changed_count + counter_writes + rollup_writes + 1} writes, {deletes} deletes, 2 reads")
+    print_deferred(scheduler)
 
 
 if __name__ == "__main__":
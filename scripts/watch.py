@@ -0,0 +1,385 @@
+"""
+Watch Daemon
+============
+
+Keeps running, watches input.txt and pushes every edit to Firestore within a
+second or two, instead of running convert.py and upload_to_firestore.py by
+hand (and paying interpreter start, Firebase initialization and a full file
+hash every time).
+
+Requirements:
+    pip install firebase-admin
+
+Setup:
+    1. Place serviceAccountKey.json in the parent directory (or update SERVICE_ACCOUNT_PATH)
+    2. Run upload_to_firestore.py once, so tasks_manifest.json matches Firestore
+
+Usage:
+    python watch.py                          # watch ../input.txt, write ../tasks.txt
+    python watch.py --debounce 1             # wait for 1s of quiet before pushing
+    python watch.py --poll                   # stat() polling instead of inotify
+    python watch.py --once                   # push what changed since the last run and exit
+    python watch.py --user-id b@b.com        # owner of the tasks and rollups (default: a@a.com)
+
+How it works:
+    - input.txt's directory is watched with inotify (through ctypes, so there
+      is nothing to install); where that isn't available the file is polled
+    - A burst of edits (an editor saving twice, typing with autosave) is
+      debounced into one push
+    - Each push runs convert.convert_incremental, which only re-parses the last
+      day block and what was appended. Only tasks.txt from the start of the day
+      before that block is read back, which covers the previous task whose
+      endTime is the new line's startTime
+    - Those tasks are compared with the manifest kept in memory, and the
+      changed tasks, their days' rollups and ID counters are sent in one
+      batched commit on a Firestore client that stays connected
+    - The manifest and _metadata (which need a full file hash) are only
+      written after FLUSH_IDLE_SECONDS without edits, and on exit, so a
+      later upload_to_firestore.py run still starts from a matching manifest
+    - Writes are paced by quota_scheduler.py like the other scripts
+
+Notes:
+    - Don't run upload_to_firestore.py while the daemon is running; both
+      maintain tasks_manifest.json
+    - tasks.txt is expected in log order (as convert.py writes it), with each
+      day's tasks together
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import sys
+import time
+from itertools import chain
+
+from convert import CHECKPOINT_SUFFIX, convert_incremental, load_checkpoint
+from firestore_utils import MAX_BATCH_SIZE, commit_in_batches, get_firestore_client
+from instrumentation import add_profile_arguments, profile_from_args
+from quota_scheduler import add_quota_arguments, print_deferred, scheduler_from_args
+from rollups import DEFAULT_USER_ID, rollup_operations, track_rollups
+from search_index import SEARCH_INDEX_PATH, index_tasks, open_index, remove_tasks
+from task_counters import counter_operations, track_task_id
+from upload_to_firestore import (
+    COLLECTION_NAME,
+    MANIFEST_PATH,
+    calculate_file_hash,
+    current_upload_time,
+    get_metadata,
+    iter_txt_file,
+    load_manifest,
+    manifest_digest,
+    save_manifest,
+    task_content_hash,
+    task_document,
+    update_metadata,
+)
+
+SERVICE_ACCOUNT_PATH = "../serviceAccountKey.json"
+INPUT_PATH = "../input.txt"
+TXT_FILE_PATH = "../tasks.txt"
+
+DEBOUNCE_SECONDS = 0.3
+# A file that keeps changing is still pushed this often
+MAX_DEBOUNCE_SECONDS = 2.0
+POLL_SECONDS = 0.25
+FLUSH_IDLE_SECONDS = 30
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """
+    Reports changes to one file with inotify. The directory is watched, so editors
+    that save by writing a new file and renaming it over the old one are seen too.
+    """
+    
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {directory}")
+        self.name = os.fsencode(os.path.basename(path))
+    
+    def wait(self, timeout: float = None) -> bool:
+        """Wait up to `timeout` seconds (None: forever). Returns True if the file changed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return False
+            if self.name in self.read_names():
+                return True
+    
+    def read_names(self) -> set:
+        """File names of the pending events."""
+        data = os.read(self.fd, 64 * 1024)
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            start = offset + EVENT_HEADER.size
+            names.add(data[start:start + length].rstrip(b"\0"))
+            offset = start + length
+        return names
+    
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Reports changes to one file by polling its size, mtime and inode."""
+    
+    def __init__(self, path: str, interval: float = POLL_SECONDS):
+        self.path = path
+        self.interval = interval
+        self.last = self.signature()
+    
+    def signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
+    
+    def wait(self, timeout: float = None) -> bool:
+        """Wait up to `timeout` seconds (None: forever). Returns True if the file changed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self.signature()
+            if current != self.last:
+                self.last = current
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.interval if deadline is None else min(self.interval, max(deadline - time.monotonic(), 0)))
+    
+    def close(self):
+        pass
+
+
+def make_watcher(path: str, polling: bool = False):
+    """An InotifyWatcher, or a PollingWatcher if inotify isn't available (or `polling`)."""
+    if not polling:
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError) as e:
+            print(f"ℹ️  inotify unavailable ({e}), polling instead")
+    return PollingWatcher(path)
+
+
+def wait_for_quiet(watcher, debounce: float, max_wait: float = MAX_DEBOUNCE_SECONDS):
+    """Return once the file has been quiet for `debounce` seconds, or after `max_wait`."""
+    started = time.monotonic()
+    while time.monotonic() - started < max_wait and watcher.wait(debounce):
+        pass
+
+
+def scan_day_offsets(path: str, offset: int = 0) -> dict:
+    """{YYYYMMDD: byte offset of the day's first row} for the rows of tasks.txt from `offset` on."""
+    days = {}
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if line.strip():
+                days.setdefault(line[:8].decode("ascii", "replace"), offset)
+            offset += len(line)
+    return days
+
+
+def tail_start(day_offsets: dict, reparse_offset: int) -> int:
+    """Offset of the day before `reparse_offset`, whose last task's endTime may change with it."""
+    before = [offset for offset in day_offsets.values() if offset < reparse_offset]
+    return max(before, default=0)
+
+
+class WatchSession:
+    """State kept between pushes: the Firestore client, the manifest and where each day starts in tasks.txt."""
+    
+    def __init__(self, db, manifest: dict, input_path: str = INPUT_PATH, output_path: str = TXT_FILE_PATH,
+                 scheduler=None, delete_removed: bool = False, user_id: str = DEFAULT_USER_ID):
+        self.db = db
+        self.user_id = user_id
+        self.manifest = manifest
+        self.input_path = input_path
+        self.output_path = output_path
+        self.scheduler = scheduler
+        self.delete_removed = delete_removed
+        self.day_offsets = scan_day_offsets(output_path) if os.path.exists(output_path) else {}
+        self.kept = set()
+        self.dirty = False
+    
+    def push(self) -> dict:
+        """Convert what changed in the input and send the affected tasks. Returns counts for the report."""
+        checkpoint = load_checkpoint(self.output_path + CHECKPOINT_SUFFIX, self.input_path, self.output_path)
+        reparse_offset = checkpoint["output_offset"] if checkpoint else 0
+        total, reparsed = convert_incremental(self.input_path, self.output_path)
+        if reparsed == total:
+            reparse_offset = 0
+        
+        start = tail_start(self.day_offsets, reparse_offset)
+        tail_days = {day for day, offset in self.day_offsets.items() if offset >= start}
+        self.day_offsets = {day: offset for day, offset in self.day_offsets.items() if offset < start}
+        self.day_offsets.update(scan_day_offsets(self.output_path, start))
+        
+        rollups = {}
+        changed = []
+        previous = {}
+        tail_ids = set()
+        for task in track_rollups(iter_txt_file(self.output_path, offset=start), rollups):
+            tail_ids.add(task["id"])
+            self.kept.discard(task["id"])
+            tail_days.add(task["id"][:8])
+            content_hash = task_content_hash(task)
+            if self.manifest.get(task["id"]) != content_hash:
+                previous[task["id"]] = self.manifest.get(task["id"])
+                self.manifest[task["id"]] = content_hash
+                changed.append(task)
+        
+        removed = [task_id for task_id in self.manifest
+                   if task_id[:8] in tail_days and task_id not in tail_ids and task_id not in self.kept]
+        if removed and not self.delete_removed:
+            print(f"ℹ️  {len(removed)} task(s) no longer in the log were kept. Use --delete-removed to delete them.")
+            self.kept.update(removed)
+            removed = []
+        
+        if not changed and not removed:
+            return {"tasks": total, "read": len(tail_ids), "written": 0, "deleted": 0, "failed": 0}
+        
+        maxima = {}
+        for task in changed:
+            track_task_id(maxima, task["id"])
+        changed_days = {task["id"][:8] for task in changed} | {task_id[:8] for task_id in removed}
+        
+        collection_ref = self.db.collection(COLLECTION_NAME)
+        upload_time = current_upload_time()
+        operations = chain(
+            (("set", collection_ref.document(task["id"]), task_document(task, upload_time, self.user_id)) for task in changed),
+            (("delete", collection_ref.document(task_id), None) for task_id in removed),
+            rollup_operations(self.db, rollups, changed_days, self.user_id),
+            counter_operations(self.db, maxima),
+        )
+        committed, failed = commit_in_batches(self.db, operations, MAX_BATCH_SIZE, scheduler=self.scheduler)
+        
+        if failed:
+            # Forget the new hashes, so the next push sends these tasks again
+            for task_id, content_hash in previous.items():
+                if content_hash is None:
+                    self.manifest.pop(task_id, None)
+                else:
+                    self.manifest[task_id] = content_hash
+        else:
+            for task_id in removed:
+                del self.manifest[task_id]
+            if os.path.exists(SEARCH_INDEX_PATH):
+                conn = open_index(SEARCH_INDEX_PATH)
+                index_tasks(conn, ((task["id"], task["description"]) for task in changed))
+                remove_tasks(conn, removed)
+                conn.close()
+        
+        self.dirty = True
+        return {"tasks": total, "read": len(tail_ids), "written": len(changed),
+                "deleted": len(removed), "failed": failed}
+    
+    def flush(self):
+        """Save the manifest and update _metadata, so upload_to_firestore.py can trust the manifest."""
+        save_manifest(MANIFEST_PATH, self.manifest)
+        update_metadata(self.db, calculate_file_hash(self.output_path), len(self.manifest),
+                        manifest_digest(self.manifest))
+        self.dirty = False
+        print(f"📋 Manifest and metadata saved ({len(self.manifest):,} tasks)")
+
+
+def report_push(report: dict, started: float, edited: float):
+    """Print one line per push."""
+    if report["failed"]:
+        print(f"⚠️  {report['failed']} write(s) failed; the next edit retries them")
+    elif report["written"] or report["deleted"]:
+        print(f"⚡ {report['written']} task(s) written, {report['deleted']} deleted "
+              f"({report['read']} re-read of {report['tasks']:,}) in {time.time() - started:.2f}s, "
+              f"{time.time() - edited:.2f}s after the edit")
+
+
+def raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Push edits of the task log to Firestore as they happen.")
+    parser.add_argument('--input', default=INPUT_PATH, help=f"task log to watch (default: {INPUT_PATH})")
+    parser.add_argument('--output', default=TXT_FILE_PATH, help=f"converted tasks file (default: {TXT_FILE_PATH})")
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS,
+                        help=f"seconds of quiet before pushing (default: {DEBOUNCE_SECONDS})")
+    parser.add_argument('--poll', action='store_true', help="poll the file instead of using inotify")
+    parser.add_argument('--delete-removed', action='store_true',
+                        help="also delete tasks whose lines were removed from the log")
+    parser.add_argument('--once', action='store_true', help="push pending changes and exit")
+    parser.add_argument('--user-id', default=DEFAULT_USER_ID,
+                        help=f"owner written on the tasks and their daily rollups (default: {DEFAULT_USER_ID})")
+    add_quota_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, "watch")
+    
+    print("🔐 Connecting to Firestore...")
+    db = get_firestore_client(SERVICE_ACCOUNT_PATH)
+    metadata = get_metadata(db)
+    manifest = load_manifest(MANIFEST_PATH, metadata.get("manifest_hash"))
+    if manifest is None:
+        print("❌ No manifest matching Firestore. Run upload_to_firestore.py once, then start the watcher.")
+        sys.exit(1)
+    
+    scheduler = scheduler_from_args(args, db, "watch")
+    session = WatchSession(db, manifest, args.input, args.output, scheduler, args.delete_removed, args.user_id)
+    
+    started = time.time()
+    report_push(session.push(), started, started)
+    if args.once:
+        if session.dirty:
+            session.flush()
+        print_deferred(scheduler)
+        return
+    
+    watcher = make_watcher(args.input, args.poll)
+    signal.signal(signal.SIGTERM, raise_interrupt)
+    print(f"👀 Watching {args.input} ({type(watcher).__name__}). Ctrl+C to stop.")
+    
+    try:
+        while True:
+            if watcher.wait(FLUSH_IDLE_SECONDS if session.dirty else None):
+                wait_for_quiet(watcher, args.debounce)
+                started = time.time()
+                try:
+                    edited = os.stat(args.input).st_mtime
+                    report_push(session.push(), started, edited)
+                except Exception as e:
+                    print(f"❌ Push failed: {e}")
+            elif session.dirty:
+                session.flush()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping...")
+    finally:
+        watcher.close()
+        if session.dirty:
+            session.flush()
+        print_deferred(scheduler)
+
+
+if __name__ == "__main__":
+    main()